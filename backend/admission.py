@@ -0,0 +1,291 @@
+"""
+Admission Control
+Bounds how much upstream work runs at once: each upstream call type (lesson pipeline,
+quiz pipeline, Fastino) gets a concurrency limit and a bounded wait queue. Waiting
+requests are scheduled fairly across users (weighted fair queuing by user_id, with
+anonymous requests as one class of their own), so one client flooding the service
+cannot starve the others. Requests that cannot be admitted are rejected right away
+with a Retry-After hint instead of piling up connections and multi-MB responses.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from circuit_breaker import percentile
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fair scheduling between users (lesson and quiz pipelines)
+ADMISSION_USER_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_USER_MAX_IN_FLIGHT", "2"))
+ADMISSION_USER_MAX_QUEUED = int(os.getenv("ADMISSION_USER_MAX_QUEUED", "4"))
+ADMISSION_ANONYMOUS_WEIGHT = float(os.getenv("ADMISSION_ANONYMOUS_WEIGHT", "2"))
+ADMISSION_ANONYMOUS_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_ANONYMOUS_MAX_IN_FLIGHT", "4"))
+ADMISSION_ANONYMOUS_MAX_QUEUED = int(os.getenv("ADMISSION_ANONYMOUS_MAX_QUEUED", "16"))
+# Per-user weights, e.g. "user_a=2,user_b=0.5" (everyone else has weight 1)
+ADMISSION_USER_WEIGHTS = os.getenv("ADMISSION_USER_WEIGHTS", "")
+
+# Flow key shared by every request without a user_id
+ANONYMOUS = "anonymous"
+
+# Queue-time samples kept per limiter for the percentiles in stats()
+_QUEUE_TIME_WINDOW = 500
+
+
+def _limits(prefix: str, concurrency: int, queue: int, wait: float):
+    """Read <PREFIX>_CONCURRENCY, <PREFIX>_QUEUE and <PREFIX>_QUEUE_TIMEOUT"""
+    return (
+        int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", str(wait))),
+    )
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        user_id, _, weight = item.strip().rpartition("=")
+        if user_id:
+            weights[user_id] = float(weight)
+    return weights
+
+
+class FlowPolicy(NamedTuple):
+    """Weight and limits of one scheduling class (0 = unlimited)"""
+    weight: float
+    max_in_flight: int
+    max_queued: int
+
+
+USER_POLICY = FlowPolicy(1.0, ADMISSION_USER_MAX_IN_FLIGHT, ADMISSION_USER_MAX_QUEUED)
+ANONYMOUS_POLICY = FlowPolicy(ADMISSION_ANONYMOUS_WEIGHT, ADMISSION_ANONYMOUS_MAX_IN_FLIGHT, ADMISSION_ANONYMOUS_MAX_QUEUED)
+UNLIMITED_POLICY = FlowPolicy(1.0, 0, 0)
+_USER_WEIGHTS = _parse_weights(ADMISSION_USER_WEIGHTS)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status and Retry-After seconds"""
+
+    def __init__(self, limiter: str, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.limiter = limiter
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit with a bounded wait queue, shared fairly between flows
+
+    Each request belongs to a flow (its user_id, or ANONYMOUS). A request beyond
+    max_concurrent, or beyond its flow's in-flight cap, waits in its flow's queue.
+    Freed slots go to the waiting request with the smallest virtual start tag
+    (start-time fair queuing): every request advances its flow's tag by 1/weight,
+    so backlogged flows are served in proportion to their weights no matter how
+    many requests each one queues.
+
+    Rejections: 429 when the flow's own queue is full (that client is sending too
+    much), 503 when the shared queue is full or the wait exceeds max_wait seconds.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_waiting: int, max_wait: float, fair: bool = False):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.fair = fair
+        self.in_flight = 0
+        self.waiting = 0
+        self._queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {}
+        self._flow_in_flight: Dict[str, int] = {}
+        self._last_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._queue_times: Deque[float] = deque(maxlen=_QUEUE_TIME_WINDOW)
+        self._hold_time = 0.0  # moving average of how long a slot is held, for Retry-After
+        self.metrics: Dict[str, int] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_user_limit": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+        }
+
+    # ===== Flows =====
+
+    def _flow(self, user_id: Optional[str]) -> str:
+        if not self.fair:
+            return ANONYMOUS
+        return user_id or ANONYMOUS
+
+    def _policy(self, flow: str) -> FlowPolicy:
+        if not self.fair:
+            return UNLIMITED_POLICY
+        if flow == ANONYMOUS:
+            return ANONYMOUS_POLICY
+        weight = _USER_WEIGHTS.get(flow)
+        return USER_POLICY if weight is None else USER_POLICY._replace(weight=weight)
+
+    def _flow_has_room(self, flow: str) -> bool:
+        cap = self._policy(flow).max_in_flight
+        return not cap or self._flow_in_flight.get(flow, 0) < cap
+
+    def _take(self, flow: str) -> None:
+        self.in_flight += 1
+        self._flow_in_flight[flow] = self._flow_in_flight.get(flow, 0) + 1
+
+    # ===== Acquire / release =====
+
+    def _retry_after(self) -> int:
+        """Rough seconds until a slot frees up for a request joining the back of the queue"""
+        if not self._hold_time:
+            return 1
+        estimate = self._hold_time * (self.waiting + 1) / max(self.max_concurrent, 1)
+        return max(1, int(estimate + 0.999))
+
+    def _reject(self, status_code: int, metric: str, reason: str) -> AdmissionRejected:
+        self.metrics[metric] += 1
+        retry_after = self._retry_after()
+        logger.warning(f"🚦 Rejected {self.name} request ({reason}), retry after {retry_after}s")
+        return AdmissionRejected(
+            self.name, status_code, retry_after,
+            f"Server is busy ({self.name}: {reason}). Please retry in {retry_after}s."
+        )
+
+    async def acquire(self, user_id: Optional[str] = None) -> float:
+        """
+        Take a slot for a user, waiting in line if necessary
+
+        Args:
+            user_id: Fastino user ID the work is done for (None = anonymous)
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            AdmissionRejected: If the user's or the shared queue is full, or the wait times out
+        """
+        flow = self._flow(user_id)
+        if self.in_flight < self.max_concurrent and self._flow_has_room(flow):
+            self._take(flow)
+            self.metrics["admitted"] += 1
+            self._queue_times.append(0.0)
+            return 0.0
+
+        queue = self._queues.get(flow)
+        max_queued = self._policy(flow).max_queued
+        if max_queued and queue is not None and len(queue) >= max_queued:
+            raise self._reject(429, "rejected_user_limit", f"{len(queue)} requests from this client already waiting")
+        if self.waiting >= self.max_waiting:
+            raise self._reject(503, "rejected_queue_full", f"{self.waiting} requests already waiting")
+
+        started_at = time.perf_counter()
+        tag = max(self._virtual_time, self._last_tag.get(flow, 0.0)) + 1.0 / self._policy(flow).weight
+        self._last_tag[flow] = tag
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(flow, deque()).append((tag, waiter))
+        self.waiting += 1
+        self.metrics["queued"] += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            self._abandon(flow, waiter)
+            raise
+        if not waiter.done():
+            self._abandon(flow, waiter)
+            raise self._reject(503, "rejected_timeout", f"no slot within {self.max_wait:.0f}s")
+
+        waited = time.perf_counter() - started_at
+        self.metrics["admitted"] += 1
+        self._queue_times.append(waited)
+        return waited
+
+    def _remove_waiter(self, flow: str, waiter: asyncio.Future) -> None:
+        queue = self._queues[flow]
+        for index, (_, queued) in enumerate(queue):
+            if queued is waiter:
+                del queue[index]
+                self.waiting -= 1
+                break
+        if not queue:
+            del self._queues[flow]
+            self._last_tag.pop(flow, None)
+
+    def _abandon(self, flow: str, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # The slot was already handed over; pass it on
+            self.release(flow)
+            return
+        waiter.cancel()
+        self._remove_waiter(flow, waiter)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the eligible waiters with the smallest start tags"""
+        while self.in_flight < self.max_concurrent and self.waiting:
+            best_flow, best_tag = None, None
+            for flow, queue in self._queues.items():
+                tag = queue[0][0]
+                if (best_tag is None or tag < best_tag) and self._flow_has_room(flow):
+                    best_flow, best_tag = flow, tag
+            if best_flow is None:
+                return  # every waiting flow is at its in-flight cap
+            _, waiter = self._queues[best_flow][0]
+            self._remove_waiter(best_flow, waiter)
+            self._virtual_time = max(self._virtual_time, best_tag)
+            self._take(best_flow)
+            waiter.set_result(None)
+
+    def release(self, flow: str = ANONYMOUS, held: float = 0.0) -> None:
+        """Free a flow's slot and hand it to the next waiter in fair order"""
+        if held:
+            self._hold_time = held if not self._hold_time else 0.8 * self._hold_time + 0.2 * held
+        self.in_flight -= 1
+        remaining = self._flow_in_flight.get(flow, 0) - 1
+        if remaining > 0:
+            self._flow_in_flight[flow] = remaining
+        else:
+            self._flow_in_flight.pop(flow, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None):
+        """Hold a slot for a user for the duration of the block; yields the seconds spent waiting"""
+        waited = await self.acquire(user_id)
+        started_at = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.release(self._flow(user_id), time.perf_counter() - started_at)
+
+    def stats(self) -> dict:
+        """Admission counters, current occupancy and queue-time percentiles"""
+        queue_times = self._queue_times
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "active_flows": len(self._flow_in_flight),
+            "queued_flows": len(self._queues),
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "queue_time_p50_ms": round(percentile(queue_times, 50) * 1000, 1) if queue_times else 0.0,
+            "queue_time_p99_ms": round(percentile(queue_times, 99) * 1000, 1) if queue_times else 0.0,
+            "queue_time_max_ms": round(max(queue_times) * 1000, 1) if queue_times else 0.0,
+        }
+
+
+lesson_admission = AdmissionLimiter("lesson_pipeline", *_limits("ADMISSION_LESSON", 8, 32, 30.0), fair=True)
+quiz_admission = AdmissionLimiter("quiz_pipeline", *_limits("ADMISSION_QUIZ", 8, 32, 30.0), fair=True)
+fastino_admission = AdmissionLimiter("fastino", *_limits("ADMISSION_FASTINO", 32, 128, 5.0))
+
+limiters: Dict[str, AdmissionLimiter] = {
+    limiter.name: limiter for limiter in (lesson_admission, quiz_admission, fastino_admission)
+}
@@ -0,0 +1,102 @@
+"""
+Audio Chunk Assembly
+Linear-time reassembly of segment audio delivered as a list of base64 chunks
+"""
+
+import base64
+import binascii
+from typing import List, Union
+
+_BASE64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+AudioChunks = Union[str, List[str]]
+
+
+def _as_chunk_list(chunks: AudioChunks) -> List[str]:
+    if isinstance(chunks, str):
+        return [chunks]
+    if isinstance(chunks, list):
+        return [chunk if isinstance(chunk, str) else str(chunk) for chunk in chunks]
+    return [str(chunks)]
+
+
+def _is_clean_base64(chunk: str) -> bool:
+    """Check that a string only holds base64 alphabet characters plus trailing padding"""
+    if not chunk.isascii():
+        return False
+    body = chunk.rstrip("=")
+    return len(chunk) - len(body) <= 2 and not body.encode("ascii").translate(None, _BASE64_ALPHABET)
+
+
+def decoded_length(chunk: str) -> int:
+    """Exact decoded size of a clean base64 string, or an upper bound if it contains other characters"""
+    length = len(chunk)
+    if length == 0:
+        return 0
+    padding = 2 if chunk.endswith("==") else 1 if chunk.endswith("=") else 0
+    return (length * 3) // 4 - padding
+
+
+def is_aligned(chunks: List[str]) -> bool:
+    """
+    Check that the chunks can be concatenated as-is into one valid base64 string:
+    every chunk is clean base64 and only the last one may carry padding or a
+    length that is not a multiple of 4
+    """
+    last = len(chunks) - 1
+    for index, chunk in enumerate(chunks):
+        if not _is_clean_base64(chunk):
+            return False
+        if index != last and (len(chunk) % 4 != 0 or chunk.endswith("=")):
+            return False
+    return True
+
+
+def assemble_audio_bytes(chunks: AudioChunks) -> bytes:
+    """
+    Decode base64 audio chunks into one contiguous buffer
+
+    The output buffer is sized up front and each chunk is decoded straight into
+    its slot, so the work is linear in the total audio size.
+
+    Args:
+        chunks: List of base64 strings or a single base64 string
+
+    Returns:
+        Combined raw audio bytes
+    """
+    chunk_list = _as_chunk_list(chunks)
+    if len(chunk_list) == 1:
+        return base64.b64decode(chunk_list[0])
+
+    buffer = bytearray(sum(decoded_length(chunk) for chunk in chunk_list))
+    view = memoryview(buffer)
+    offset = 0
+    for chunk in chunk_list:
+        decoded = binascii.a2b_base64(chunk)
+        view[offset:offset + len(decoded)] = decoded
+        offset += len(decoded)
+    view.release()
+    if offset != len(buffer):
+        # Chunks with stray characters decode shorter than estimated
+        del buffer[offset:]
+    return bytes(buffer)
+
+
+def assemble_audio_base64(chunks: AudioChunks) -> str:
+    """
+    Combine base64 audio chunks into a single base64 string
+
+    When the chunks are 4-character aligned they are joined directly, skipping
+    the decode -> re-encode round-trip entirely.
+
+    Args:
+        chunks: List of base64 strings or a single base64 string
+
+    Returns:
+        Combined base64 string
+    """
+    chunk_list = _as_chunk_list(chunks)
+    if is_aligned(chunk_list):
+        return "".join(chunk_list)
+    return base64.b64encode(assemble_audio_bytes(chunk_list)).decode("ascii")
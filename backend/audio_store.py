@@ -0,0 +1,307 @@
+"""
+Lesson Audio Blob Store
+Keeps decoded segment audio as raw bytes (memory LRU + disk) so lessons can
+reference it by URL instead of embedding base64 in the lesson JSON
+"""
+
+import os
+import re
+import time
+import base64
+import asyncio
+import binascii
+import hashlib
+import secrets
+import logging
+import shutil
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from worker_pool import worker_pool
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Audio store configuration
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".audio_store"))
+AUDIO_STORE_MEMORY_MAX_BYTES = int(os.getenv("AUDIO_STORE_MEMORY_MAX_BYTES", str(128 * 1024 * 1024)))
+AUDIO_STORE_DISK_MAX_BYTES = int(os.getenv("AUDIO_STORE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+AUDIO_STORE_TTL = float(os.getenv("AUDIO_STORE_TTL", os.getenv("LESSON_CACHE_TTL", str(24 * 60 * 60))))  # seconds
+# "url" serves audio from /lessons/{id}/segments/{segment_id}/audio, "inline" keeps audioBase64 in the lesson JSON
+LESSON_AUDIO_MODE = os.getenv("LESSON_AUDIO_MODE", "url").lower()
+
+_LESSON_ID_RE = re.compile(r"^[0-9a-f]{16,64}$")
+# base64 characters decoded per call (~1ms); decoding holds the GIL, slicing lets other threads run in between
+_DECODE_SLICE = 256 * 1024
+
+
+class AudioBlob(NamedTuple):
+    data: bytes
+    content_type: str
+    etag: str
+
+
+def detect_content_type(data: bytes) -> str:
+    """Detect the audio MIME type from the file header (defaults to audio/mpeg like the frontend)"""
+    if data[:4] == b"RIFF":
+        return "audio/wav"
+    if data[:4] == b"fLaC":
+        return "audio/flac"
+    if data[:4] == b"OggS":
+        return "audio/ogg"
+    if data[:3] == b"ID3" or (len(data) > 1 and data[0] == 0xFF and (data[1] & 0xE0) == 0xE0):
+        return "audio/mpeg"
+    return "audio/mpeg"
+
+
+def make_blob(data: bytes) -> AudioBlob:
+    """Wrap raw audio bytes with their content type and a strong ETag"""
+    return AudioBlob(data, detect_content_type(data), f'"{hashlib.sha256(data).hexdigest()[:32]}"')
+
+
+def decode_base64(text: str) -> bytes:
+    """base64-decode in 4-character aligned slices (same result as a single b64decode)"""
+    if len(text) <= _DECODE_SLICE:
+        return base64.b64decode(text)
+    try:
+        return b"".join(base64.b64decode(text[i:i + _DECODE_SLICE]) for i in range(0, len(text), _DECODE_SLICE))
+    except binascii.Error:
+        # Whitespace or padding inside the data misaligns the slices
+        return base64.b64decode(text)
+
+
+def make_blobs(audio: Dict[int, str]) -> Dict[int, AudioBlob]:
+    """Decode base64 audio keyed by segment_id into blobs (runs in the CPU worker pool)"""
+    return {segment_id: make_blob(decode_base64(text)) for segment_id, text in audio.items()}
+
+
+def new_lesson_id() -> str:
+    """
+    Id for one lesson generation's audio
+
+    Never reused (unlike the lesson cache key), so an audio URL always refers to the
+    same bytes and can be cached by clients as immutable.
+    """
+    return secrets.token_hex(16)
+
+
+def audio_url(lesson_id: str, segment_id: int) -> str:
+    """Relative URL the audio of a lesson segment is served from"""
+    return f"/lessons/{lesson_id}/segments/{segment_id}/audio"
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" Range header
+
+    Args:
+        range_header: Value of the Range request header
+        size: Total size of the blob in bytes
+
+    Returns:
+        Inclusive (start, end) byte offsets, or None to serve the whole blob
+
+    Raises:
+        ValueError: If the range is syntactically valid but not satisfiable
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # Multiple ranges are allowed to be answered with the full representation
+        return None
+    start_text, _, end_text = spec.partition("-")
+    if not all(part == "" or part.isdigit() for part in (start_text, end_text)) or not (start_text or end_text):
+        # Malformed ranges are ignored
+        return None
+    if start_text == "":
+        suffix = int(end_text)
+        if suffix == 0:
+            raise ValueError(f"Range {range_header} not satisfiable for {size} bytes")
+        start, end = max(size - suffix, 0), size - 1
+    else:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if end_text and start > end:
+            return None
+        if start >= size:
+            raise ValueError(f"Range {range_header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+class AudioBlobStore:
+    """
+    Store of lesson segment audio keyed by (lesson_id, segment_id)
+
+    Blobs are written through to disk (one directory per lesson, bounded by TTL and
+    a byte budget) and the most recently used ones are kept in a byte-bounded
+    in-memory LRU.
+    """
+
+    def __init__(self, directory: str, memory_max_bytes: int, ttl: float, disk_max_bytes: int):
+        self.directory = directory
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[Tuple[str, int], AudioBlob]" = OrderedDict()
+        self._memory_bytes = 0
+
+    def _lesson_dir(self, lesson_id: str) -> str:
+        return os.path.join(self.directory, lesson_id)
+
+    def _memory_put(self, key: Tuple[str, int], blob: AudioBlob) -> None:
+        if len(blob.data) > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.data)
+        self._memory[key] = blob
+        self._memory_bytes += len(blob.data)
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.data)
+
+    def _write_lesson(self, lesson_id: str, blobs: Dict[int, bytes]) -> None:
+        lesson_dir = self._lesson_dir(lesson_id)
+        # Never leave segments of an earlier write behind (e.g. a longer lesson)
+        shutil.rmtree(lesson_dir, ignore_errors=True)
+        os.makedirs(lesson_dir)
+        for segment_id, data in blobs.items():
+            path = os.path.join(lesson_dir, f"{segment_id}.bin")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._disk_prune(keep=lesson_id)
+
+    def _read_blob(self, lesson_id: str, segment_id: int) -> Optional[AudioBlob]:
+        path = os.path.join(self._lesson_dir(lesson_id), f"{segment_id}.bin")
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return make_blob(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _disk_prune(self, keep: str) -> None:
+        """Remove expired lesson directories, then the oldest ones, until the disk tier fits its budget"""
+        now = time.time()
+        lessons = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                    if now - mtime > self.ttl:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        continue
+                    with os.scandir(entry.path) as files:
+                        size = sum(f.stat().st_size for f in files if f.is_file())
+                except FileNotFoundError:
+                    continue  # removed by a concurrent prune
+                total += size
+                if entry.name != keep:
+                    lessons.append((mtime, size, entry.path))
+        lessons.sort()
+        while total > self.disk_max_bytes and lessons:
+            _, size, path = lessons.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    async def put_lesson(self, lesson_id: str, blobs: Dict[int, AudioBlob]) -> None:
+        """
+        Store the audio of every segment of a lesson
+
+        Args:
+            lesson_id: Audio id of the lesson generation (see new_lesson_id)
+            blobs: AudioBlob (with content type and ETag) keyed by segment_id
+        """
+        for segment_id, blob in blobs.items():
+            self._memory_put((lesson_id, segment_id), blob)
+        await asyncio.to_thread(self._write_lesson, lesson_id, {segment_id: blob.data for segment_id, blob in blobs.items()})
+
+    async def get(self, lesson_id: str, segment_id: int) -> Optional[AudioBlob]:
+        """Fetch a segment's audio from memory, falling back to disk"""
+        if not _LESSON_ID_RE.match(lesson_id):
+            return None
+        key = (lesson_id, segment_id)
+        blob = self._memory.get(key)
+        if blob is not None:
+            self._memory.move_to_end(key)
+            return blob
+        blob = await asyncio.to_thread(self._read_blob, lesson_id, segment_id)
+        if blob is None:
+            return None
+        self._memory_put(key, blob)
+        return blob
+
+    def put_segment(self, lesson_id: str, segment_id: int, blob: AudioBlob) -> None:
+        """Make one segment's audio servable from memory before its lesson is written out"""
+        self._memory_put((lesson_id, segment_id), blob)
+
+    def has_lesson(self, lesson_id: str) -> bool:
+        """Check that a lesson's audio is still available (used to validate cached lessons)"""
+        lesson_dir = self._lesson_dir(lesson_id)
+        try:
+            return time.time() - os.path.getmtime(lesson_dir) <= self.ttl
+        except OSError:
+            return False
+
+
+audio_store = AudioBlobStore(AUDIO_STORE_DIR, AUDIO_STORE_MEMORY_MAX_BYTES, AUDIO_STORE_TTL, AUDIO_STORE_DISK_MAX_BYTES)
+
+
+def decode_lesson_audio(lesson: dict) -> Dict[int, bytes]:
+    """Raw audio bytes of every segment of a lesson, keyed by segment_id"""
+    return {seg["segment_id"]: decode_base64(seg["audioBase64"]) for seg in lesson["segments"]}
+
+
+async def externalize_lesson_audio(lesson_id: str, lesson: dict, blobs: Optional[Dict[int, AudioBlob]] = None) -> dict:
+    """
+    Move a lesson's inline base64 audio into the blob store
+
+    Args:
+        lesson_id: Audio id of this lesson generation (see new_lesson_id)
+        lesson: Lesson data dict whose segments carry audioBase64
+        blobs: Blobs already built for some segments (streamed segments), not decoded again
+
+    Returns:
+        New lesson data dict whose segments carry audioUrl instead of audioBase64
+    """
+    blobs = dict(blobs or {})
+    audio = {seg["segment_id"]: seg["audioBase64"] for seg in lesson["segments"] if seg["segment_id"] not in blobs}
+    if audio:
+        blobs.update(await worker_pool.run("audio_decode", make_blobs, audio, size=sum(len(text) for text in audio.values())))
+    await audio_store.put_lesson(lesson_id, blobs)
+
+    segments = []
+    for seg in lesson["segments"]:
+        segment = {key: value for key, value in seg.items() if key != "audioBase64"}
+        segment["audioUrl"] = audio_url(lesson_id, seg["segment_id"])
+        segments.append(segment)
+    logger.info(f"🔊 Stored audio for {len(segments)} segments of lesson {lesson_id[:12]}")
+    return {**lesson, "lesson_id": lesson_id, "segments": segments}
+
+
+async def externalize_segment_audio(lesson_id: str, segment: dict) -> Tuple[dict, AudioBlob]:
+    """
+    Move a single streamed segment's inline base64 audio into the memory tier
+
+    The complete lesson is still passed through externalize_lesson_audio (with the
+    returned blob, so it is not decoded twice), which writes every segment to disk.
+
+    Returns:
+        Tuple of (new segment dict carrying audioUrl instead of audioBase64, its AudioBlob)
+    """
+    segment_id, text = segment["segment_id"], segment["audioBase64"]
+    blobs = await worker_pool.run("segment_audio_decode", make_blobs, {segment_id: text}, size=len(text))
+    audio_store.put_segment(lesson_id, segment_id, blobs[segment_id])
+    externalized = {key: value for key, value in segment.items() if key != "audioBase64"}
+    externalized["audioUrl"] = audio_url(lesson_id, segment["segment_id"])
+    return externalized, blobs[segment_id]
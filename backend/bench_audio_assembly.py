@@ -0,0 +1,74 @@
+"""
+Benchmark script for audio chunk reassembly
+Compares the old quadratic decode/concatenate/re-encode loop against the
+shared linear-time assembly in audio_assembly.py for 1-500 chunks
+"""
+
+import os
+import time
+import base64
+import logging
+import tracemalloc
+from audio_assembly import assemble_audio_base64, assemble_audio_bytes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHUNK_COUNTS = [1, 10, 50, 100, 250, 500]
+CHUNK_BYTES = int(os.getenv("BENCH_CHUNK_BYTES", str(12 * 1024)))  # decoded bytes per chunk (multiple of 3 => aligned)
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+
+
+def combine_quadratic(chunks):
+    """Previous implementation: decode each chunk, concatenate bytes, re-encode"""
+    combined_binary = b""
+    for chunk in chunks:
+        combined_binary += base64.b64decode(str(chunk))
+    return base64.b64encode(combined_binary).decode("utf-8")
+
+
+def make_chunks(count: int, chunk_bytes: int):
+    """Build base64 chunks of random audio-like bytes"""
+    return [base64.b64encode(os.urandom(chunk_bytes)).decode("ascii") for _ in range(count)]
+
+
+def measure(func, chunks):
+    """Best wall time over REPEATS runs and peak traced allocation of one run"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(chunks)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak
+
+
+def run_benchmark():
+    logger.info("=" * 80)
+    logger.info(f"🎵 AUDIO ASSEMBLY BENCHMARK ({CHUNK_BYTES:,} bytes/chunk, best of {REPEATS})")
+    logger.info("=" * 80)
+    logger.info(f"{'chunks':>7} | {'variant':<22} | {'aligned':>7} | {'time ms':>9} | {'peak MB':>8}")
+
+    for count in CHUNK_COUNTS:
+        # Aligned chunks (each chunk a multiple of 3 bytes) and unaligned chunks (one extra byte each)
+        for aligned, chunk_bytes in [(True, CHUNK_BYTES - CHUNK_BYTES % 3), (False, CHUNK_BYTES - CHUNK_BYTES % 3 + 1)]:
+            chunks = make_chunks(count, chunk_bytes)
+            expected = combine_quadratic(chunks)
+            if assemble_audio_base64(chunks) != expected:
+                logger.error(f"❌ assemble_audio_base64 mismatch for {count} chunks (aligned={aligned})")
+                return
+            for name, func in [
+                ("quadratic (old)", combine_quadratic),
+                ("assemble_audio_base64", assemble_audio_base64),
+                ("assemble_audio_bytes", assemble_audio_bytes),
+            ]:
+                elapsed_ms, peak = measure(func, chunks)
+                logger.info(f"{count:>7} | {name:<22} | {str(aligned):>7} | {elapsed_ms:>9.2f} | {peak / (1024 * 1024):>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,115 @@
+"""
+Benchmark script for lesson response serialization
+Compares FastAPI's response_model paths (Pydantic validation + jsonable_encoder/json,
+or validation + Pydantic dump_json) against the fast path in fast_json.py on a
+recorded lesson (BENCH_LESSON_FILE, or the newest lesson cache entry) or, failing
+that, a synthetic lesson of the same shape
+"""
+
+import os
+import glob
+import json
+import time
+import base64
+import logging
+import tracemalloc
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fast_json import FastJSONResponse, orjson
+from lesson_cache import LESSON_CACHE_DIR
+from main import LessonDataResponse, _lesson_body
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BENCH_LESSON_FILE = os.getenv("BENCH_LESSON_FILE")
+SEGMENTS = int(os.getenv("BENCH_SEGMENTS", "10"))
+AUDIO_BYTES = int(os.getenv("BENCH_AUDIO_BYTES", str(400 * 1024)))  # decoded audio bytes per synthetic segment
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+
+
+def load_lesson():
+    """Recorded lesson (a lesson JSON or a lesson cache entry), or a synthetic one"""
+    paths = [BENCH_LESSON_FILE] if BENCH_LESSON_FILE else sorted(
+        glob.glob(os.path.join(LESSON_CACHE_DIR, "*.json")), key=os.path.getmtime, reverse=True
+    )
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            lesson = data.get("lesson", data)
+            if lesson.get("segments"):
+                return lesson, os.path.basename(path)
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"⚠️  Could not load {path}: {e}")
+    segments = [
+        {
+            "segment_id": i,
+            "audioBase64": base64.b64encode(os.urandom(AUDIO_BYTES)).decode("ascii"),
+            "imageUrl": f"https://images.example.com/lesson/{i}.png",
+            "narration": "Clouds form when warm, moist air rises and cools. " * 8,
+            "duration": 12.5,
+        }
+        for i in range(1, SEGMENTS + 1)
+    ]
+    return {"topic": "How are clouds formed", "segments": segments}, f"synthetic ({SEGMENTS} x {AUDIO_BYTES:,} B audio)"
+
+
+def validated_jsonable(lesson):
+    """Classic FastAPI path: validate into the response_model, jsonable_encoder, stdlib json"""
+    model = LessonDataResponse.model_validate(lesson)
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def validated_dump_json(lesson):
+    """Current FastAPI path: validate into the response_model, Pydantic dump_json"""
+    return LessonDataResponse.model_validate(lesson).model_dump_json().encode("utf-8")
+
+
+def fast_path(lesson):
+    """fast_json path: project onto the response_model fields and serialize directly"""
+    return FastJSONResponse(_lesson_body(lesson)).body
+
+
+def measure(func, lesson):
+    """Best wall time over REPEATS runs and peak traced allocation of one run"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(lesson)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(lesson)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak
+
+
+def run_benchmark():
+    lesson, source = load_lesson()
+    size = len(validated_dump_json(lesson))
+
+    logger.info("=" * 80)
+    logger.info(f"🧾 LESSON RESPONSE SERIALIZATION BENCHMARK (best of {REPEATS})")
+    logger.info(f"   Lesson: {source}, {len(lesson['segments'])} segments, {size:,} bytes of JSON")
+    logger.info(f"   orjson installed: {orjson is not None}")
+    logger.info("=" * 80)
+
+    expected = json.loads(validated_dump_json(lesson))
+    if json.loads(fast_path(lesson)) != expected:
+        logger.error("❌ Fast path output differs from the response_model output")
+        return
+
+    logger.info(f"{'variant':<32} | {'time ms':>9} | {'peak MB':>8}")
+    for name, func in [
+        ("validate + jsonable_encoder", validated_jsonable),
+        ("validate + dump_json", validated_dump_json),
+        ("fast_json", fast_path),
+    ]:
+        elapsed_ms, peak = measure(func, lesson)
+        logger.info(f"{name:<32} | {elapsed_ms:>9.2f} | {peak / (1024 * 1024):>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,180 @@
+"""
+Benchmark suite for lesson and quiz post-processing
+Times each CPU-bound stage that runs on the event loop after the upstream answers,
+for 5-200 segments and 10 KB-5 MB of audio per segment (best wall time and peak
+traced allocation per stage):
+
+    stream_parse   AiriaResultStream over the body in 64 KB pieces (outer + nested output JSON)
+    collect        LessonSegmentMerger.add: audio detection, audio/content maps, chunk assembly
+    merge          collect_parsed_outputs + merge: result checks, segment_id join, sort, validation
+    audio_decode   decode_lesson_audio + make_blob (LESSON_AUDIO_MODE=url)
+    serialize      fast_json.dumps of the lesson (LESSON_AUDIO_MODE=inline)
+    quiz_parse     parse_quiz_result: markdown regex extraction + JSON parsing
+    quiz_format    format_quiz_questions: correct-answer option matching
+
+Log output of the measured modules is silenced so it does not dominate the numbers.
+"""
+
+import os
+import json
+import time
+import base64
+import logging
+import tracemalloc
+from audio_store import decode_lesson_audio, make_blob
+from fast_json import dumps
+from lesson_merge import LessonSegmentMerger, collect_parsed_outputs
+from lesson_stream_parser import AiriaResultStream
+from quiz_parser import parse_quiz_result, format_quiz_questions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+for _name in ("lesson_merge", "lesson_stream_parser", "quiz_parser", "audio_store"):
+    logging.getLogger(_name).setLevel(logging.CRITICAL)
+
+
+def _int_list(name: str, default: str):
+    return [int(value) for value in os.getenv(name, default).split(",") if value.strip()]
+
+
+SEGMENT_COUNTS = _int_list("BENCH_SEGMENT_COUNTS", "5,20,50,100,200")
+AUDIO_SIZES = _int_list("BENCH_AUDIO_SIZES", "10240,102400,1048576,5242880")  # decoded bytes per segment
+AUDIO_CHUNKS = int(os.getenv("BENCH_AUDIO_CHUNKS", "1"))  # >1 sends each segment's audio as a list of chunks
+MAX_TOTAL_MB = int(os.getenv("BENCH_MAX_TOTAL_MB", "100"))  # skip combinations with more decoded audio than this
+REPEATS = int(os.getenv("BENCH_REPEATS", "3"))
+STREAM_PIECE = 64 * 1024  # characters per feed(), like httpx's aiter_text pieces
+
+
+def build_response(segments: int, audio_bytes: int) -> str:
+    """Airia lesson response body: result[0] narration/images, result[1] audio, both outputs as JSON strings"""
+    audio = base64.b64encode(os.urandom(audio_bytes)).decode("ascii")
+    if AUDIO_CHUNKS > 1:
+        size = -(-len(audio) // AUDIO_CHUNKS // 4) * 4  # 4-char aligned pieces
+        audio = [audio[i:i + size] for i in range(0, len(audio), size)]
+    content = {
+        "topic": "How are clouds formed",
+        "segments": [
+            {
+                "segment_id": i,
+                "narration": "Warm, moist air rises, expands and cools until its water vapor condenses. " * 3,
+                "image_url": f"https://images.example.com/clouds/{i}.png",
+                "duration": 12.5,
+            }
+            for i in range(1, segments + 1)
+        ],
+    }
+    audio_output = {"segments": [{"segment_id": i, "audio_base64": audio} for i in range(1, segments + 1)]}
+    return json.dumps({"result": [
+        {"stepType": "AIOperation", "output": json.dumps(content)},
+        {"stepType": "PythonCode", "output": json.dumps(audio_output)},
+    ]})
+
+
+def build_quiz_result(questions: int) -> str:
+    """Airia quiz result: quiz JSON in a markdown block, every third answer differing in case"""
+    quiz = [
+        {
+            "question": f"Question {i}: what happens to rising air?",
+            "options": ["It expands and cools", "It shrinks and warms", "It stays the same", "It turns into rain"],
+            "correct_answer": "it expands and cools" if i % 3 == 0 else "It expands and cools",
+        }
+        for i in range(1, questions + 1)
+    ]
+    return "Here is your quiz:\n```json\n" + json.dumps({"quiz": quiz}, indent=2) + "\n```"
+
+
+# ===== Stages =====
+
+def stream_parse(body: str):
+    segments = []
+    stream = AiriaResultStream(lambda index, seg: segments.append((index, seg)))
+    for start in range(0, len(body), STREAM_PIECE):
+        stream.feed(body[start:start + STREAM_PIECE])
+    return stream.close(), stream.segment_counts, segments
+
+
+def collect(segments):
+    merger = LessonSegmentMerger()
+    for index, seg in segments:
+        merger.add(index, seg)
+    return merger
+
+
+def merge(merger, data, segment_counts):
+    return merger.merge(collect_parsed_outputs(data, segment_counts), "How are clouds formed")
+
+
+def audio_decode(lesson):
+    return [make_blob(data) for data in decode_lesson_audio(lesson).values()]
+
+
+def measure(func, setup):
+    """Best wall time over REPEATS runs and peak traced allocation of one run (setup excluded)"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    args = setup()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak
+
+
+def log_row(label: str, stage: str, elapsed_ms: float, peak: int) -> None:
+    logger.info(f"{label:<22} | {stage:<13} | {elapsed_ms:>10.2f} | {peak / (1024 * 1024):>8.2f}")
+
+
+def run_benchmark():
+    logger.info("=" * 80)
+    logger.info(f"🧪 LESSON POST-PROCESSING BENCHMARK (best of {REPEATS}, audio chunks per segment: {AUDIO_CHUNKS})")
+    logger.info("=" * 80)
+    logger.info(f"{'segments x audio':<22} | {'stage':<13} | {'time ms':>10} | {'peak MB':>8}")
+
+    for segments in SEGMENT_COUNTS:
+        for audio_bytes in AUDIO_SIZES:
+            if segments * audio_bytes > MAX_TOTAL_MB * 1024 * 1024:
+                continue
+            label = f"{segments} x {audio_bytes // 1024:,} KB"
+            body = build_response(segments, audio_bytes)
+            data, segment_counts, parsed_segments = stream_parse(body)
+            lesson = merge(collect(parsed_segments), data, segment_counts)
+            if len(lesson["segments"]) != segments:
+                logger.error(f"❌ {label}: merged {len(lesson['segments'])} segments")
+                return
+
+            total_ms = 0.0
+            for stage, func, setup in [
+                ("stream_parse", stream_parse, lambda: (body,)),
+                ("collect", collect, lambda: (parsed_segments,)),
+                ("merge", merge, lambda: (collect(parsed_segments), data, segment_counts)),
+                ("audio_decode", audio_decode, lambda: (lesson,)),
+                ("serialize", dumps, lambda: (lesson,)),
+            ]:
+                elapsed_ms, peak = measure(func, setup)
+                total_ms += elapsed_ms
+                log_row(label, stage, elapsed_ms, peak)
+            logger.info(f"{label:<22} | {'total':<13} | {total_ms:>10.2f} | {len(body) / (1024 * 1024):>6.1f} MB body")
+
+    logger.info("-" * 80)
+    for questions in SEGMENT_COUNTS:
+        label = f"{questions} questions"
+        result = build_quiz_result(questions)
+        quiz_array = parse_quiz_result(result)
+        if len(format_quiz_questions(quiz_array)) != questions:
+            logger.error(f"❌ {label}: option matching dropped questions")
+            return
+        for stage, func, setup in [
+            ("quiz_parse", parse_quiz_result, lambda: (result,)),
+            ("quiz_format", format_quiz_questions, lambda: (quiz_array,)),
+        ]:
+            elapsed_ms, peak = measure(func, setup)
+            log_row(label, stage, elapsed_ms, peak)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,87 @@
+"""
+Benchmark for the CPU worker pool
+Completes BENCH_CONCURRENCY lessons at once (audio decoding, ETag hashing and the
+blob store write of LESSON_AUDIO_MODE=url), once per pool mode (inline, thread,
+process). Meanwhile it measures event-loop lag: the extra latency any other
+request (even /health) would see while the lessons complete.
+"""
+
+import os
+import time
+import base64
+import asyncio
+import logging
+import tempfile
+
+os.environ.setdefault("AUDIO_STORE_DIR", tempfile.mkdtemp(prefix="bench_audio_"))
+
+from audio_store import externalize_lesson_audio
+from loop_monitor import LoopLagMonitor
+from worker_pool import worker_pool, WORKER_POOL_THREADS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+for _name in ("audio_store", "worker_pool"):
+    logging.getLogger(_name).setLevel(logging.WARNING)
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+SEGMENTS = int(os.getenv("BENCH_SEGMENTS", "10"))
+AUDIO_BYTES = int(os.getenv("BENCH_AUDIO_BYTES", str(2 * 1024 * 1024)))  # decoded bytes per segment
+PROCESSES = int(os.getenv("BENCH_PROCESSES", str(WORKER_POOL_THREADS)))
+PROBE_INTERVAL = 0.005  # seconds between loop-lag probes
+
+
+def build_lesson(index: int) -> dict:
+    """Merged lesson with distinct inline audio per segment"""
+    return {
+        "topic": f"Benchmark lesson {index}",
+        "segments": [
+            {
+                "segment_id": i,
+                "narration": "Warm, moist air rises and cools.",
+                "imageUrl": None,
+                "audioBase64": base64.b64encode(os.urandom(AUDIO_BYTES)).decode("ascii"),
+            }
+            for i in range(1, SEGMENTS + 1)
+        ],
+    }
+
+
+async def run_mode(mode: str, lessons: list) -> None:
+    worker_pool.shutdown()
+    worker_pool.enabled = mode != "inline"
+    worker_pool.processes = PROCESSES if mode == "process" else 0
+    worker_pool.start()
+    # Warm up the workers (process start-up is not part of a lesson completion)
+    await asyncio.gather(*(externalize_lesson_audio(f"{index:016x}", lesson) for index, lesson in enumerate(lessons[:1])))
+
+    monitor = LoopLagMonitor(PROBE_INTERVAL, 100000)
+    monitor.start()
+    await asyncio.sleep(0.05)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(externalize_lesson_audio(f"{index + 1:016x}", lesson) for index, lesson in enumerate(lessons)))
+    elapsed = time.perf_counter() - started_at
+
+    await monitor.stop()
+    stats = monitor.stats()
+    logger.info(
+        f"{mode:<8} | {elapsed * 1000:>9.0f} | {stats['lag_p50_ms']:>8.2f} | {stats['lag_p99_ms']:>8.2f} | "
+        f"{stats['lag_max_ms']:>8.2f} | {stats['stalls']:>6}"
+    )
+
+
+async def run_benchmark():
+    logger.info("=" * 80)
+    logger.info(f"🧪 CPU WORKER POOL BENCHMARK ({CONCURRENCY} concurrent lessons x {SEGMENTS} segments x {AUDIO_BYTES // 1024:,} KB)")
+    logger.info("=" * 80)
+    lessons = [build_lesson(index) for index in range(CONCURRENCY)]
+    logger.info(f"{'mode':<8} | {'wall ms':>9} | {'lag p50':>8} | {'lag p99':>8} | {'lag max':>8} | {'stalls':>6}")
+    for mode in ("inline", "thread", "process"):
+        await run_mode(mode, lessons)
+    worker_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
@@ -0,0 +1,249 @@
+"""
+Upstream Circuit Breakers
+One breaker per upstream (Airia, Fastino) that fails fast while the upstream is
+unhealthy, plus per-operation timeouts derived from recently observed latencies
+instead of fixed worst-case values
+"""
+
+import os
+import math
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+import httpx
+from dotenv import load_dotenv
+from http_clients import AIRIA, FASTINO
+from metrics import errors, upstream_duration, upstream_in_flight
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Breaker configuration
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # consecutive failures that open the circuit
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))  # how long to fail fast before probing again
+# Adaptive timeout configuration
+UPSTREAM_TIMEOUT_PERCENTILE = float(os.getenv("UPSTREAM_TIMEOUT_PERCENTILE", "99"))
+UPSTREAM_TIMEOUT_MULTIPLIER = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", "3.0"))
+UPSTREAM_TIMEOUT_MIN_SAMPLES = int(os.getenv("UPSTREAM_TIMEOUT_MIN_SAMPLES", "20"))
+UPSTREAM_LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "200"))  # recent samples kept per operation
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def percentile(samples, p: float) -> float:
+    """Nearest-rank percentile of a non-empty collection"""
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class UpstreamCall:
+    """Handle for one guarded upstream call, carrying its timeout and outcome"""
+
+    __slots__ = ("timeout", "probe", "started_at", "latency", "status", "failed")
+
+    def __init__(self, timeout: float, probe: bool = False):
+        self.timeout = timeout
+        self.probe = probe
+        self.started_at = time.perf_counter()
+        self.latency: Optional[float] = None
+        self.status: Optional[int] = None
+        self.failed = False
+
+    def check(self, response: httpx.Response) -> None:
+        """Record the time to response; 5xx responses count as upstream failures"""
+        self.latency = time.perf_counter() - self.started_at
+        self.status = response.status_code
+        if response.status_code >= 500:
+            self.failed = True
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with latency-driven timeouts
+
+    After failure_threshold consecutive failures (timeouts, connection errors, 5xx)
+    the circuit opens and calls fail immediately for open_seconds. Then a single
+    probe call is let through: its success closes the circuit, its failure opens
+    it again. Each operation's timeout is the configured percentile of its recent
+    latencies times a multiplier, clamped between a floor and the fixed ceiling.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, open_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_inflight = False
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._timeouts: Dict[str, float] = {}
+        self.metrics: Dict[str, int] = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    # ===== State =====
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now (without claiming the probe)"""
+        if self.state == OPEN:
+            return self.retry_after() <= 0
+        if self.state == HALF_OPEN:
+            return not self._probe_inflight
+        return True
+
+    def _acquire(self) -> Optional[bool]:
+        """Claim a call slot: None if rejected, otherwise whether the call is the half-open probe"""
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.state = HALF_OPEN
+            logger.info(f"🔌 {self.name} circuit half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probe_inflight:
+                return None
+            self._probe_inflight = True
+            return True
+        return False if self.state == CLOSED else None
+
+    def _record_success(self, operation: str, latency: float) -> None:
+        self.metrics["successes"] += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"✅ {self.name} circuit closed after a successful call")
+            self.state = CLOSED
+        samples = self._latencies.setdefault(operation, deque(maxlen=UPSTREAM_LATENCY_WINDOW))
+        samples.append(latency)
+
+    def _record_failure(self) -> None:
+        self.metrics["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.metrics["opened"] += 1
+            logger.warning(
+                f"🚫 {self.name} circuit opened after {self.consecutive_failures} consecutive failure(s), "
+                f"failing fast for {self.open_seconds:.0f}s"
+            )
+
+    # ===== Timeouts =====
+
+    def latency_percentile(self, operation: str, p: float) -> Optional[float]:
+        """Percentile of recent successful latencies (seconds), or None until enough samples exist"""
+        samples = self._latencies.get(operation)
+        if not samples or len(samples) < UPSTREAM_TIMEOUT_MIN_SAMPLES:
+            return None
+        return percentile(samples, p)
+
+    def timeout(self, operation: str, ceiling: float, floor: float) -> float:
+        """Adaptive timeout for an operation (the ceiling until enough samples exist)"""
+        observed = self.latency_percentile(operation, UPSTREAM_TIMEOUT_PERCENTILE)
+        if observed is None:
+            timeout = ceiling
+        else:
+            timeout = min(ceiling, max(floor, observed * UPSTREAM_TIMEOUT_MULTIPLIER))
+        self._timeouts[operation] = timeout
+        return timeout
+
+    # ===== Guarded calls =====
+
+    @asynccontextmanager
+    async def call(self, operation: str, ceiling: float, floor: float = 1.0):
+        """
+        Guard one upstream call
+
+        Usage:
+            async with breaker.call("query", ceiling=100.0) as call:
+                response = await client.post(..., timeout=call.timeout)
+                call.check(response)
+
+        Raises:
+            CircuitOpenError: If the circuit is open (the body does not run)
+        """
+        probe = self._acquire()
+        if probe is None:
+            self.metrics["rejected"] += 1
+            errors.inc(f"{self.name}_{operation}", "circuit_open")
+            raise CircuitOpenError(self.name, self.retry_after())
+        call = UpstreamCall(self.timeout(operation, ceiling, floor), probe)
+        upstream_in_flight.inc(self.name, operation)
+        error_class = None
+        try:
+            yield call
+        except httpx.RequestError as e:
+            call.failed = True
+            error_class = "timeout" if isinstance(e, httpx.TimeoutException) else "request_error"
+            self._settle(operation, call)
+            raise
+        except BaseException:
+            # Errors after a response arrived (parsing, validation) say nothing about upstream health
+            self._settle(operation, call)
+            raise
+        else:
+            self._settle(operation, call, completed=True)
+        finally:
+            upstream_in_flight.dec(self.name, operation)
+            self._observe(operation, call, error_class)
+
+    def _observe(self, operation: str, call: UpstreamCall, error_class: Optional[str]) -> None:
+        """Export the call's duration and error class (calls cancelled before a response are skipped)"""
+        if error_class is None and call.status is not None and call.status >= 400:
+            error_class = "http_error"
+        if error_class is not None:
+            errors.inc(f"{self.name}_{operation}", error_class)
+        if error_class is not None or call.status is not None:
+            upstream_duration.observe(time.perf_counter() - call.started_at, self.name, operation)
+
+    def _settle(self, operation: str, call: UpstreamCall, completed: bool = False) -> None:
+        if call.probe:
+            self._probe_inflight = False
+        if call.failed:
+            self._record_failure()
+        elif call.latency is not None or completed:
+            self._record_success(operation, call.latency if call.latency is not None else time.perf_counter() - call.started_at)
+        # Otherwise the call was abandoned before any response (e.g. cancelled): no verdict
+
+    def stats(self) -> dict:
+        """Breaker state plus per-operation latency percentiles and current timeouts"""
+        operations = {}
+        for operation, samples in self._latencies.items():
+            if samples:
+                operations[operation] = {
+                    "samples": len(samples),
+                    "p50_ms": round(percentile(samples, 50) * 1000, 1),
+                    "p99_ms": round(percentile(samples, 99) * 1000, 1),
+                    "timeout_s": round(self._timeouts.get(operation, 0.0), 2),
+                }
+        return {
+            **self.metrics,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_s": round(self.retry_after(), 1) if self.state == OPEN else 0.0,
+            "operations": operations,
+        }
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    upstream: CircuitBreaker(upstream, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS)
+    for upstream in (AIRIA, FASTINO)
+}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """Breaker for an upstream registry key (AIRIA or FASTINO)"""
+    return breakers[upstream]
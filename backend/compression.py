@@ -0,0 +1,247 @@
+"""
+Response Compression
+ASGI middleware that compresses response bodies with the best encoding both sides
+support (zstd, br, gzip), negotiated from Accept-Encoding. Small bodies and
+already-compressed media (audio, images) are sent as-is, and streamed bodies are
+compressed chunk by chunk instead of being buffered.
+"""
+
+import os
+import zlib
+import logging
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Compression configuration
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as-is
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Content types that are already compressed (prefix match)
+COMPRESSION_SKIP_TYPES = tuple(
+    t.strip() for t in os.getenv(
+        "COMPRESSION_SKIP_TYPES",
+        "audio/,image/,video/,font/woff,application/zip,application/gzip,application/zstd"
+    ).split(",") if t.strip()
+)
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+# Server preference order among the installed codecs (used to break q-value ties)
+ENCODERS = {
+    name: encoder for name, encoder, available in (
+        ("zstd", _ZstdEncoder, zstandard is not None),
+        ("br", _BrotliEncoder, brotli is not None),
+        ("gzip", _GzipEncoder, True),
+    ) if available
+}
+
+metrics: Dict[str, int] = {"compressed": 0, "streamed": 0, "skipped_small": 0, "skipped_type": 0, "bytes_in": 0, "bytes_out": 0}
+_by_encoding: Dict[str, int] = {name: 0 for name in ENCODERS}
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the encoding for an Accept-Encoding header
+
+    Returns:
+        The installed encoding with the highest q-value (ties go to server preference),
+        or None if the client accepts none of them
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        token, *params = item.strip().split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if token:
+            weights[token.strip()] = q
+
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression
+
+    A body that arrives in one message is compressed in one shot when it is at least
+    minimum_size bytes. A streamed body (e.g. the SSE lesson stream) is compressed
+    and flushed per chunk, so events still reach the client as they are produced.
+    HEAD requests, partial/empty responses, responses that already carry a
+    Content-Encoding and COMPRESSION_SKIP_TYPES content are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate((_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def compressed_send(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is not None:
+                chunk = encoder.compress(body) if more_body else encoder.finish(body)
+                metrics["bytes_in"] += len(body)
+                metrics["bytes_out"] += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = list(start_message.get("headers", []))
+            length = _header(headers, b"content-length")
+            skip = self._skip_reason(start_message["status"], headers)
+            if skip is None and not more_body and len(body) < self.minimum_size:
+                skip = "skipped_small"
+            if skip is None and more_body and length is not None and int(length) < self.minimum_size:
+                skip = "skipped_small"
+            if skip is not None:
+                if skip != "passthrough":
+                    metrics[skip] += 1
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            encoder = ENCODERS[encoding]()
+            chunk = encoder.compress(body) if more_body else encoder.finish(body)
+            metrics["compressed"] += 1
+            metrics["streamed"] += int(more_body)
+            metrics["bytes_in"] += len(body)
+            metrics["bytes_out"] += len(chunk)
+            _by_encoding[encoding] += 1
+            start_message["headers"] = self._compressed_headers(headers, encoding, None if more_body else len(chunk))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, compressed_send)
+
+    @staticmethod
+    def _skip_reason(status: int, headers: List[Tuple[bytes, bytes]]) -> Optional[str]:
+        if status < 200 or status in (204, 206, 304):
+            return "passthrough"
+        if _header(headers, b"content-encoding") is not None or _header(headers, b"content-range") is not None:
+            return "passthrough"
+        content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+        if content_type.startswith(COMPRESSION_SKIP_TYPES):
+            return "skipped_type"
+        return None
+
+    @staticmethod
+    def _compressed_headers(headers: List[Tuple[bytes, bytes]], encoding: str, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        """Replace Content-Length, add Content-Encoding and Vary, and weaken a strong ETag"""
+        updated = []
+        vary = None
+        for key, value in headers:
+            name = key.lower()
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            updated.append((key, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary += b", Accept-Encoding"
+        updated.append((b"vary", vary))
+        updated.append((b"content-encoding", encoding.encode("latin-1")))
+        if length is not None:
+            updated.append((b"content-length", str(length).encode("latin-1")))
+        return updated
+
+
+def stats() -> dict:
+    """Compression counters, overall ratio and responses per encoding"""
+    return {
+        **metrics,
+        "ratio": round(metrics["bytes_out"] / metrics["bytes_in"], 4) if metrics["bytes_in"] else 0.0,
+        "by_encoding": dict(_by_encoding),
+        "available": list(ENCODERS),
+    }
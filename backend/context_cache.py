@@ -0,0 +1,198 @@
+"""
+Fastino Context Cache
+Local TTL cache of Fastino user-context answers keyed by (user_id, question template,
+normalized topic), so a repeat visit to a topic skips the Fastino round-trip. Entries
+past their TTL are served stale while a background refresh runs, and a user's entries
+are invalidated once new documents for that user have been ingested (except by the
+lesson prompt of the topic itself, which every lesson request ingests).
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from lesson_cache import normalize_prompt
+from single_flight import SingleFlight
+from stages import spawn_background
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Context cache configuration
+FASTINO_CONTEXT_CACHE_ENABLED = os.getenv("FASTINO_CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FASTINO_CONTEXT_CACHE_TTL = float(os.getenv("FASTINO_CONTEXT_CACHE_TTL", "600"))  # seconds an answer is fresh
+FASTINO_CONTEXT_CACHE_STALE_TTL = float(os.getenv("FASTINO_CONTEXT_CACHE_STALE_TTL", "3600"))  # extra seconds it may be served stale
+FASTINO_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("FASTINO_CONTEXT_CACHE_MAX_ENTRIES", "10000"))
+
+ContextKey = Tuple[str, str, str]  # (user_id, question template, normalized topic)
+FetchContext = Callable[[], Awaitable[Optional[str]]]
+
+
+class _Entry:
+    __slots__ = ("answer", "fresh_until", "stale_until")
+
+    def __init__(self, answer: str, fresh_until: float, stale_until: float):
+        self.answer = answer
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ContextCache:
+    """
+    LRU-bounded TTL cache of Fastino answers with stale-while-revalidate
+
+    Invalidation marks a user's entries stale rather than dropping them: the next
+    request still skips the round-trip and triggers a refresh that picks up the
+    newly ingested documents. Answers fetched while an invalidation happened are
+    stored already stale, so they are refreshed on next use too. A batch made of
+    lesson prompts for one topic leaves that topic's answers alone: each lesson
+    request ingests its own prompt while it fetches the answer for it.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int, enabled: bool = True):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[ContextKey, _Entry]" = OrderedDict()
+        self._user_keys: Dict[str, Set[ContextKey]] = {}
+        # Keys being fetched, mapped to whether they were invalidated meanwhile
+        self._fetching: Dict[ContextKey, bool] = {}
+        self._flights = SingleFlight("fastino_context")
+        self.metrics: Dict[str, int] = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "invalidations": 0,
+            "evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(user_id: str, template: str, topic: str) -> ContextKey:
+        return (user_id, template, normalize_prompt(topic))
+
+    def _remove(self, key: ContextKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def _store(self, key: ContextKey, answer: str, invalidated: bool) -> None:
+        now = time.time()
+        # Invalidated while fetching: the answer may predate the new documents
+        fresh_until = 0.0 if invalidated else now + self.ttl
+        self._entries[key] = _Entry(answer, fresh_until, now + self.ttl + self.stale_ttl)
+        self._entries.move_to_end(key)
+        self._user_keys.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.metrics["evictions"] += 1
+
+    async def _fetch(self, key: ContextKey, fetch: FetchContext) -> Optional[str]:
+        # Single-flight runs one fetch per key at a time
+        self._fetching[key] = False
+        try:
+            answer = await fetch()
+            # Failures are not cached; the next request asks Fastino again
+            if answer:
+                self._store(key, answer, self._fetching[key])
+            return answer
+        finally:
+            del self._fetching[key]
+
+    async def _refresh(self, key: ContextKey, fetch: FetchContext) -> None:
+        try:
+            await self._flights.do(repr(key), lambda: self._fetch(key, fetch))
+        except Exception as e:
+            logger.warning(f"⚠️  Background refresh of Fastino context for user {key[0]} failed: {e}")
+
+    async def get(self, user_id: str, template: str, topic: str, fetch: FetchContext) -> Optional[str]:
+        """
+        Return the cached answer for a context question, fetching it on a miss
+
+        Args:
+            user_id: Fastino user ID
+            template: Question template the answer was produced for
+            topic: Topic the template was filled with (normalized for the key)
+            fetch: Zero-argument callable querying Fastino for the answer
+
+        Returns:
+            Answer string, or None if Fastino returned no answer
+        """
+        if not self.enabled:
+            return await fetch()
+
+        key = self.make_key(user_id, template, topic)
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and entry.stale_until <= now:
+            self._remove(key)
+            entry = None
+
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry.fresh_until > now:
+                self.metrics["hits"] += 1
+                logger.info(f"⚡ Fastino context cache HIT for user {user_id}")
+            else:
+                self.metrics["stale_hits"] += 1
+                self.metrics["refreshes"] += 1
+                logger.info(f"⚡ Fastino context cache STALE for user {user_id}, refreshing in the background")
+                spawn_background(self._refresh(key, fetch), name=f"fastino_context_refresh:{user_id}")
+            return entry.answer
+
+        self.metrics["misses"] += 1
+        answer, _ = await self._flights.do(repr(key), lambda: self._fetch(key, fetch))
+        return answer
+
+    def invalidate_user(self, user_id: str, documents: Optional[List[Dict]] = None) -> None:
+        """
+        Mark a user's cached answers stale (called once new documents are ingested)
+
+        Args:
+            user_id: Fastino user ID
+            documents: The ingested documents; lesson prompts for a single topic
+                leave the answers for that topic fresh
+        """
+        spared_topic = _lesson_topic(documents)
+        for key in self._fetching:
+            if key[0] == user_id and key[2] != spared_topic:
+                self._fetching[key] = True
+        keys = [key for key in self._user_keys.get(user_id, ()) if key[2] != spared_topic]
+        for key in keys:
+            self._entries[key].fresh_until = 0.0
+        if keys:
+            self.metrics["invalidations"] += 1
+            logger.info(f"🧹 Marked {len(keys)} Fastino context answer(s) stale for user {user_id}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus current occupancy"""
+        return {**self.metrics, "entries": len(self._entries), "users": len(self._user_keys)}
+
+
+def _lesson_topic(documents: Optional[List[Dict]]) -> Optional[str]:
+    """Normalized topic if every document is a lesson prompt for the same topic, else None"""
+    topics = {
+        normalize_prompt(doc.get("content", "")) if doc.get("kind") == "lesson" else None
+        for doc in documents or ()
+    }
+    if len(topics) == 1:
+        return topics.pop()
+    return None
+
+
+fastino_context_cache = ContextCache(
+    ttl=FASTINO_CONTEXT_CACHE_TTL,
+    stale_ttl=FASTINO_CONTEXT_CACHE_STALE_TTL,
+    max_entries=FASTINO_CONTEXT_CACHE_MAX_ENTRIES,
+    enabled=FASTINO_CONTEXT_CACHE_ENABLED,
+)
@@ -0,0 +1,67 @@
+"""
+Fast JSON Responses
+Serializes already-built response dicts straight to bytes, bypassing FastAPI's
+response_model re-validation. Uses orjson when it is installed and falls back to
+compact stdlib json otherwise.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Mapping, Optional
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Serve lesson and quiz bodies through FastJSONResponse instead of response_model validation
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            # e.g. integers beyond 64 bits or non-str keys orjson refuses; stdlib copes
+            pass
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps() (no indentation, non-ASCII kept as UTF-8)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_response(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> JSONResponse:
+    """
+    Build a FastJSONResponse (a plain JSONResponse when FAST_JSON_RESPONSES is off),
+    carrying over headers set on FastAPI's injected Response
+
+    Args:
+        content: JSON-ready value (dicts of str/int/float/bool/None/lists)
+        status_code: HTTP status
+        headers: Extra headers, e.g. the injected Response's headers (content-length is skipped)
+    """
+    extra = {
+        key: value for key, value in (headers or {}).items()
+        if key.lower() != "content-length"
+    }
+    response_class = FastJSONResponse if FAST_JSON_RESPONSES else JSONResponse
+    return response_class(content, status_code=status_code, headers=extra)
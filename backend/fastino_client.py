@@ -7,10 +7,17 @@ import os
 import json
 import logging
 import time
+import uuid
 from datetime import datetime
 from typing import Optional, Dict, List
 import httpx
 from dotenv import load_dotenv
+from http_clients import get_client, FASTINO
+from circuit_breaker import get_breaker, CircuitOpenError
+from hedging import hedged, hedge_budget
+from admission import fastino_admission, AdmissionRejected
+from log_utils import log_payload, Preview
+from metrics import errors
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +29,15 @@ logger = logging.getLogger(__name__)
 FASTINO_API_KEY = "pio_sk_ny8hbA7sXh93U4QHr4v3n_17031467-4080-4cca-a7be-0896fec4bad1"
 FASTINO_API_URL = os.getenv("FASTINO_API_URL", "https://api.fastino.ai")
 
+# Timeout ceilings (fixed worst case) and floors for the adaptive per-call timeouts
+FASTINO_QUERY_TIMEOUT = (100.0, 5.0)
+FASTINO_REGISTER_TIMEOUT = (100.0, 5.0)
+FASTINO_INGEST_TIMEOUT = (10.0, 2.0)
+
+# Query hedging: a second identical /query is sent once the first is slower than this latency percentile
+FASTINO_HEDGE_ENABLED = os.getenv("FASTINO_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+FASTINO_HEDGE_PERCENTILE = float(os.getenv("FASTINO_HEDGE_PERCENTILE", "95"))
+
 
 async def register_user(email: str, name: str, age: int, tone: str) -> Optional[Dict]:
     """
@@ -57,25 +73,31 @@ async def register_user(email: str, name: str, age: int, tone: str) -> Optional[
     # Log the payload being sent
     logger.info(f"📤 Registering user with Fastino")
     logger.info(f"📝 Email: {email}, Name: {name}, Age: {age}, Tone: {tone}")
-    logger.info(f"📦 Payload: {json.dumps(payload, indent=2)}")
+    log_payload(logger, "📦 Payload", payload)
     
     # Log headers for debugging (mask API key)
     logger.info(f"📡 Fastino Register URL: {url}")
     logger.info(f"🔑 x-api-key header: {FASTINO_API_KEY[:20]}...{FASTINO_API_KEY[-10:] if len(FASTINO_API_KEY) > 30 else '***'}")
     
     try:
-        async with httpx.AsyncClient(timeout=100.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
+        client = get_client(FASTINO)
+        ceiling, floor = FASTINO_REGISTER_TIMEOUT
+        async with fastino_admission.slot(), get_breaker(FASTINO).call("register", ceiling, floor) as call:
+            response = await client.post(url, headers=headers, json=payload, timeout=call.timeout)
+            call.check(response)
+        
+        if response.is_success:
+            data = response.json()
+            user_id = data.get("user_id")
+            logger.info(f"✅ Successfully registered user with Fastino: {user_id}")
+            return data
+        else:
+            logger.warning("⚠️  Fastino registration failed: %s - %s", response.status_code, Preview(response.text))
+            return None
             
-            if response.is_success:
-                data = response.json()
-                user_id = data.get("user_id")
-                logger.info(f"✅ Successfully registered user with Fastino: {user_id}")
-                return data
-            else:
-                logger.warning(f"⚠️  Fastino registration failed: {response.status_code} - {response.text}")
-                return None
-                
+    except (CircuitOpenError, AdmissionRejected) as e:
+        logger.warning(f"⚠️  Skipping Fastino registration: {e}")
+        return None
     except httpx.TimeoutException:
         logger.warning("⚠️  Fastino registration request timed out")
         return None
@@ -87,89 +109,73 @@ async def register_user(email: str, name: str, age: int, tone: str) -> Optional[
         return None
 
 
-async def ingest_lesson(user_id: str, topic: str) -> bool:
+def _new_doc_id(kind: str) -> str:
+    # Millisecond timestamp plus a random suffix so documents batched together never collide under dedupe
+    return f"{kind}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+
+
+def build_lesson_document(topic: str) -> Dict:
     """
-    Ingest lesson data to Fastino AI as a document
+    Build the Fastino document for a lesson prompt
     
     Args:
-        user_id: Fastino user ID
         topic: Lesson topic/prompt
         
     Returns:
-        True if successful, False on failure
+        Document dict for the /ingest documents array
     """
-    if not FASTINO_API_KEY:
-        logger.warning("⚠️  FASTINO_API_KEY not configured")
-        return False
-    
-    url = f"{FASTINO_API_URL}/ingest"
-    headers = {
-        "x-api-key": FASTINO_API_KEY,
-        "Content-Type": "application/json"
+    return {
+        "doc_id": _new_doc_id("lesson"),
+        "kind": "lesson",
+        "title": f"Lesson: {topic}",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "content": topic,  # user lesson prompt
+        "document_type": "lesson"
     }
-    
-    # Generate unique doc_id
-    doc_id = f"lesson_{int(time.time() * 1000)}"
-    
-    payload = {
-        "user_id": user_id,
-        "source": "learnai",
-        "documents": [
-            {
-                "doc_id": doc_id,
-                "kind": "lesson",
-                "title": f"Lesson: {topic}",
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "content": topic,  # user lesson prompt
-                "document_type": "lesson"
-            }
-        ],
-        "options": {
-            "dedupe": True
-        }
-    }
-    
-    # Log the payload and headers being sent (mask API key for security)
-    logger.info(f"📤 Ingesting lesson for user {user_id}")
-    logger.info(f"📝 Lesson prompt/topic: {topic}")
-    logger.info(f"📡 Fastino API URL: {url}")
-    logger.info(f"🔑 x-api-key header: {FASTINO_API_KEY[:20]}...{FASTINO_API_KEY[-10:] if len(FASTINO_API_KEY) > 30 else '***'}")
-    logger.info(f"📦 Payload: {json.dumps(payload, indent=2)}")
-    
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            
-            if response.is_success:
-                logger.info(f"✅ Successfully ingested lesson data for user {user_id}")
-                return True
-            else:
-                logger.warning(f"⚠️  Fastino lesson ingestion failed: {response.status_code} - {response.text}")
-                return False
-                
-    except httpx.TimeoutException:
-        logger.warning("⚠️  Fastino lesson ingestion request timed out")
-        return False
-    except httpx.RequestError as e:
-        logger.warning(f"⚠️  Fastino lesson ingestion request error: {e}")
-        return False
-    except Exception as e:
-        logger.warning(f"⚠️  Unexpected error during Fastino lesson ingestion: {e}")
-        return False
 
 
-async def ingest_quiz(user_id: str, topic: str, question: str, answer: str, user_answer: str, verdict: str) -> bool:
+def build_quiz_document(topic: str, question: str, answer: str, user_answer: str, verdict: str) -> Dict:
     """
-    Ingest quiz data to Fastino AI as a document
+    Build the Fastino document for an answered quiz question
     
     Args:
-        user_id: Fastino user ID
         topic: Lesson topic
         question: Quiz question text
         answer: Correct answer text
         user_answer: User's answer text
         verdict: "correct" or "wrong"
         
+    Returns:
+        Document dict for the /ingest documents array
+    """
+    # Create content string with quiz information
+    content = f"Quiz Question: {question}\nCorrect Answer: {answer}\nUser Answer: {user_answer}\nVerdict: {verdict}"
+    
+    return {
+        "doc_id": _new_doc_id("quiz"),
+        "kind": "quiz",
+        "title": f"Quiz: {topic} - {question[:50]}...",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "content": content,
+        "document_type": "quiz",
+        "metadata": {
+            "topic": topic,
+            "question": question,
+            "correct_answer": answer,
+            "user_answer": user_answer,
+            "verdict": verdict
+        }
+    }
+
+
+async def ingest_documents(user_id: str, documents: List[Dict]) -> bool:
+    """
+    Ingest a batch of documents for one user to Fastino AI in a single /ingest call
+    
+    Args:
+        user_id: Fastino user ID
+        documents: Documents built by build_lesson_document / build_quiz_document
+        
     Returns:
         True if successful, False on failure
     """
@@ -183,66 +189,72 @@ async def ingest_quiz(user_id: str, topic: str, question: str, answer: str, user
         "Content-Type": "application/json"
     }
     
-    # Generate unique doc_id
-    doc_id = f"quiz_{int(time.time() * 1000)}"
-    
-    # Create content string with quiz information
-    content = f"Quiz Question: {question}\nCorrect Answer: {answer}\nUser Answer: {user_answer}\nVerdict: {verdict}"
-    
     payload = {
         "user_id": user_id,
         "source": "learnai",
-        "documents": [
-            {
-                "doc_id": doc_id,
-                "kind": "quiz",
-                "title": f"Quiz: {topic} - {question[:50]}...",
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "content": content,
-                "document_type": "quiz",
-                "metadata": {
-                    "topic": topic,
-                    "question": question,
-                    "correct_answer": answer,
-                    "user_answer": user_answer,
-                    "verdict": verdict
-                }
-            }
-        ],
+        "documents": documents,
         "options": {
             "dedupe": True
         }
     }
     
-    # Log the payload and headers being sent
-    logger.info(f"📤 Ingesting quiz data for user {user_id}")
-    logger.info(f"📝 Quiz topic: {topic}, Question: {question[:50]}...")
+    # Log the payload and headers being sent (mask API key for security)
+    kinds = ", ".join(sorted({doc.get("kind", "?") for doc in documents}))
+    logger.info(f"📤 Ingesting {len(documents)} document(s) ({kinds}) for user {user_id}")
     logger.info(f"📡 Fastino API URL: {url}")
     logger.info(f"🔑 x-api-key header: {FASTINO_API_KEY[:20]}...{FASTINO_API_KEY[-10:] if len(FASTINO_API_KEY) > 30 else '***'}")
-    logger.info(f"📦 Payload: {json.dumps(payload, indent=2)}")
+    log_payload(logger, "📦 Payload", payload)
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
+        client = get_client(FASTINO)
+        ceiling, floor = FASTINO_INGEST_TIMEOUT
+        async with fastino_admission.slot(), get_breaker(FASTINO).call("ingest", ceiling, floor) as call:
+            response = await client.post(url, headers=headers, json=payload, timeout=call.timeout)
+            call.check(response)
+        
+        if response.is_success:
+            logger.info(f"✅ Successfully ingested {len(documents)} document(s) for user {user_id}")
+            return True
+        else:
+            logger.warning("⚠️  Fastino ingestion failed: %s - %s", response.status_code, Preview(response.text))
+            return False
             
-            if response.is_success:
-                logger.info(f"✅ Successfully ingested quiz data for user {user_id}")
-                return True
-            else:
-                logger.warning(f"⚠️  Fastino quiz ingestion failed: {response.status_code} - {response.text}")
-                return False
-                
+    except (CircuitOpenError, AdmissionRejected) as e:
+        logger.warning(f"⚠️  Deferring Fastino ingestion: {e}")
+        return False
     except httpx.TimeoutException:
-        logger.warning("⚠️  Fastino quiz ingestion request timed out")
+        logger.warning("⚠️  Fastino ingestion request timed out")
         return False
     except httpx.RequestError as e:
-        logger.warning(f"⚠️  Fastino quiz ingestion request error: {e}")
+        logger.warning(f"⚠️  Fastino ingestion request error: {e}")
         return False
     except Exception as e:
-        logger.warning(f"⚠️  Unexpected error during Fastino quiz ingestion: {e}")
+        logger.warning(f"⚠️  Unexpected error during Fastino ingestion: {e}")
         return False
 
 
+async def _send_query(url: str, headers: Dict, payload: Dict) -> httpx.Response:
+    """POST one /query through Fastino admission control and the circuit breaker"""
+    client = get_client(FASTINO)
+    ceiling, floor = FASTINO_QUERY_TIMEOUT
+    async with fastino_admission.slot(), get_breaker(FASTINO).call("query", ceiling, floor) as call:
+        response = await client.post(url, headers=headers, json=payload, timeout=call.timeout)
+        call.check(response)
+    return response
+
+
+def _query_answered(response: httpx.Response) -> bool:
+    """A /query response that can win a hedge race (5xx and 429 are worth waiting out on the other call)"""
+    return response.status_code < 500 and response.status_code != 429
+
+
+def _query_hedge_delay() -> Optional[float]:
+    """Seconds before a /query is hedged (None when hedging is off or latencies are not known yet)"""
+    if not FASTINO_HEDGE_ENABLED:
+        return None
+    return get_breaker(FASTINO).latency_percentile("query", FASTINO_HEDGE_PERCENTILE)
+
+
 async def query_fastino(user_id: str, question: str, use_cache: bool = False) -> Optional[str]:
     """
     Query Fastino AI for personalized context
@@ -270,54 +282,50 @@ async def query_fastino(user_id: str, question: str, use_cache: bool = False) ->
         "use_cache": use_cache
     }
     
-    # Log the full payload and headers for debugging
-    logger.info("=" * 80)
-    logger.info("📤 Fastino Query Request:")
-    logger.info("=" * 80)
-    logger.info(f"📡 URL: {url}")
+    # Log the request (the payload only at DEBUG)
+    logger.info(f"📤 Fastino Query Request: {url}")
     logger.info(f"🔑 x-api-key header: {FASTINO_API_KEY[:20]}...{FASTINO_API_KEY[-10:] if len(FASTINO_API_KEY) > 30 else '***'}")
-    logger.info(f"📦 Payload:")
-    logger.info(json.dumps(payload, indent=2))
-    logger.info("=" * 80)
+    log_payload(logger, "📦 Payload", payload)
     
     try:
-        async with httpx.AsyncClient(timeout=100.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            
-            # Log the raw response
-            raw_response_text = response.text
-            logger.info("=" * 80)
-            logger.info(f"📥 Fastino Query Response (Status: {response.status_code}):")
-            logger.info("=" * 80)
-            logger.info(raw_response_text)
-            logger.info("=" * 80)
-            
-            if response.is_success:
-                try:
-                    data = response.json()
-                    logger.info("=" * 80)
-                    logger.info("📋 Parsed Fastino Query Response:")
-                    logger.info("=" * 80)
-                    logger.info(json.dumps(data, indent=2))
-                    logger.info("=" * 80)
-                    
-                    # Fastino returns answer in "answer" field
-                    answer = data.get("answer", "")
-                    if answer:
-                        logger.info(f"✅ Retrieved answer from Fastino for user {user_id}")
-                        logger.info(f"📝 Answer: {answer[:200]}...")
-                        return answer
-                    else:
-                        logger.warning("⚠️  No answer field in Fastino response")
-                        return None
-                except json.JSONDecodeError as e:
-                    logger.error(f"❌ Failed to parse query response as JSON: {e}")
-                    logger.error(f"   Raw response: {raw_response_text[:500]}")
+        response = await hedged(
+            lambda: _send_query(url, headers, payload),
+            _query_hedge_delay(),
+            hedge_budget,
+            name="Fastino query",
+            is_success=_query_answered
+        )
+        
+        # Log the raw response (preview only at DEBUG)
+        logger.info(f"📥 Fastino Query Response (Status: {response.status_code})")
+        log_payload(logger, "📥 Raw response", response.text)
+        
+        if response.is_success:
+            try:
+                data = response.json()
+                
+                # Fastino returns answer in "answer" field
+                answer = data.get("answer", "")
+                if answer:
+                    logger.info(f"✅ Retrieved answer from Fastino for user {user_id}")
+                    log_payload(logger, "📝 Answer", answer, limit=200)
+                    return answer
+                else:
+                    logger.warning("⚠️  No answer field in Fastino response")
                     return None
-            else:
-                logger.warning(f"⚠️  Fastino query failed: {response.status_code} - {raw_response_text}")
+            except json.JSONDecodeError as e:
+                errors.inc("fastino_query", "parse_error")
+                logger.error(f"❌ Failed to parse query response as JSON: {e}")
+                logger.error("   Raw response: %s", Preview(response.text, 500))
                 return None
-                
+        else:
+            logger.warning("⚠️  Fastino query failed: %s - %s", response.status_code, Preview(response.text))
+            return None
+            
+    except (CircuitOpenError, AdmissionRejected) as e:
+        # Fail fast while Fastino is unhealthy or saturated so callers fall back to the plain prompt
+        logger.warning(f"⚠️  Skipping Fastino query: {e}")
+        return None
     except httpx.TimeoutException:
         logger.warning("⚠️  Fastino query request timed out")
         return None
@@ -0,0 +1,125 @@
+"""
+Request Hedging
+Cuts tail latency of idempotent upstream calls: if the first request has not answered
+within a recent latency percentile, an identical second request is sent and whichever
+completes first wins. A global budget caps the extra traffic hedges add.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Hedging configuration
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))  # hedges allowed per primary request
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "5"))  # hedges that can be saved up while traffic is quiet
+
+T = TypeVar("T")
+
+
+class HedgeBudget:
+    """
+    Token bucket shared by all hedged calls
+
+    Every primary request deposits ratio tokens (up to burst) and every hedge
+    spends one, so hedges never add more than about ratio of the primary traffic.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self.metrics: Dict[str, int] = {"requests": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0}
+
+    def deposit(self) -> None:
+        self.metrics["requests"] += 1
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens < 1.0:
+            self.metrics["budget_exhausted"] += 1
+            return False
+        self._tokens -= 1.0
+        self.metrics["hedges"] += 1
+        return True
+
+    def stats(self) -> dict:
+        """Hedge counters plus the remaining budget"""
+        requests = self.metrics["requests"]
+        return {
+            **self.metrics,
+            "tokens": round(self._tokens, 2),
+            "amplification": round(self.metrics["hedges"] / requests, 4) if requests else 0.0,
+        }
+
+
+async def hedged(
+    send: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    budget: HedgeBudget,
+    name: str = "request",
+    is_success: Optional[Callable[[T], bool]] = None,
+) -> T:
+    """
+    Run send(), hedging it with a second identical call if it is slow
+
+    Args:
+        send: Zero-argument callable issuing the (idempotent) request
+        hedge_after: Seconds to wait before hedging, or None to never hedge
+        budget: Budget the hedge is paid from
+        name: Label used in log messages
+        is_success: Whether a result counts as a success (e.g. not a 5xx response);
+            failed results never win, the other call is awaited instead
+
+    Returns:
+        The result of whichever call completes successfully first, or the last
+        failed result if no call succeeds
+
+    Raises:
+        The last error if every call raises
+    """
+    budget.deposit()
+    primary = asyncio.ensure_future(send())
+    if hedge_after is None:
+        return await primary
+
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done or not budget.try_spend():
+            return await primary
+
+        logger.info(f"🪞 Hedging {name} after {hedge_after * 1000:.0f}ms without a response")
+        hedge = asyncio.ensure_future(send())
+        pending.add(hedge)
+        error: Optional[BaseException] = None
+        failed_results: List[T] = []
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                result = task.result()
+                if is_success is not None and not is_success(result):
+                    failed_results.append(result)
+                    continue
+                if task is hedge:
+                    budget.metrics["hedge_wins"] += 1
+                return result
+        if failed_results:
+            return failed_results[-1]
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST)
@@ -0,0 +1,160 @@
+"""
+Shared HTTP Client Registry
+Keeps one pooled httpx.AsyncClient per upstream (Airia, Fastino) so that
+TCP/TLS connections are reused across requests instead of re-established per call
+"""
+
+import os
+import logging
+from typing import Dict, Optional
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Upstream names used as registry keys
+AIRIA = "airia"
+FASTINO = "fastino"
+
+# Pool configuration (shared defaults, overridable per upstream with e.g. AIRIA_HTTP_MAX_CONNECTIONS)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Default timeouts per upstream (individual calls may still override with timeout=)
+DEFAULT_TIMEOUTS = {
+    AIRIA: httpx.Timeout(300.0, connect=30.0),  # 5 minutes total, 30s connect
+    FASTINO: httpx.Timeout(100.0, connect=10.0),
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, "_CountingTransport"] = {}
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """Response body that ends its request's in-flight count once it is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, transport: "_CountingTransport"):
+        self._stream = stream
+        self._transport = transport
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._transport.in_flight -= 1
+        await self._stream.aclose()
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport to count requests in flight (from send until the response body is closed)"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+        self.in_flight = 0
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        response.stream = _CountedStream(response.stream, self)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _env_override(upstream: str, name: str, default):
+    """Read a per-upstream override such as FASTINO_HTTP_MAX_CONNECTIONS"""
+    value = os.getenv(f"{upstream.upper()}_{name}")
+    if value is None:
+        return default
+    return type(default)(value)
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    """Create a pooled client for the given upstream"""
+    limits = httpx.Limits(
+        max_connections=_env_override(upstream, "HTTP_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_override(upstream, "HTTP_MAX_KEEPALIVE_CONNECTIONS", HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=_env_override(upstream, "HTTP_KEEPALIVE_EXPIRY", HTTP_KEEPALIVE_EXPIRY),
+    )
+    http2 = HTTP2_ENABLED and _http2_available()
+    if HTTP2_ENABLED and not http2:
+        logger.warning("⚠️  HTTP2_ENABLED is set but the 'h2' package is not installed, falling back to HTTP/1.1")
+
+    logger.info(
+        f"🔌 Creating pooled HTTP client for {upstream}: "
+        f"max_connections={limits.max_connections}, keepalive={limits.max_keepalive_connections}, http2={http2}"
+    )
+    transport = _CountingTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+    _transports[upstream] = transport
+    return httpx.AsyncClient(
+        timeout=DEFAULT_TIMEOUTS.get(upstream, httpx.Timeout(30.0)),
+        transport=transport,
+    )
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    """
+    Get the shared client for an upstream, creating it on first use
+
+    Args:
+        upstream: Registry key (AIRIA or FASTINO)
+
+    Returns:
+        Pooled httpx.AsyncClient
+    """
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = _build_client(upstream)
+        _clients[upstream] = client
+    return client
+
+
+async def startup(upstreams: Optional[list] = None) -> None:
+    """Eagerly create the pooled clients (called from the app lifespan)"""
+    for upstream in upstreams or [AIRIA, FASTINO]:
+        get_client(upstream)
+
+
+async def shutdown() -> None:
+    """Close every pooled client (called from the app lifespan)"""
+    for upstream, client in list(_clients.items()):
+        try:
+            await client.aclose()
+            logger.info(f"🔌 Closed pooled HTTP client for {upstream}")
+        except Exception as e:
+            logger.warning(f"⚠️  Error closing HTTP client for {upstream}: {e}")
+    _clients.clear()
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Requests in flight and sent so far per upstream (counted here; httpx does not expose its pool)"""
+    return {
+        upstream: {"in_flight": transport.in_flight, "requests": transport.requests}
+        for upstream, transport in _transports.items()
+    }
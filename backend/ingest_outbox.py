@@ -0,0 +1,154 @@
+"""
+Fastino Ingestion Outbox
+Durable SQLite outbox of Fastino documents waiting to be ingested. Appends are a
+single WAL-mode insert (no fsync per commit), so documents survive a process crash
+or restart and are replayed by the drainer in ingest_queue. The methods block on
+SQLite and are called from worker threads (asyncio.to_thread), one at a time.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Outbox location (":memory:" keeps it in-process only, without crash recovery)
+FASTINO_OUTBOX_PATH = os.getenv(
+    "FASTINO_OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fastino_outbox.sqlite3")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    document TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_user ON outbox (dead, user_id, id);
+"""
+
+OutboxRow = Tuple[int, Dict, int]  # (row id, document, attempts)
+
+
+class IngestOutbox:
+    """
+    Append-only SQLite table of pending documents
+
+    Rows are deleted once ingested. Failed rows are rescheduled with a later
+    next_attempt_at, and rows that exhaust their attempts are marked dead
+    (kept for inspection, never retried). A lock serializes use of the
+    connection across threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.pending = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def append(self, user_id: str, document: Dict) -> int:
+        """Durably record a document; returns its row id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (user_id, document, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (user_id, json.dumps(document), now, now)
+            )
+            self.pending += 1
+        return cursor.lastrowid
+
+    def user_summaries(self) -> List[Tuple[str, int, float, float]]:
+        """
+        Per-user view of pending rows
+
+        Returns:
+            (user_id, due row count, oldest due created_at, earliest next_attempt_at)
+            for every user with pending rows
+        """
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT user_id,
+                       SUM(next_attempt_at <= ?),
+                       MIN(CASE WHEN next_attempt_at <= ? THEN created_at END),
+                       MIN(next_attempt_at)
+                FROM outbox WHERE dead = 0 GROUP BY user_id
+                """,
+                (now, now)
+            ).fetchall()
+
+    def take_due(self, user_id: str, limit: int) -> List[OutboxRow]:
+        """Oldest due rows of a user, up to limit"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, document, attempts FROM outbox WHERE dead = 0 AND user_id = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (user_id, time.time(), limit)
+            ).fetchall()
+        return [(row_id, json.loads(document), attempts) for row_id, document, attempts in rows]
+
+    def delete(self, row_ids: Iterable[int]) -> None:
+        """Remove ingested rows"""
+        row_ids = list(row_ids)
+        with self._lock:
+            deleted = self._conn.execute(
+                f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(row_ids))})", row_ids
+            ).rowcount
+            self.pending -= deleted
+
+    def reschedule(self, rows: List[OutboxRow], next_attempt_at: float, max_attempts: int) -> int:
+        """
+        Record a failed attempt for rows taken with take_due and retry them at next_attempt_at
+
+        Returns:
+            Number of rows that exhausted max_attempts (0 = unlimited) and were marked dead
+        """
+        placeholders = ",".join("?" * len(rows))
+        dead = sum(1 for _, _, attempts in rows if 0 < max_attempts <= attempts + 1)
+        with self._lock:
+            self._conn.execute(
+                f"""
+                UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?,
+                                  dead = (? > 0 AND attempts + 1 >= ?)
+                WHERE id IN ({placeholders})
+                """,
+                (next_attempt_at, max_attempts, max_attempts, *[row_id for row_id, _, _ in rows])
+            )
+            self.pending -= dead
+        return dead
+
+    def dead_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_outbox(path: Optional[str] = None) -> IngestOutbox:
+    """Open the outbox, falling back to an in-memory one if the file cannot be used"""
+    path = path or FASTINO_OUTBOX_PATH
+    try:
+        return IngestOutbox(path)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️  Could not open Fastino outbox at {path}: {e}. Falling back to an in-memory outbox.")
+        return IngestOutbox(":memory:")
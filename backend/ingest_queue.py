@@ -0,0 +1,249 @@
+"""
+Fastino Ingestion Buffer
+Write-behind batching of Fastino documents: documents are committed to a durable
+outbox and sent per user_id in a single /ingest call once a user has a full batch
+or its oldest document reaches the maximum age. Failed batches are retried with
+exponential backoff, and whatever is left in the outbox is replayed on restart.
+Once a batch is ingested, the user's cached Fastino context answers are invalidated.
+The number of pending documents is capped, and enqueueing waits briefly for room
+(backpressure) before giving up. Outbox reads and writes run in worker threads,
+off the event loop.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from dotenv import load_dotenv
+from stages import spawn_background
+from fastino_client import ingest_documents
+from ingest_outbox import IngestOutbox, OutboxRow, open_outbox
+from context_cache import fastino_context_cache
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Ingestion buffer configuration
+FASTINO_INGEST_BATCH_SIZE = int(os.getenv("FASTINO_INGEST_BATCH_SIZE", "20"))
+FASTINO_INGEST_MAX_AGE = float(os.getenv("FASTINO_INGEST_MAX_AGE", "2.0"))  # seconds
+FASTINO_INGEST_MAX_PENDING = int(os.getenv("FASTINO_INGEST_MAX_PENDING", "1000"))
+FASTINO_INGEST_ENQUEUE_TIMEOUT = float(os.getenv("FASTINO_INGEST_ENQUEUE_TIMEOUT", "1.0"))  # seconds
+FASTINO_INGEST_RETRY_BASE = float(os.getenv("FASTINO_INGEST_RETRY_BASE", "1.0"))  # seconds
+FASTINO_INGEST_RETRY_MAX = float(os.getenv("FASTINO_INGEST_RETRY_MAX", "300.0"))  # seconds
+FASTINO_INGEST_MAX_ATTEMPTS = int(os.getenv("FASTINO_INGEST_MAX_ATTEMPTS", "0"))  # 0 = retry forever
+
+SendBatch = Callable[[str, List[Dict]], Awaitable[bool]]
+OnIngested = Callable[[str, List[Dict]], None]
+
+
+class IngestQueueFull(Exception):
+    """Raised when a document cannot be buffered because too many are pending"""
+
+
+class IngestBuffer:
+    """
+    Per-user write-behind buffer of Fastino documents backed by a durable outbox
+
+    Pending documents (in the outbox, including in-flight ones) are capped at
+    max_pending; a full outbox makes enqueue() wait up to enqueue_timeout for a
+    batch to complete. At most one batch per user is in flight, so a user's
+    documents are ingested in order. on_ingested(user_id, documents) is called
+    after every successful batch.
+    """
+
+    def __init__(
+        self,
+        send: SendBatch,
+        outbox: IngestOutbox,
+        batch_size: int,
+        max_age: float,
+        max_pending: int,
+        enqueue_timeout: float,
+        retry_base: float,
+        retry_max: float,
+        max_attempts: int,
+        on_ingested: Optional[OnIngested] = None,
+    ):
+        self._send = send
+        self._outbox = outbox
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self._on_ingested = on_ingested
+        self._sending: Set[str] = set()
+        # Appends already admitted under max_pending but not yet written to the outbox
+        self._appending = 0
+        self._space = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._drainer: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, int] = {
+            "enqueued": 0,
+            "batches": 0,
+            "documents_sent": 0,
+            "documents_failed": 0,
+            "retries": 0,
+            "dead": 0,
+            "backpressure_waits": 0,
+            "rejected": 0,
+        }
+
+    def start(self) -> None:
+        """Start the drainer, replaying whatever the outbox still holds (called from the app lifespan)"""
+        if self._outbox.pending:
+            logger.info(f"♻️  Replaying {self._outbox.pending} pending Fastino document(s) from the outbox")
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain(), name="fastino_ingest_drainer")
+
+    async def enqueue(self, user_id: str, document: Dict) -> None:
+        """
+        Durably record a document for a user and let the drainer batch it
+
+        Raises:
+            IngestQueueFull: If no room frees up within enqueue_timeout
+        """
+        if not self._has_room():
+            self.metrics["backpressure_waits"] += 1
+            try:
+                async with self._space:
+                    await asyncio.wait_for(self._space.wait_for(self._has_room), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.metrics["rejected"] += 1
+                raise IngestQueueFull(f"Fastino ingestion buffer is full ({self._outbox.pending} documents pending)")
+
+        self._appending += 1
+        try:
+            await asyncio.to_thread(self._outbox.append, user_id, document)
+        finally:
+            self._appending -= 1
+        self.metrics["enqueued"] += 1
+        self._wakeup.set()
+        if self._drainer is None or self._drainer.done():
+            self.start()
+
+    def _has_room(self) -> bool:
+        return self._outbox.pending + self._appending < self.max_pending
+
+    def _backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter for a batch that failed attempts times"""
+        delay = min(self.retry_base * (2 ** (attempts - 1)), self.retry_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _dispatch(self, force: bool = False) -> Optional[float]:
+        """
+        Start a batch for every user that is due
+
+        Args:
+            force: Send every user's due documents regardless of batch size and age
+
+        Returns:
+            Seconds until the next user becomes due, or None if nothing is waiting
+        """
+        summaries = await asyncio.to_thread(self._outbox.user_summaries)
+        now = time.time()
+        next_due = None
+        for user_id, due_count, oldest_due, earliest_attempt in summaries:
+            if user_id in self._sending:
+                continue
+            if due_count and (force or due_count >= self.batch_size or now - oldest_due >= self.max_age):
+                self._sending.add(user_id)
+                try:
+                    rows = await asyncio.to_thread(self._outbox.take_due, user_id, self.batch_size)
+                except BaseException:
+                    self._sending.discard(user_id)
+                    raise
+                if not rows:
+                    # Sent by a batch that finished after the summary was read
+                    self._sending.discard(user_id)
+                    continue
+                spawn_background(self._send_batch(user_id, rows), name=f"fastino_ingest_batch:{user_id}")
+                continue
+            # Due by age, or when a backed-off retry becomes due
+            due_at = oldest_due + self.max_age if due_count else earliest_attempt
+            next_due = due_at if next_due is None else min(next_due, due_at)
+        return None if next_due is None else max(next_due - now, 0.01)
+
+    async def _drain(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self._dispatch()
+            except Exception as e:
+                logger.warning(f"⚠️  Fastino outbox drain failed: {e}")
+                timeout = self.retry_base
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_batch(self, user_id: str, rows: List[OutboxRow]) -> None:
+        self.metrics["batches"] += 1
+        documents = [document for _, document, _ in rows]
+        try:
+            sent = await self._send(user_id, documents)
+        except Exception as e:
+            logger.warning(f"⚠️  Error sending Fastino ingestion batch for user {user_id}: {e}")
+            sent = False
+
+        try:
+            if sent:
+                await asyncio.to_thread(self._outbox.delete, [row_id for row_id, _, _ in rows])
+                self.metrics["documents_sent"] += len(rows)
+                if self._on_ingested is not None:
+                    self._on_ingested(user_id, documents)
+            else:
+                attempts = max(attempts for _, _, attempts in rows) + 1
+                delay = self._backoff(attempts)
+                dead = await asyncio.to_thread(self._outbox.reschedule, rows, time.time() + delay, self.max_attempts)
+                self.metrics["documents_failed"] += len(rows)
+                self.metrics["retries"] += len(rows) - dead
+                self.metrics["dead"] += dead
+                logger.warning(
+                    f"⚠️  Fastino ingest of {len(rows)} document(s) for user {user_id} failed "
+                    f"(attempt {attempts}), retrying in {delay:.1f}s"
+                    + (f"; {dead} document(s) exhausted their attempts" if dead else "")
+                )
+        finally:
+            self._sending.discard(user_id)
+            self._wakeup.set()
+            async with self._space:
+                self._space.notify_all()
+
+    async def close(self) -> None:
+        """Stop the drainer and attempt one last send of everything due (called on shutdown)"""
+        if self._drainer is not None:
+            self._drainer.cancel()
+            await asyncio.gather(self._drainer, return_exceptions=True)
+            self._drainer = None
+        await self._dispatch(force=True)
+
+    def stats(self) -> dict:
+        """Buffer counters plus current outbox occupancy"""
+        return {
+            **self.metrics,
+            "pending": self._outbox.pending,
+            "sending_users": len(self._sending),
+            "outbox": self._outbox.path,
+        }
+
+
+ingest_buffer = IngestBuffer(
+    send=ingest_documents,
+    outbox=open_outbox(),
+    batch_size=FASTINO_INGEST_BATCH_SIZE,
+    max_age=FASTINO_INGEST_MAX_AGE,
+    max_pending=FASTINO_INGEST_MAX_PENDING,
+    enqueue_timeout=FASTINO_INGEST_ENQUEUE_TIMEOUT,
+    retry_base=FASTINO_INGEST_RETRY_BASE,
+    retry_max=FASTINO_INGEST_RETRY_MAX,
+    max_attempts=FASTINO_INGEST_MAX_ATTEMPTS,
+    on_ingested=fastino_context_cache.invalidate_user,
+)
@@ -0,0 +1,185 @@
+"""
+Background Job Runner
+Runs long pipeline executions in a bounded worker pool so the client gets a job id
+right away and polls for the result instead of holding a connection open
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Job runner configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # seconds a finished job stays retrievable
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobError(Exception):
+    """Raised by a job to fail with an HTTP-style status code and message"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class Job:
+    """State of one submitted job"""
+
+    def __init__(self, kind: str, factory: Callable[[], Awaitable[Any]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.factory = factory
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[dict] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        """Public view of the job (the result is only included once it succeeded)"""
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobRunner:
+    """
+    Bounded queue of jobs served by a fixed number of worker tasks
+
+    Finished jobs are kept for result_ttl seconds so clients can poll for them.
+    """
+
+    def __init__(self, workers: int, queue_max: int, result_ttl: float):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=queue_max)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._worker_tasks: List[asyncio.Task] = []
+        self.metrics = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def start(self) -> None:
+        """Start the worker tasks (called from the app lifespan)"""
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"job_worker:{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"🧵 Started {self.workers} job workers")
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; lesson generations they started are drained with the background tasks"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, factory: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Queue a job
+
+        Args:
+            kind: Job type reported back to clients (e.g. "lesson")
+            factory: Zero-argument callable returning the coroutine to run
+
+        Returns:
+            The queued Job
+
+        Raises:
+            JobQueueFull: If the queue is at capacity
+        """
+        self._prune()
+        job = Job(kind, factory)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.metrics["rejected"] += 1
+            raise JobQueueFull(f"Job queue is full ({self._queue.maxsize} jobs waiting)")
+        self._jobs[job.id] = job
+        self.metrics["submitted"] += 1
+        logger.info(f"📥 Queued {kind} job {job.id} ({self._queue.qsize()} waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id"""
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await job.factory()
+            job.status = SUCCEEDED
+            self.metrics["succeeded"] += 1
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = {"status_code": 503, "message": "Job cancelled by server shutdown"}
+            raise
+        except JobError as e:
+            job.status = FAILED
+            job.error = {"status_code": e.status_code, "message": e.message}
+            self.metrics["failed"] += 1
+        except Exception as e:
+            logger.error(f"❌ {job.kind} job {job.id} failed: {type(e).__name__}: {e}", exc_info=True)
+            job.status = FAILED
+            job.error = {"status_code": 500, "message": f"Internal server error: {str(e)}"}
+            self.metrics["failed"] += 1
+        finally:
+            job.finished_at = time.time()
+            job.factory = None
+            logger.info(f"🏁 {job.kind} job {job.id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def stats(self) -> dict:
+        """Job counters plus current queue depth"""
+        running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+        return {**self.metrics, "queued": self._queue.qsize(), "running": running, "retained": len(self._jobs)}
+
+
+job_runner = JobRunner(JOB_WORKERS, JOB_QUEUE_MAX, JOB_RESULT_TTL)
@@ -0,0 +1,245 @@
+"""
+Lesson Response Cache
+Content-addressed cache for generated lessons, keyed by the normalized user prompt
+plus a digest of the Fastino user context. Entries live in a byte-bounded in-memory
+LRU tier backed by a disk tier, both subject to a TTL.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import unicodedata
+import re
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from stages import spawn_background
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+LESSON_CACHE_ENABLED = os.getenv("LESSON_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LESSON_CACHE_MEMORY_MAX_BYTES = int(os.getenv("LESSON_CACHE_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+LESSON_CACHE_DISK_MAX_BYTES = int(os.getenv("LESSON_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+LESSON_CACHE_TTL = float(os.getenv("LESSON_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+LESSON_CACHE_DIR = os.getenv("LESSON_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".lesson_cache"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\r\n.,;:!?\"'`"
+
+
+def normalize_prompt(user_input: str) -> str:
+    """
+    Normalize a lesson prompt so trivially different spellings share a cache entry
+    ("how are clouds formed" and "How are clouds formed?" normalize the same)
+    """
+    text = unicodedata.normalize("NFKC", user_input).casefold()
+    text = _WHITESPACE_RE.sub(" ", text)
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def make_cache_key(user_input: str, user_context: Optional[str] = None) -> str:
+    """
+    Build the cache key for a lesson request
+
+    Args:
+        user_input: Lesson prompt as typed by the user
+        user_context: Fastino context answer used to personalize the prompt, if any
+
+    Returns:
+        Hex digest identifying the lesson content
+    """
+    context_digest = hashlib.sha256(user_context.encode("utf-8")).hexdigest() if user_context else "none"
+    material = f"{normalize_prompt(user_input)}\n{context_digest}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _estimate_size(lesson: dict) -> int:
+    """Approximate in-memory footprint of a lesson, dominated by the audio strings"""
+    size = len(lesson.get("topic") or "")
+    for seg in lesson.get("segments", []):
+        for value in seg.values():
+            if isinstance(value, str):
+                size += len(value)
+        size += 64  # per-segment overhead (ids, duration, dict)
+    return size
+
+
+class LessonCache:
+    """
+    Two-tier (memory LRU + disk) TTL cache of lesson data dicts
+
+    Cached lessons are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, memory_max_bytes: int, disk_max_bytes: int, ttl: float, directory: Optional[str]):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self._memory: "OrderedDict[str, Tuple[float, int, dict]]" = OrderedDict()
+        self._memory_bytes = 0
+        self.metrics: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_errors": 0,
+        }
+
+    # ===== Memory tier =====
+
+    def _memory_get(self, key: str) -> Optional[dict]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, size, lesson = entry
+        if expires_at <= time.time():
+            self._memory_remove(key)
+            self.metrics["expirations"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return lesson
+
+    def _memory_put(self, key: str, lesson: dict, expires_at: float) -> None:
+        size = _estimate_size(lesson)
+        if size > self.memory_max_bytes:
+            logger.info(f"ℹ️  Lesson {key[:12]} ({size:,} bytes) exceeds the memory cache budget, keeping it on disk only")
+            return
+        self._memory_remove(key)
+        self._memory[key] = (expires_at, size, lesson)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            evicted_key, _ = next(iter(self._memory.items()))
+            self._memory_remove(evicted_key)
+            self.metrics["evictions"] += 1
+
+    def _memory_remove(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    # ===== Disk tier =====
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _disk_read(self, key: str) -> Optional[Tuple[float, dict]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.metrics["expirations"] += 1
+            return None
+        return entry["expires_at"], entry["lesson"]
+
+    def _disk_write(self, key: str, lesson: dict, expires_at: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": expires_at, "lesson": lesson}, f)
+        os.replace(tmp_path, path)
+        self._disk_prune()
+
+    def _disk_prune(self) -> None:
+        """Drop expired entries, then the oldest ones, until the disk tier fits its budget"""
+        now = time.time()
+        files = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(entry.path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        while total > self.disk_max_bytes and files:
+            _, size, path = files.pop(0)
+            os.remove(path)
+            total -= size
+
+    async def _disk_store(self, key: str, lesson: dict, expires_at: float) -> None:
+        try:
+            await asyncio.to_thread(self._disk_write, key, lesson, expires_at)
+        except Exception as e:
+            self.metrics["disk_errors"] += 1
+            logger.warning(f"⚠️  Failed to write lesson {key[:12]} to disk cache: {e}")
+
+    # ===== Public API =====
+
+    async def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a lesson in memory, then on disk (promoting disk hits to memory)
+
+        Returns:
+            Cached lesson data dict, or None on a miss
+        """
+        lesson = self._memory_get(key)
+        if lesson is not None:
+            self.metrics["memory_hits"] += 1
+            return lesson
+
+        if self.directory:
+            try:
+                entry = await asyncio.to_thread(self._disk_read, key)
+            except Exception as e:
+                self.metrics["disk_errors"] += 1
+                logger.warning(f"⚠️  Failed to read lesson {key[:12]} from disk cache: {e}")
+                entry = None
+            if entry is not None:
+                expires_at, lesson = entry
+                self._memory_put(key, lesson, expires_at)
+                self.metrics["disk_hits"] += 1
+                return lesson
+
+        self.metrics["misses"] += 1
+        return None
+
+    def put(self, key: str, lesson: dict) -> None:
+        """Store a lesson in memory now and write it to disk in the background"""
+        expires_at = time.time() + self.ttl
+        self._memory_put(key, lesson, expires_at)
+        self.metrics["stores"] += 1
+        if self.directory:
+            spawn_background(self._disk_store(key, lesson, expires_at), name=f"lesson_cache_write:{key[:12]}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current memory tier occupancy"""
+        lookups = self.metrics["memory_hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+        hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+        return {
+            **self.metrics,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+        }
+
+
+lesson_cache = LessonCache(
+    memory_max_bytes=LESSON_CACHE_MEMORY_MAX_BYTES,
+    disk_max_bytes=LESSON_CACHE_DISK_MAX_BYTES,
+    ttl=LESSON_CACHE_TTL,
+    directory=LESSON_CACHE_DIR or None,
+)
@@ -0,0 +1,306 @@
+"""
+Lesson Segment Merging
+Pairs the audio segments of one Airia result with the narration/image segments
+of the other by segment_id. Segments are collected one at a time as they are
+parsed, and each merged segment can be handed out as soon as both halves are known.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from audio_assembly import assemble_audio_base64
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Only the first segments of each result are checked for audio_base64
+AUDIO_PROBE_SEGMENTS = 5
+
+
+class LessonMergeError(ValueError):
+    """Raised when the two results cannot be merged into a lesson"""
+
+
+class LessonSegmentMerger:
+    """
+    Collects segments from result[0] and result[1] and merges them by segment_id
+
+    The result holding audio_base64 is detected from its first segments. Results
+    arrive in document order, so the detection is usually settled while the
+    second result is still streaming. From then on on_merged(segment) is called
+    for every segment whose audio and narration/image have both been seen, and
+    again if a later duplicate segment_id changes it (the last occurrence wins,
+    as in merge()). merge() builds the final lesson with the same rules.
+    """
+
+    def __init__(self, on_merged: Optional[Callable[[dict], None]] = None):
+        self._on_merged = on_merged
+        self.audio_maps: Dict[int, dict] = {0: {}, 1: {}}
+        self.content_maps: Dict[int, dict] = {0: {}, 1: {}}
+        self.missing_audio: Dict[int, List] = {0: [], 1: []}
+        self.has_audio: Dict[int, bool] = {0: False, 1: False}
+        self._probed: Dict[int, int] = {0: 0, 1: 0}
+        self.audio_result_index: Optional[int] = None
+        self._emitted: Dict[Any, dict] = {}
+
+    @property
+    def content_result_index(self) -> Optional[int]:
+        return None if self.audio_result_index is None else 1 - self.audio_result_index
+
+    # ===== Collection =====
+
+    def add(self, result_index: int, seg: dict) -> None:
+        """Collect one segment parsed from result[result_index].output.segments"""
+        if result_index not in self.audio_maps:
+            return
+        if self._probed[result_index] < AUDIO_PROBE_SEGMENTS:
+            self._probed[result_index] += 1
+            if seg.get("audio_base64"):
+                self.has_audio[result_index] = True
+
+        segment_id = seg.get("segment_id")
+        if segment_id is None:
+            logger.warning(f"⚠️  Skipping segment with no segment_id in result[{result_index}]")
+            return
+
+        self.content_maps[result_index][segment_id] = {
+            "narration": seg.get("narration", ""),
+            "image_url": seg.get("image_url"),
+            "duration": seg.get("duration")
+        }
+
+        audio_base64 = seg.get("audio_base64")
+        if not audio_base64:
+            self.missing_audio[result_index].append(segment_id)
+        elif isinstance(audio_base64, (str, list)):
+            if isinstance(audio_base64, list):
+                logger.info(f"   📦 Segment {segment_id}: audio_base64 is a list with {len(audio_base64)} chunks - combining")
+                # Combine chunks in linear time (joined directly when 4-char aligned)
+                audio_base64 = assemble_audio_base64(audio_base64)
+            self.audio_maps[result_index][segment_id] = {
+                "audio_base64": audio_base64,
+                "audio_length": len(audio_base64)
+            }
+        else:
+            logger.warning(f"   ⚠️  Segment {segment_id}: audio_base64 has unexpected type: {type(audio_base64)}")
+
+        if self._on_merged is None:
+            return
+        if self.audio_result_index is None:
+            self._settle_detection(result_index)
+        else:
+            self._emit(segment_id)
+
+    def _settle_detection(self, result_index: int) -> None:
+        """Decide the audio result early, once the detection rules can no longer change"""
+        if self.has_audio[0]:
+            audio_result_index = 0
+        elif result_index == 1 or self._probed[0] >= AUDIO_PROBE_SEGMENTS:
+            # result[0] showed no audio in its probe window, so only result[1] can carry it
+            audio_result_index = 1
+        else:
+            return
+        self.audio_result_index = audio_result_index
+        for segment_id in list(self.content_maps[self.content_result_index]):
+            self._emit(segment_id)
+
+    def _emit(self, segment_id) -> None:
+        audio_data = self.audio_maps[self.audio_result_index].get(segment_id)
+        content_data = self.content_maps[self.content_result_index].get(segment_id)
+        if not audio_data or not content_data or not audio_data["audio_base64"]:
+            return
+        segment = _combine(segment_id, audio_data, content_data)
+        if self._emitted.get(segment_id) == segment:
+            return
+        self._emitted[segment_id] = segment
+        self._on_merged(segment)
+
+    # ===== Merge =====
+
+    def detect_audio_result(self) -> int:
+        """
+        Detect which result contains audio_base64
+
+        Returns:
+            Index of the audio result (the other one holds narration/image_url)
+
+        Raises:
+            LessonMergeError: If neither result contains audio_base64
+        """
+        logger.info("🔍 Detecting which result contains audio_base64...")
+        result0_has_audio = self.has_audio[0]
+        result1_has_audio = self.has_audio[1]
+
+        logger.info(f"   Result[0] has audio_base64: {result0_has_audio}")
+        logger.info(f"   Result[1] has audio_base64: {result1_has_audio}")
+
+        if result0_has_audio and not result1_has_audio:
+            logger.info("✅ DETECTED: Result[0] contains audio_base64, Result[1] contains narration/image_url")
+            return 0
+        if result1_has_audio and not result0_has_audio:
+            logger.info("✅ DETECTED: Result[1] contains audio_base64, Result[0] contains narration/image_url")
+            return 1
+        if result0_has_audio and result1_has_audio:
+            # Both have audio - this shouldn't happen, but use first one
+            logger.warning("⚠️  Both results contain audio_base64! Using result[0] for audio.")
+            return 0
+        logger.error("❌ Neither result contains audio_base64!")
+        raise LessonMergeError("Invalid API response: neither result contains audio_base64")
+
+    def merge(self, parsed_results: List[dict], user_input: str) -> dict:
+        """
+        Combine the collected segments into the final lesson
+
+        Args:
+            parsed_results: Parsed result[0] and result[1] outputs (used for the topic)
+            user_input: Original user prompt, used as the topic fallback
+
+        Returns:
+            Lesson data dict with topic and segments sorted by segment_id
+
+        Raises:
+            LessonMergeError: If no audio result is found or no segment can be merged
+        """
+        audio_result_index = self.detect_audio_result()
+        content_result_index = 1 - audio_result_index
+        self.audio_result_index = audio_result_index
+
+        # ===== Map segments from audio_result =====
+        audio_segments_map = self.audio_maps[audio_result_index]
+        for segment_id in self.missing_audio[audio_result_index]:
+            logger.warning(f"⚠️  Segment {segment_id} in result[{audio_result_index}] has no audio_base64")
+
+        logger.info(f"✅ Mapped {len(audio_segments_map)} audio segments from result[{audio_result_index}]")
+        audio_segment_ids = sorted(audio_segments_map.keys())
+        logger.info(f"🔍 Audio segment IDs: {audio_segment_ids}")
+
+        # ===== Map segments from content_result =====
+        content_segments_map = self.content_maps[content_result_index]
+
+        logger.info(f"✅ Mapped {len(content_segments_map)} content segments from result[{content_result_index}]")
+        content_segment_ids = sorted(content_segments_map.keys())
+        logger.info(f"🔍 Content segment IDs: {content_segment_ids}")
+
+        # ===== Combine segments by matching segment_id =====
+        logger.info("🔗 Combining segments by matching segment_id...")
+
+        # Get all unique segment IDs from both results
+        all_segment_ids = set(audio_segment_ids + content_segment_ids)
+        logger.info(f"   Total unique segment IDs: {sorted(all_segment_ids)}")
+
+        combined_segments = []
+
+        for segment_id in sorted(all_segment_ids):
+            audio_data = audio_segments_map.get(segment_id)
+            content_data = content_segments_map.get(segment_id)
+
+            if not audio_data:
+                logger.warning(f"⚠️  Segment {segment_id}: missing audio in result[{audio_result_index}], skipping")
+                continue
+
+            if not content_data:
+                logger.warning(f"⚠️  Segment {segment_id}: missing narration/image in result[{content_result_index}], skipping")
+                continue
+
+            combined_segments.append(_combine(segment_id, audio_data, content_data))
+
+        # Sort by segment_id
+        combined_segments.sort(key=lambda x: x["segment_id"])
+
+        logger.info(f"🔗 Combined {len(combined_segments)} segments")
+
+        # Validate combined segments
+        valid_segments = []
+        for seg in combined_segments:
+            if seg.get("audioBase64") and seg.get("segment_id") is not None:
+                valid_segments.append(seg)
+            else:
+                logger.warning(f"⚠️  Skipping invalid segment: {seg.get('segment_id')}")
+
+        if len(valid_segments) == 0:
+            logger.error("❌ No valid segments after combining")
+            raise LessonMergeError("No valid segments could be created from API response")
+
+        # Get topic from either result, or use user input
+        topic = (
+            parsed_results[audio_result_index].get("topic")
+            or parsed_results[content_result_index].get("topic")
+            or user_input
+        )
+
+        logger.info(f"🎓 Final Lesson Data:")
+        logger.info(f"   Topic: {topic}")
+        logger.info(f"   Valid segments: {len(valid_segments)}")
+        logger.info(f"   Segment IDs: {[s['segment_id'] for s in valid_segments]}")
+
+        return {
+            "topic": topic,
+            "segments": valid_segments
+        }
+
+
+def collect_parsed_outputs(data: Any, segment_counts: Dict[int, int]) -> List[dict]:
+    """
+    Validate a streamed Airia response and return its result[0] and result[1] outputs
+
+    Args:
+        data: Response document returned by AiriaResultStream.close() (segments emptied)
+        segment_counts: Number of segments streamed out of each result's output
+
+    Returns:
+        The two parsed outputs (used by merge() for the topic)
+
+    Raises:
+        LessonMergeError: If a result or its output is missing, or an output has no segments
+    """
+    if not isinstance(data, dict):
+        logger.error(f"❌ Invalid API response: expected a JSON object, got {type(data)}")
+        raise LessonMergeError("Invalid API response: missing or incomplete result array")
+
+    if not data.get("result") or not isinstance(data["result"], list) or len(data["result"]) < 2:
+        logger.error("❌ Invalid API response: missing or incomplete result array")
+        logger.error(f"   Response keys: {list(data.keys())}")
+        logger.error(f"   Result type: {type(data.get('result'))}, Length: {len(data.get('result', []))}")
+        raise LessonMergeError("Invalid API response: missing or incomplete result array")
+
+    logger.info("🔍 Starting dynamic detection of audio and content results...")
+
+    parsed_results = []
+    for idx in (0, 1):
+        result = data["result"][idx]
+        output = result.get("output") if isinstance(result, dict) else None
+        if not output:
+            raise LessonMergeError(f"Missing output in result[{idx}]")
+        logger.info(f"📦 Result[{idx}]: stepType={result.get('stepType')}, keys={list(output.keys()) if isinstance(output, dict) else 'N/A'}")
+
+        parsed = output if isinstance(output, dict) else {}
+        segments = parsed.get("segments", [])
+        if not isinstance(segments, list):
+            logger.error(f"❌ Invalid API response: result[{idx}].output.segments is not a list")
+            raise LessonMergeError(f"Invalid API response: result[{idx}].output.segments is not a list")
+        segment_count = segment_counts.get(idx, 0)
+        if segments:
+            # Non-object entries are not streamed out and cannot be merged
+            logger.warning(f"⚠️  Ignoring {len(segments)} non-object segments in result[{idx}].output")
+        if segment_count == 0:
+            logger.error(f"❌ Invalid API response: result[{idx}].output.segments is empty")
+            raise LessonMergeError(f"Invalid API response: result[{idx}].output.segments is empty")
+        logger.info(f"📊 Found {segment_count} segments in result[{idx}].output")
+        parsed_results.append(parsed)
+    return parsed_results
+
+
+def _combine(segment_id, audio_data: dict, content_data: dict) -> dict:
+    """Build a lesson segment from its audio and narration/image halves"""
+    combined_segment = {
+        "segment_id": segment_id,
+        "audioBase64": audio_data["audio_base64"],
+        "imageUrl": content_data.get("image_url"),
+        "narration": content_data.get("narration", ""),
+        "duration": content_data.get("duration"),
+    }
+    logger.debug(f"   Segment {segment_id}: "
+                 f"narration length={len(combined_segment['narration'])}, "
+                 f"has image={bool(combined_segment['imageUrl'])}, "
+                 f"audio length={audio_data['audio_length']:,} chars")
+    return combined_segment
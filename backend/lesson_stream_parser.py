@@ -0,0 +1,377 @@
+"""
+Streaming Airia Response Parser
+Incremental JSON parsing of Airia pipeline responses: the body is consumed as it
+arrives, every result[i].output (a JSON document embedded as a string) is decoded
+and parsed on the fly, and segments are handed over one at a time instead of
+materializing the whole multi-MB response several times
+"""
+
+import re
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"[ \t\r\n]*")
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS_RE = re.compile(r"[0-9+\-.eE]*")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = {"true": True, "false": False, "null": None}
+
+# Parser states
+_VALUE, _ARRAY_FIRST_VALUE, _OBJECT_FIRST_KEY, _OBJECT_KEY, _COLON, _AFTER_VALUE, _STRING, _DONE = range(8)
+
+
+class StreamingJsonError(ValueError):
+    """Raised when the streamed text is not valid JSON"""
+
+
+class OutputParseError(StreamingJsonError):
+    """Raised when the JSON embedded in result[i].output is not valid JSON"""
+
+    def __init__(self, result_index: int, message: str):
+        super().__init__(message)
+        self.result_index = result_index
+
+
+class _Frame:
+    __slots__ = ("container", "key", "index")
+
+    def __init__(self, container):
+        self.container = container
+        self.key = None  # key of the value being parsed (objects)
+        self.index = 0  # index of the value being parsed (arrays, counts dropped values too)
+
+
+class StreamingJsonParser:
+    """
+    Push-based incremental JSON parser
+
+    Text can be fed in pieces split at arbitrary points. Two hooks keep large
+    values out of memory:
+    - string_sink(path) may return an object with feed(text) and close() -> value
+      that receives a string value's decoded contents as they arrive
+    - on_value(path, value) is called for every completed value and may return
+      True to drop it instead of attaching it to its parent
+    Paths are tuples of object keys and array indexes from the document root.
+    """
+
+    def __init__(
+        self,
+        on_value: Optional[Callable[[Tuple, Any], bool]] = None,
+        string_sink: Optional[Callable[[Tuple], Any]] = None,
+    ):
+        self._on_value = on_value
+        self._string_sink = string_sink
+        self._buf = ""
+        self._pos = 0
+        self._consumed = 0
+        self._stack: List[_Frame] = []
+        self._state = _VALUE
+        self._string_is_key = False
+        self._string_parts: List[str] = []
+        self._sink = None
+        self.result = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def path(self) -> Tuple:
+        """Path of the value currently being parsed"""
+        return tuple(frame.key if isinstance(frame.container, dict) else frame.index for frame in self._stack)
+
+    def feed(self, text: str) -> None:
+        """Parse the next piece of the document"""
+        if self._pos:
+            self._consumed += self._pos
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf = self._buf + text if self._buf else text
+        self._run(final=False)
+
+    def close(self) -> Any:
+        """
+        Finish parsing
+
+        Returns:
+            The parsed document (with dropped values left out)
+
+        Raises:
+            StreamingJsonError: If the document is incomplete or invalid
+        """
+        self._run(final=True)
+        if self._state != _DONE:
+            raise self._error("Expecting value" if not self._stack and self._state == _VALUE else "Unexpected end of JSON input")
+        return self.result
+
+    def _error(self, message: str) -> StreamingJsonError:
+        return StreamingJsonError(f"{message}: char {self._consumed + self._pos}")
+
+    def _run(self, final: bool) -> None:
+        while True:
+            if self._state == _STRING:
+                if not self._scan_string(final):
+                    return
+                continue
+
+            buf = self._buf
+            pos = _WHITESPACE_RE.match(buf, self._pos).end()
+            self._pos = pos
+            if pos >= len(buf):
+                return
+            ch = buf[pos]
+            state = self._state
+
+            if state == _VALUE or state == _ARRAY_FIRST_VALUE:
+                if ch == "]" and state == _ARRAY_FIRST_VALUE:
+                    self._pos = pos + 1
+                    self._close_container()
+                elif ch == "{":
+                    self._pos = pos + 1
+                    self._stack.append(_Frame({}))
+                    self._state = _OBJECT_FIRST_KEY
+                elif ch == "[":
+                    self._pos = pos + 1
+                    self._stack.append(_Frame([]))
+                    self._state = _ARRAY_FIRST_VALUE
+                elif ch == '"':
+                    self._pos = pos + 1
+                    self._start_string(is_key=False)
+                elif not self._scan_scalar(final):
+                    return
+            elif state == _OBJECT_FIRST_KEY or state == _OBJECT_KEY:
+                if ch == "}" and state == _OBJECT_FIRST_KEY:
+                    self._pos = pos + 1
+                    self._close_container()
+                elif ch == '"':
+                    self._pos = pos + 1
+                    self._start_string(is_key=True)
+                else:
+                    raise self._error("Expecting property name enclosed in double quotes")
+            elif state == _COLON:
+                if ch != ":":
+                    raise self._error("Expecting ':' delimiter")
+                self._pos = pos + 1
+                self._state = _VALUE
+            elif state == _AFTER_VALUE:
+                in_object = isinstance(self._stack[-1].container, dict)
+                self._pos = pos + 1
+                if ch == ",":
+                    self._state = _OBJECT_KEY if in_object else _VALUE
+                elif ch == ("}" if in_object else "]"):
+                    self._close_container()
+                else:
+                    self._pos = pos
+                    raise self._error("Expecting ',' delimiter")
+            else:
+                raise self._error("Extra data")
+
+    def _scan_scalar(self, final: bool) -> bool:
+        buf, pos = self._buf, self._pos
+        if buf[pos] in "tfn":
+            for literal, value in _LITERALS.items():
+                if buf.startswith(literal, pos):
+                    self._pos = pos + len(literal)
+                    self._complete(value)
+                    return True
+                if not final and literal.startswith(buf[pos:]):
+                    return False
+            raise self._error("Expecting value")
+
+        end = _NUMBER_CHARS_RE.match(buf, pos).end()
+        if end == len(buf) and not final:
+            # The number may continue in the next piece
+            return False
+        text = buf[pos:end]
+        if not _NUMBER_RE.fullmatch(text):
+            raise self._error("Expecting value")
+        self._pos = end
+        self._complete(float(text) if any(c in text for c in ".eE") else int(text))
+        return True
+
+    def _start_string(self, is_key: bool) -> None:
+        self._string_is_key = is_key
+        self._string_parts = []
+        self._sink = self._string_sink(self.path()) if not is_key and self._string_sink is not None else None
+        self._state = _STRING
+
+    def _scan_string(self, final: bool) -> bool:
+        buf, pos = self._buf, self._pos
+        end_of_buf = len(buf)
+        emit = self._sink.feed if self._sink is not None else self._string_parts.append
+        # str.find is much faster than a regex search over long base64 runs; the next
+        # quote/backslash positions are remembered so each is located only once
+        quote = backslash = -2
+        while True:
+            if quote != -1 and quote < pos:
+                quote = buf.find('"', pos)
+            if backslash != -1 and backslash < pos:
+                backslash = buf.find("\\", pos, quote if quote != -1 else end_of_buf)
+                if backslash == -1 and quote != -1:
+                    backslash = -2  # none before this quote, look again past it if needed
+            if quote == -1 and backslash < 0:
+                if pos < end_of_buf:
+                    emit(buf[pos:])
+                self._pos = end_of_buf
+                if final:
+                    raise self._error("Unterminated string")
+                return False
+
+            index = backslash if backslash >= 0 and (quote == -1 or backslash < quote) else quote
+            if index > pos:
+                emit(buf[pos:index])
+            if buf[index] == '"':
+                self._pos = index + 1
+                self._finish_string()
+                return True
+
+            # Backslash escape, possibly split across pieces
+            self._pos = index
+            if index + 1 >= end_of_buf:
+                if final:
+                    raise self._error("Unterminated string")
+                return False
+            escape = buf[index + 1]
+            if escape == "u":
+                if index + 6 > end_of_buf and not final:
+                    return False
+                try:
+                    code = int(buf[index + 2:index + 6], 16)
+                except ValueError:
+                    raise self._error("Invalid \\uXXXX escape")
+                pos = index + 6
+                if 0xD800 <= code <= 0xDBFF:
+                    if index + 12 > end_of_buf and not final:
+                        return False
+                    if buf.startswith("\\u", pos):
+                        try:
+                            low = int(buf[pos + 2:pos + 6], 16)
+                        except ValueError:
+                            raise self._error("Invalid \\uXXXX escape")
+                        if 0xDC00 <= low <= 0xDFFF:
+                            code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                            pos += 6
+                emit(chr(code))
+            else:
+                char = _ESCAPES.get(escape)
+                if char is None:
+                    raise self._error("Invalid \\escape")
+                emit(char)
+                pos = index + 2
+
+    def _finish_string(self) -> None:
+        if self._string_is_key:
+            self._stack[-1].key = "".join(self._string_parts)
+            self._string_parts = []
+            self._state = _COLON
+            return
+        if self._sink is not None:
+            sink, self._sink = self._sink, None
+            value = sink.close()
+        else:
+            value = "".join(self._string_parts)
+            self._string_parts = []
+        self._complete(value)
+
+    def _close_container(self) -> None:
+        frame = self._stack.pop()
+        self._complete(frame.container)
+
+    def _complete(self, value: Any) -> None:
+        drop = self._on_value is not None and self._on_value(self.path(), value)
+        if not self._stack:
+            self.result = None if drop else value
+            self._state = _DONE
+            return
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict):
+            if not drop:
+                frame.container[frame.key] = value
+        else:
+            if not drop:
+                frame.container.append(value)
+            frame.index += 1
+        self._state = _AFTER_VALUE
+
+
+class _OutputSink:
+    """Receives the decoded text of a result[i].output string and parses it as JSON"""
+
+    def __init__(self, result_index: int, on_value: Callable[[Tuple, Any], bool]):
+        self.result_index = result_index
+        self.chars = 0
+        self._parser = StreamingJsonParser(on_value=on_value)
+
+    def feed(self, text: str) -> None:
+        self.chars += len(text)
+        try:
+            self._parser.feed(text)
+        except OutputParseError:
+            raise
+        except StreamingJsonError as e:
+            raise OutputParseError(self.result_index, str(e)) from e
+
+    def close(self) -> Any:
+        if self.chars == 0:
+            # Empty output string, reported as a missing output like a falsy value
+            return ""
+        try:
+            return self._parser.close()
+        except StreamingJsonError as e:
+            raise OutputParseError(self.result_index, str(e)) from e
+
+
+class AiriaResultStream:
+    """
+    Incrementally extracts segments from every result[i].output of an Airia
+    pipeline response
+
+    Each segment is passed to on_segment(result_index, segment) as soon as it
+    has been parsed and is then dropped, so only one segment is held at a time.
+    close() returns the response document with every output parsed (when it
+    was a JSON string) and its segments arrays emptied; segment_counts records
+    how many segments each output contained.
+    """
+
+    def __init__(self, on_segment: Callable[[int, dict], None]):
+        self._on_segment = on_segment
+        self.segment_counts: Dict[int, int] = {}
+        self.chars_received = 0
+        self._parser = StreamingJsonParser(on_value=self._on_outer_value, string_sink=self._outer_string_sink)
+
+    def _take_segment(self, result_index: int, output_path: Tuple, value: Any) -> bool:
+        """Hand over and drop a completed segments[j] value (output_path is relative to the output)"""
+        if (
+            len(output_path) == 2
+            and output_path[0] == "segments"
+            and isinstance(output_path[1], int)
+            and isinstance(value, dict)
+        ):
+            self.segment_counts[result_index] = self.segment_counts.get(result_index, 0) + 1
+            self._on_segment(result_index, value)
+            return True
+        return False
+
+    def _outer_string_sink(self, path: Tuple):
+        # result[i].output given as a JSON string: parse its decoded contents as they stream in
+        if len(path) == 3 and path[0] == "result" and isinstance(path[1], int) and path[2] == "output":
+            result_index = path[1]
+            return _OutputSink(result_index, lambda output_path, value: self._take_segment(result_index, output_path, value))
+        return None
+
+    def _on_outer_value(self, path: Tuple, value: Any) -> bool:
+        # result[i].output given as a JSON object: segments complete as part of the outer document
+        if len(path) > 3 and path[0] == "result" and isinstance(path[1], int) and path[2] == "output":
+            return self._take_segment(path[1], path[3:], value)
+        return False
+
+    def feed(self, text: str) -> None:
+        """Parse the next piece of the response body"""
+        self.chars_received += len(text)
+        self._parser.feed(text)
+
+    def close(self) -> Any:
+        """Finish parsing and return the response document (segments emptied)"""
+        return self._parser.close()
@@ -0,0 +1,412 @@
+"""
+Load Test Harness
+Drives /generateLesson, /generateQuiz and the /fastino/* endpoints with closed-loop
+(a fixed number of clients, each sending its next request when the previous one
+finishes) or open-loop (Poisson arrivals at a fixed rate) traffic. It reports
+throughput, latency percentiles and histograms per endpoint, plus the server's
+RSS, event-loop lag and upstream requests in flight sampled from /cache/stats.
+
+By default mock_upstreams.py and the backend are started as subprocesses on free
+ports, so no Airia/Fastino quota is used; set LOADTEST_TARGET to load a server that
+is already running instead. The run is compared with a baseline recorded on the
+same machine (the LOADTEST_BASELINE file, which must be set) and the script exits
+with status 1 if there is no baseline for it or if throughput, p99 latency or
+memory regressed beyond the configured tolerances.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from circuit_breaker import percentile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request would drown the report
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOADTEST_TARGET = os.getenv("LOADTEST_TARGET", "")  # e.g. http://127.0.0.1:8000 (empty = start mock + backend)
+LOADTEST_SCENARIO = os.getenv("LOADTEST_SCENARIO", "mixed")
+LOADTEST_MODE = os.getenv("LOADTEST_MODE", "closed")  # closed | open
+LOADTEST_CONCURRENCY = int(os.getenv("LOADTEST_CONCURRENCY", "16"))  # closed loop: concurrent clients
+LOADTEST_RATE = float(os.getenv("LOADTEST_RATE", "20"))  # open loop: requests per second
+LOADTEST_MAX_IN_FLIGHT = int(os.getenv("LOADTEST_MAX_IN_FLIGHT", "1000"))  # open loop: arrivals beyond this are dropped
+LOADTEST_DURATION = float(os.getenv("LOADTEST_DURATION", "30"))  # measured seconds
+LOADTEST_WARMUP = float(os.getenv("LOADTEST_WARMUP", "5"))  # seconds of traffic before measuring
+LOADTEST_TIMEOUT = float(os.getenv("LOADTEST_TIMEOUT", "120"))
+LOADTEST_TOPICS = int(os.getenv("LOADTEST_TOPICS", "50"))  # distinct lesson/quiz topics (0 = every request unique)
+LOADTEST_USERS = int(os.getenv("LOADTEST_USERS", "20"))
+LOADTEST_SAMPLE_INTERVAL = float(os.getenv("LOADTEST_SAMPLE_INTERVAL", "1.0"))  # seconds between /cache/stats samples
+LOADTEST_SEED = int(os.getenv("LOADTEST_SEED", "1"))
+# Baseline comparison
+# Baselines are machine-specific, so there is no default file (loadtest_baseline.example.json shows the format)
+LOADTEST_BASELINE = os.getenv("LOADTEST_BASELINE", "")
+LOADTEST_SAVE_BASELINE = os.getenv("LOADTEST_SAVE_BASELINE", "false").lower() in ("1", "true", "yes")
+LOADTEST_MAX_THROUGHPUT_DROP = float(os.getenv("LOADTEST_MAX_THROUGHPUT_DROP", "0.10"))
+LOADTEST_MAX_P99_INCREASE = float(os.getenv("LOADTEST_MAX_P99_INCREASE", "0.25"))
+LOADTEST_MAX_RSS_INCREASE = float(os.getenv("LOADTEST_MAX_RSS_INCREASE", "0.20"))
+
+# Mock upstream latencies used when the harness starts the mock (time-compressed so a
+# 30s run completes many lessons); any MOCK_* variable already set takes precedence
+LOADTEST_MOCK_DEFAULTS = {
+    "MOCK_AIRIA_LESSON_LATENCY": "lognormal:1.0:0.3",
+    "MOCK_AIRIA_QUIZ_LATENCY": "lognormal:0.5:0.3",
+    "MOCK_FASTINO_REGISTER_LATENCY": "lognormal:0.02:0.3",
+    "MOCK_FASTINO_INGEST_LATENCY": "lognormal:0.02:0.3",
+    "MOCK_FASTINO_QUERY_LATENCY": "lognormal:0.05:0.4|0.02*uniform:0.3:0.6",
+}
+
+# Endpoint weights per scenario
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    "lesson": {"lesson": 1},
+    "quiz": {"quiz": 1},
+    "fastino": {"fastino_query": 3, "fastino_ingest": 1},
+    "mixed": {"lesson": 4, "quiz": 2, "fastino_query": 3, "fastino_ingest": 1},
+}
+
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 60000]
+
+_rng = random.Random(LOADTEST_SEED)
+_sequence = 0
+
+
+def _topic() -> str:
+    global _sequence
+    _sequence += 1
+    index = _rng.randrange(LOADTEST_TOPICS) if LOADTEST_TOPICS else _sequence
+    return f"How does process {index} work"
+
+
+def _user() -> str:
+    return f"load-user-{_rng.randrange(max(LOADTEST_USERS, 1))}"
+
+
+REQUESTS: Dict[str, Callable[[], Tuple[str, dict]]] = {
+    "lesson": lambda: ("/generateLesson", {"userInput": _topic(), "user_id": _user()}),
+    "quiz": lambda: ("/generateQuiz", {"userInput": _topic(), "user_id": _user()}),
+    "fastino_query": lambda: ("/fastino/query", {"user_id": _user(), "question": "What does this learner struggle with?"}),
+    "fastino_ingest": lambda: ("/fastino/ingest/lesson", {"user_id": _user(), "topic": _topic()}),
+}
+
+
+class Recorder:
+    """Latencies and outcomes of measured requests, per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.dropped = 0
+        self.measuring = False
+
+    def record(self, endpoint: str, latency: float, outcome: str) -> None:
+        if not self.measuring:
+            return
+        self.outcomes[endpoint][outcome] += 1
+        if outcome == "200":
+            self.latencies[endpoint].append(latency)
+
+
+async def _send(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, scheduled_at: float) -> None:
+    """Send one request; latency is measured from scheduled_at (avoids coordinated omission in open loop)"""
+    path, body = REQUESTS[endpoint]()
+    try:
+        response = await client.post(path, json=body)
+        outcome = str(response.status_code)
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.RequestError as e:
+        outcome = type(e).__name__
+    recorder.record(endpoint, time.perf_counter() - scheduled_at, outcome)
+
+
+def _pick(weights: Dict[str, int]) -> str:
+    return _rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+async def closed_loop(client: httpx.AsyncClient, recorder: Recorder, weights: Dict[str, int], until: float) -> None:
+    async def worker():
+        while time.perf_counter() < until:
+            await _send(client, recorder, _pick(weights), time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(LOADTEST_CONCURRENCY)))
+
+
+async def open_loop(client: httpx.AsyncClient, recorder: Recorder, weights: Dict[str, int], until: float) -> None:
+    in_flight = set()
+    next_at = time.perf_counter()
+    while next_at < until:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if len(in_flight) >= LOADTEST_MAX_IN_FLIGHT:
+            recorder.dropped += int(recorder.measuring)
+        else:
+            task = asyncio.ensure_future(_send(client, recorder, _pick(weights), next_at))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += _rng.expovariate(LOADTEST_RATE)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+async def sample_server(client: httpx.AsyncClient, recorder: Recorder, samples: List[dict], until: float) -> None:
+    """Poll /cache/stats for RSS, loop lag and pool sizes while measuring"""
+    while time.perf_counter() < until:
+        await asyncio.sleep(LOADTEST_SAMPLE_INTERVAL)
+        if not recorder.measuring:
+            continue
+        try:
+            response = await client.get("/cache/stats")
+            samples.append(response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"⚠️  Could not sample /cache/stats: {e}")
+
+
+# ===== Servers =====
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_healthy(url: str, process: subprocess.Popen, log_path: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(150):
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with status {process.returncode}, see {log_path}")
+            try:
+                await client.get(url)
+                return
+            except httpx.RequestError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up, see {log_path}")
+
+
+async def start_servers(workdir: str) -> Tuple[str, List[subprocess.Popen]]:
+    """Start mock_upstreams.py and the backend wired to it; returns the backend URL and the processes"""
+    mock_port, backend_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    env = {**LOADTEST_MOCK_DEFAULTS, **os.environ, "MOCK_PORT": str(mock_port)}
+    env.update({
+        "AIRIA_API_URL": f"{mock_url}/airia/lesson",
+        "AIRIA_QUIZ_API_URL": f"{mock_url}/airia/quiz",
+        "FASTINO_API_URL": f"{mock_url}/fastino",
+        "AIRIA_API_KEY": env.get("AIRIA_API_KEY") or "mock",
+        "AIRIA_USER_ID": env.get("AIRIA_USER_ID") or "mock",
+        "FASTINO_API_KEY": env.get("FASTINO_API_KEY") or "mock",
+        # Fresh caches and stores for every run
+        "LESSON_CACHE_DIR": os.path.join(workdir, "lesson_cache"),
+        "AUDIO_STORE_DIR": os.path.join(workdir, "audio_store"),
+        "FASTINO_OUTBOX_PATH": os.path.join(workdir, "outbox.sqlite3"),
+    })
+
+    processes = []
+    for name, command, port, health in (
+        ("mock", [sys.executable, "mock_upstreams.py"], mock_port, "/_mock/config"),
+        ("backend", [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                     "--port", str(backend_port), "--log-level", "warning"], backend_port, "/health"),
+    ):
+        log_path = os.path.join(workdir, f"{name}.log")
+        log = open(log_path, "w")
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(process)
+        await _wait_healthy(f"http://127.0.0.1:{port}{health}", process, log_path)
+        logger.info(f"🚀 Started {name} on port {port} (log: {log_path})")
+    return f"http://127.0.0.1:{backend_port}", processes
+
+
+def stop_servers(processes: List[subprocess.Popen]) -> None:
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ===== Report =====
+
+def summarize(recorder: Recorder, samples: List[dict], elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint in sorted(recorder.outcomes):
+        latencies = recorder.latencies[endpoint]
+        outcomes = recorder.outcomes[endpoint]
+        total = sum(outcomes.values())
+        endpoints[endpoint] = {
+            "requests": total,
+            "ok": len(latencies),
+            "errors": dict((k, v) for k, v in outcomes.items() if k != "200"),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 1) if latencies else None for p in (50, 95, 99)},
+            "max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+        }
+
+    all_latencies = [latency for values in recorder.latencies.values() for latency in values]
+    requests = sum(sum(outcomes.values()) for outcomes in recorder.outcomes.values())
+    upstream_in_flight: Dict[str, int] = {}
+    for sample in samples:
+        for upstream, pool in sample.get("http_pools", {}).items():
+            upstream_in_flight[upstream] = max(upstream_in_flight.get(upstream, 0), pool["in_flight"])
+
+    def peak(path: Tuple[str, str]) -> Optional[float]:
+        values = [sample.get(path[0], {}).get(path[1]) for sample in samples]
+        values = [value for value in values if value is not None]
+        return max(values) if values else None
+
+    return {
+        "scenario": LOADTEST_SCENARIO,
+        "mode": LOADTEST_MODE,
+        "load": LOADTEST_CONCURRENCY if LOADTEST_MODE == "closed" else LOADTEST_RATE,
+        "duration_s": round(elapsed, 1),
+        "requests": requests,
+        "throughput_rps": round(len(all_latencies) / elapsed, 2),
+        "error_rate": round(1 - len(all_latencies) / requests, 4) if requests else 0.0,
+        "dropped": recorder.dropped,
+        **{f"p{p}_ms": round(percentile(all_latencies, p) * 1000, 1) if all_latencies else None for p in (50, 95, 99)},
+        "rss_peak_mb": peak(("process", "rss_mb")),
+        "max_rss_mb": peak(("process", "max_rss_mb")),
+        "loop_lag_p99_ms": peak(("event_loop", "lag_p99_ms")),
+        "loop_lag_max_ms": peak(("event_loop", "lag_window_max_ms")),
+        "upstream_in_flight_peak": upstream_in_flight,
+        "endpoints": endpoints,
+    }
+
+
+def log_histogram(endpoint: str, latencies: List[float]) -> None:
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        ms = latency * 1000
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if ms <= bound), len(HISTOGRAM_BOUNDS_MS))
+        counts[index] += 1
+    widest = max(counts) or 1
+    logger.info(f"   {endpoint} latency histogram")
+    for i, count in enumerate(counts):
+        if not count:
+            continue
+        label = f"<= {HISTOGRAM_BOUNDS_MS[i]}ms" if i < len(HISTOGRAM_BOUNDS_MS) else f"> {HISTOGRAM_BOUNDS_MS[-1]}ms"
+        logger.info(f"   {label:>10} | {'#' * max(1, round(40 * count / widest)):<40} {count}")
+
+
+def log_report(result: dict, recorder: Recorder) -> None:
+    logger.info("=" * 80)
+    logger.info(f"📈 LOAD TEST: {result['scenario']} / {result['mode']} loop / load {result['load']} / {result['duration_s']}s")
+    logger.info("=" * 80)
+    logger.info(f"{'endpoint':<16} | {'reqs':>6} | {'rps':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'max ms':>8} | errors")
+    for endpoint, stats in result["endpoints"].items():
+        cells = [f"{stats[k]:>8.1f}" if stats[k] is not None else f"{'-':>8}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        logger.info(
+            f"{endpoint:<16} | {stats['requests']:>6} | {stats['throughput_rps']:>7.2f} | {' | '.join(cells)} | {stats['errors'] or ''}"
+        )
+    logger.info(
+        f"Total: {result['throughput_rps']} req/s, error rate {result['error_rate']:.2%}, "
+        f"p50/p95/p99 {result['p50_ms']}/{result['p95_ms']}/{result['p99_ms']} ms, dropped {result['dropped']}"
+    )
+    logger.info(
+        f"Server: RSS peak {result['rss_peak_mb']} MB (max {result['max_rss_mb']} MB), "
+        f"loop lag p99 {result['loop_lag_p99_ms']} ms / max {result['loop_lag_max_ms']} ms, "
+        f"upstream requests in flight peak {result['upstream_in_flight_peak']}"
+    )
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        log_histogram(endpoint, latencies)
+
+
+def baseline_key(result: dict) -> str:
+    return f"{result['scenario']}/{result['mode']}/{result['load']}"
+
+
+def compare_with_baseline(result: dict) -> bool:
+    """Check the run against the stored baseline for the same scenario and load; False on a regression or without one"""
+    try:
+        with open(LOADTEST_BASELINE, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        baselines = {}
+    key = baseline_key(result)
+
+    if LOADTEST_SAVE_BASELINE:
+        baselines[key] = result
+        with open(LOADTEST_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        logger.info(f"💾 Saved baseline {key} to {LOADTEST_BASELINE}")
+        return True
+
+    baseline = baselines.get(key)
+    if baseline is None:
+        logger.error(f"❌ No baseline for {key} in {LOADTEST_BASELINE} (save one with LOADTEST_SAVE_BASELINE=true)")
+        return False
+
+    passed = True
+    for label, metric, tolerance, higher_is_better in (
+        ("throughput", "throughput_rps", LOADTEST_MAX_THROUGHPUT_DROP, True),
+        ("p99 latency", "p99_ms", LOADTEST_MAX_P99_INCREASE, False),
+        ("RSS peak", "rss_peak_mb", LOADTEST_MAX_RSS_INCREASE, False),
+    ):
+        current, previous = result.get(metric), baseline.get(metric)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        passed &= not regressed
+        logger.info(
+            f"{'❌' if regressed else '✅'} {label}: {previous} -> {current} ({change:+.1%}, tolerance {tolerance:.0%})"
+        )
+    return passed
+
+
+async def run_load_test() -> bool:
+    weights = SCENARIOS[LOADTEST_SCENARIO]
+    workdir = tempfile.mkdtemp(prefix="learnai-loadtest-")
+    processes: List[subprocess.Popen] = []
+    try:
+        target = LOADTEST_TARGET
+        if not target:
+            target, processes = await start_servers(workdir)
+
+        recorder = Recorder()
+        samples: List[dict] = []
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(LOADTEST_CONCURRENCY, 100))
+        async with httpx.AsyncClient(base_url=target, timeout=LOADTEST_TIMEOUT, limits=limits) as client:
+            started_at = time.perf_counter()
+            until = started_at + LOADTEST_WARMUP + LOADTEST_DURATION
+            generate = closed_loop if LOADTEST_MODE == "closed" else open_loop
+            logger.info(f"🔥 Warming up for {LOADTEST_WARMUP:.0f}s, then measuring for {LOADTEST_DURATION:.0f}s against {target}")
+
+            async def start_measuring():
+                await asyncio.sleep(LOADTEST_WARMUP)
+                recorder.measuring = True
+
+            measured_from = asyncio.ensure_future(start_measuring())
+            await asyncio.gather(
+                generate(client, recorder, weights, until),
+                sample_server(client, recorder, samples, until),
+                measured_from,
+            )
+            # Requests still in flight at the deadline finish and count (closed loop drains naturally)
+            elapsed = time.perf_counter() - started_at - LOADTEST_WARMUP
+
+        result = summarize(recorder, samples, elapsed)
+        log_report(result, recorder)
+        return compare_with_baseline(result)
+    finally:
+        stop_servers(processes)
+
+
+if __name__ == "__main__":
+    if LOADTEST_SCENARIO not in SCENARIOS or LOADTEST_MODE not in ("closed", "open"):
+        logger.error(f"❌ LOADTEST_SCENARIO must be one of {list(SCENARIOS)} and LOADTEST_MODE closed or open")
+        sys.exit(2)
+    if not LOADTEST_BASELINE:
+        logger.error("❌ Set LOADTEST_BASELINE to a baseline file recorded on this machine (record one with LOADTEST_SAVE_BASELINE=true)")
+        sys.exit(2)
+    sys.exit(0 if asyncio.run(run_load_test()) else 1)
@@ -0,0 +1,97 @@
+"""
+Payload Logging Helpers
+Lazily formatted, size-capped previews of upstream payloads. Nothing is serialized
+unless the record is actually emitted, so INFO-level runs never pay for payload logs.
+"""
+
+import os
+import json
+import random
+import logging
+from collections.abc import Mapping
+from typing import Any, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Maximum characters of a payload preview
+LOG_PREVIEW_CHARS = int(os.getenv("LOG_PREVIEW_CHARS", "2000"))
+# Fraction of payloads logged when DEBUG is enabled (0.0 - 1.0)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+# Strings and lists inside JSON previews are shortened before serializing
+_MAX_STRING_CHARS = 200
+_MAX_LIST_ITEMS = 10
+
+
+def _cap(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [+{len(text) - limit:,} chars]"
+
+
+def _abbreviate(value: Any) -> Any:
+    """Copy a JSON-like value with long strings and lists shortened"""
+    if isinstance(value, str):
+        return _cap(value, _MAX_STRING_CHARS)
+    if isinstance(value, Mapping):
+        return {str(key): _abbreviate(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_abbreviate(item) for item in value[:_MAX_LIST_ITEMS]]
+        if len(value) > _MAX_LIST_ITEMS:
+            items.append(f"... [+{len(value) - _MAX_LIST_ITEMS} items]")
+        return items
+    return value
+
+
+class Preview:
+    """Lazily capped text, for use as a logging argument"""
+
+    __slots__ = ("text", "limit")
+
+    def __init__(self, text: str, limit: Optional[int] = None):
+        self.text = text
+        self.limit = LOG_PREVIEW_CHARS if limit is None else limit
+
+    def __str__(self) -> str:
+        return _cap(self.text, self.limit)
+
+
+class LazyJson:
+    """Lazily serialized, abbreviated JSON preview of a value, for use as a logging argument"""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = LOG_PREVIEW_CHARS if limit is None else limit
+
+    def __str__(self) -> str:
+        return _cap(json.dumps(_abbreviate(self.value), indent=2, default=str), self.limit)
+
+
+def payload_logging_enabled(logger: logging.Logger) -> bool:
+    """
+    Decide whether to log a payload: DEBUG must be enabled for the logger and
+    the payload must fall within LOG_PAYLOAD_SAMPLE_RATE
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return LOG_PAYLOAD_SAMPLE_RATE >= 1.0 or random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def log_payload(logger: logging.Logger, label: str, payload: Any, limit: Optional[int] = None) -> None:
+    """
+    Log a capped preview of a payload at DEBUG (strings as text, anything else as JSON)
+
+    Args:
+        logger: Logger to emit on
+        label: Message prefix
+        payload: Text, JSON-like value or headers mapping
+        limit: Maximum preview length (defaults to LOG_PREVIEW_CHARS)
+    """
+    if not payload_logging_enabled(logger):
+        return
+    preview = Preview(payload, limit) if isinstance(payload, str) else LazyJson(payload, limit)
+    logger.debug("%s: %s", label, preview)
@@ -0,0 +1,106 @@
+"""
+Event Loop and Process Monitoring
+Measures event-loop lag (how late a periodic timer fires, i.e. how long the loop
+was blocked by CPU-bound work) and reports the process's resident memory, so load
+tests can tell a slow upstream from a starved event loop.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+from dotenv import load_dotenv
+from circuit_breaker import percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))  # seconds between probes
+LOOP_MONITOR_WINDOW = int(os.getenv("LOOP_MONITOR_WINDOW", "600"))  # recent probes kept for percentiles
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "500"))  # log a warning when one stall exceeds this
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class LoopLagMonitor:
+    """
+    Sleeps interval seconds in a loop and records how much later than requested it wakes up
+
+    The overshoot is the time other callbacks held the loop; it shows up directly as
+    added latency on every request being served at that moment.
+    """
+
+    def __init__(self, interval: float, window: int):
+        self.interval = interval
+        self._lags: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+        self.metrics: Dict[str, int] = {"probes": 0, "stalls": 0}
+
+    def start(self) -> None:
+        if LOOP_MONITOR_ENABLED and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started_at - self.interval)
+            self._lags.append(lag)
+            self.metrics["probes"] += 1
+            self.max_lag = max(self.max_lag, lag)
+            if lag * 1000 >= LOOP_LAG_WARN_MS:
+                self.metrics["stalls"] += 1
+                logger.warning(f"🐢 Event loop blocked for {lag * 1000:.0f}ms")
+
+    def stats(self) -> dict:
+        """Lag percentiles over the recent window and the worst lag since startup"""
+        lags = self._lags
+        return {
+            **self.metrics,
+            "lag_p50_ms": round(percentile(lags, 50) * 1000, 2) if lags else 0.0,
+            "lag_p99_ms": round(percentile(lags, 99) * 1000, 2) if lags else 0.0,
+            "lag_window_max_ms": round(max(lags) * 1000, 2) if lags else 0.0,
+            "lag_max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+def process_stats() -> dict:
+    """Current and peak resident memory of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        rss = None  # not Linux
+    max_rss = None
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        max_rss *= 1 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    return {
+        "rss_mb": round(rss / (1024 * 1024), 1) if rss is not None else None,
+        "max_rss_mb": round(max_rss / (1024 * 1024), 1) if max_rss is not None else None,
+    }
+
+
+loop_monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL, LOOP_MONITOR_WINDOW)
@@ -5,34 +5,78 @@ Handles API calls to Airia.ai and returns processed lesson data
 
 import os
 import json
-import base64
 import logging
-import re
-from typing import Optional, List
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, List, Tuple
 from dotenv import load_dotenv
 import httpx
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from fastino_client import register_user, ingest_lesson as ingest_lesson_fastino, ingest_quiz, query_fastino
+from fastino_client import register_user, build_lesson_document, build_quiz_document, query_fastino
+from ingest_queue import ingest_buffer, IngestQueueFull
+import http_clients
+from http_clients import get_client, AIRIA
+from circuit_breaker import breakers, get_breaker, CircuitOpenError
+from hedging import hedge_budget
+from admission import limiters, lesson_admission, quiz_admission, AdmissionRejected
+from fast_json import fast_json_response, FAST_JSON_RESPONSES
+from compression import CompressionMiddleware, COMPRESSION_ENABLED, stats as compression_stats
+from loop_monitor import loop_monitor, process_stats
+from worker_pool import worker_pool
+from metrics import MetricsMiddleware, METRICS_ENABLED, errors, lesson_segments, quiz_questions, render as render_metrics
+from stages import StageTimer, spawn_background, drain_background
+from lesson_cache import lesson_cache, make_cache_key, LESSON_CACHE_ENABLED
+from single_flight import SingleFlight
+from log_utils import log_payload, payload_logging_enabled, Preview
+from context_cache import fastino_context_cache
+from quiz_prefetch import quiz_prefetcher
+from jobs import job_runner, JobError, JobQueueFull
+from lesson_stream_parser import AiriaResultStream, StreamingJsonError, OutputParseError
+from lesson_merge import LessonSegmentMerger, LessonMergeError, collect_parsed_outputs
+from quiz_parser import parse_quiz_result, format_quiz_questions, QuizParseError
+from audio_store import audio_store, externalize_lesson_audio, externalize_segment_audio, new_lesson_id, parse_range, LESSON_AUDIO_MODE, AUDIO_STORE_TTL
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
+# Payload previews are only logged at DEBUG (see log_utils)
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the shared clients and background workers; stop them on shutdown"""
+    await http_clients.startup()
+    loop_monitor.start()
+    worker_pool.start()
+    job_runner.start()
+    ingest_buffer.start()
+    yield
+    await job_runner.stop()
+    await ingest_buffer.close()
+    await quiz_prefetcher.close()
+    await loop_monitor.stop()
+    await drain_background()
+    await http_clients.shutdown()
+    worker_pool.shutdown()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Learn.AI Backend API",
     description="Backend API for lesson generation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -48,17 +92,45 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Negotiated gzip/br/zstd compression (outside CORS, so CORS headers are set before it runs)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-route request metrics (outermost, outside compression, so sizes are bytes on the wire)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Environment variables
 AIRIA_API_KEY = os.getenv("AIRIA_API_KEY")
 AIRIA_API_URL = os.getenv("AIRIA_API_URL")  # Lesson pipeline URL
 AIRIA_QUIZ_API_URL = os.getenv("AIRIA_QUIZ_API_URL", "https://api.airia.ai/v2/PipelineExecution/2fd01fd6-793e-4b54-af51-3c7605fcec41")  # Quiz pipeline URL
 AIRIA_USER_ID = os.getenv("AIRIA_USER_ID")
 
+# Read timeout ceilings (fixed worst case) and floors for the adaptive Airia timeouts
+AIRIA_LESSON_TIMEOUT = (300.0, 30.0)
+AIRIA_QUIZ_TIMEOUT = (300.0, 30.0)
+
+
+# Concurrent identical lesson requests share one Airia pipeline execution
+lesson_flights = SingleFlight("lesson_pipeline")
+
+# Fastino context questions (answers are cached per user, template and topic)
+# Note: Do not put the topic in quotes as Fastino cannot read it properly
+LESSON_CONTEXT_QUESTION = (
+    "answer in 4-5 lines : What is the knowledge level of the user. "
+    "Tell about his background, education and experience for the topic {topic}"
+)
+QUIZ_CONTEXT_QUESTION = (
+    "answer in 4-5 lines : What were the key observations from previous quizzes related to {topic} "
+    "Please provide detailed insights about what the user struggled with, any patterns in their learning performance related to this topic."
+)
+
 
 # Request/Response models
 class GenerateLessonRequest(BaseModel):
     userInput: str
     user_id: Optional[str] = None  # Fastino user ID for query retrieval
+    prefetch_quiz: Optional[bool] = None  # Pre-generate the quiz alongside the lesson (defaults to QUIZ_PREFETCH_ENABLED)
 
 
 class GenerateQuizRequest(BaseModel):
@@ -76,19 +148,53 @@ class QuizQuestionOption(BaseModel):
 class LessonSegment(BaseModel):
     segment_id: int
     imageUrl: Optional[str] = None
-    audioBase64: str
+    audioUrl: Optional[str] = None  # Set when LESSON_AUDIO_MODE=url
+    audioBase64: Optional[str] = None  # Set when LESSON_AUDIO_MODE=inline
     narration: str
 
 
 class LessonDataResponse(BaseModel):
     topic: str
     segments: List[LessonSegment]
+    lesson_id: Optional[str] = None
+
+
+_LESSON_SEGMENT_FIELDS = tuple(LessonSegment.model_fields)
+
+
+def _lesson_body(lesson: dict) -> dict:
+    """
+    Shape a lesson dict exactly like LessonDataResponse without re-validating it
+    (segments were already checked when merged; the audio strings are not copied)
+    """
+    return {
+        "topic": lesson["topic"],
+        "segments": [{field: seg.get(field) for field in _LESSON_SEGMENT_FIELDS} for seg in lesson["segments"]],
+        "lesson_id": lesson.get("lesson_id"),
+    }
+
+
+def _lesson_response(lesson: dict, http_response: Response):
+    """Serialize a lesson directly (FAST_JSON_RESPONSES), or leave it to response_model validation"""
+    if not FAST_JSON_RESPONSES:
+        return lesson
+    return fast_json_response(_lesson_body(lesson), headers=http_response.headers)
 
 
 class ErrorResponse(BaseModel):
     error: str
 
 
+class PipelineError(Exception):
+    """Airia pipeline failure carrying the HTTP status and message to return to the client"""
+    
+    def __init__(self, status_code: int, message: str, details: Optional[dict] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.details = details or {}
+
+
 # Global exception handler to ensure CORS headers are always present
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -182,31 +288,49 @@ class IngestDataResponse(BaseModel):
     message: str
 
 
+def _admission_rejected_response(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": e.message},
+        headers={"Access-Control-Allow-Origin": "*", "Retry-After": str(e.retry_after)}
+    )
+
+
+def _ingest_queue_full_response(e: IngestQueueFull) -> JSONResponse:
+    logger.warning(f"⚠️  {e}")
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": str(e)},
+        headers={"Access-Control-Allow-Origin": "*", "Retry-After": "5"}
+    )
+
+
 @app.post("/fastino/ingest/lesson", response_model=IngestDataResponse)
 async def fastino_ingest_lesson(request: IngestLessonRequest):
     """
     Ingest lesson data to Fastino AI
     
+    The document is buffered and sent to Fastino in a batch (write-behind), so
+    this returns as soon as it is enqueued.
+    
     Args:
         request: IngestLessonRequest with user_id and topic
         
     Returns:
-        IngestDataResponse with success status
+        IngestDataResponse with success status, or 503 when the ingestion buffer is full
     """
     logger.info(f"📤 Ingesting lesson data for user: {request.user_id}, topic: {request.topic}")
     
     try:
-        success = await ingest_lesson(request.user_id, request.topic)
-        
-        if success:
-            logger.info(f"✅ Successfully ingested lesson data")
-            return IngestDataResponse(success=True, message="Lesson data ingested successfully")
-        else:
-            logger.warning(f"⚠️  Fastino lesson ingestion failed for user {request.user_id}")
-            return IngestDataResponse(success=False, message="Failed to ingest lesson data")
+        await ingest_buffer.enqueue(request.user_id, build_lesson_document(request.topic))
+    except IngestQueueFull as e:
+        return _ingest_queue_full_response(e)
     except Exception as e:
         logger.error(f"❌ Error during Fastino lesson ingestion: {e}", exc_info=True)
         return IngestDataResponse(success=False, message=f"Internal server error: {str(e)}")
+    
+    logger.info(f"✅ Queued lesson data for ingestion")
+    return IngestDataResponse(success=True, message="Lesson data queued for ingestion")
 
 
 @app.post("/fastino/ingest/quiz", response_model=IngestDataResponse)
@@ -214,33 +338,34 @@ async def fastino_ingest_quiz(request: IngestQuizRequest):
     """
     Ingest quiz data to Fastino AI
     
+    The document is buffered and sent to Fastino in a batch with the user's other
+    answers (write-behind), so this returns as soon as it is enqueued.
+    
     Args:
         request: IngestQuizRequest with user_id, topic, question, answer, user_answer, verdict
         
     Returns:
-        IngestDataResponse with success status
+        IngestDataResponse with success status, or 503 when the ingestion buffer is full
     """
     logger.info(f"📤 Ingesting quiz data for user: {request.user_id}")
     
     try:
-        success = await ingest_quiz(
-            request.user_id,
+        document = build_quiz_document(
             request.topic,
             request.question,
             request.answer,
             request.user_answer,
             request.verdict
         )
-        
-        if success:
-            logger.info(f"✅ Successfully ingested quiz data")
-            return IngestDataResponse(success=True, message="Quiz data ingested successfully")
-        else:
-            logger.warning(f"⚠️  Fastino quiz ingestion failed for user {request.user_id}")
-            return IngestDataResponse(success=False, message="Failed to ingest quiz data")
+        await ingest_buffer.enqueue(request.user_id, document)
+    except IngestQueueFull as e:
+        return _ingest_queue_full_response(e)
     except Exception as e:
         logger.error(f"❌ Error during Fastino quiz ingestion: {e}", exc_info=True)
         return IngestDataResponse(success=False, message=f"Internal server error: {str(e)}")
+    
+    logger.info(f"✅ Queued quiz data for ingestion")
+    return IngestDataResponse(success=True, message="Quiz data queued for ingestion")
 
 
 class QueryFastinoRequest(BaseModel):
@@ -291,65 +416,302 @@ async def fastino_query(request: QueryFastinoRequest):
 
 
 
-@app.post("/generateLesson", response_model=LessonDataResponse)
-async def generate_lesson(request: GenerateLessonRequest):
+async def _ingest_lesson_prompt(user_id: str, user_input: str) -> None:
+    """Queue the lesson prompt for Fastino ingestion (runs in the background, never fails the request)"""
+    logger.info(f"📤 Queueing lesson prompt for Fastino ingestion for user: {user_id}")
+    try:
+        await ingest_buffer.enqueue(user_id, build_lesson_document(user_input))
+    except Exception as e:
+        logger.warning(f"⚠️  Error queueing lesson prompt for Fastino: {e}. Continuing with lesson generation.")
+
+
+async def _query_user_context(user_id: str, template: str, topic: str) -> Optional[str]:
+    """Answer a Fastino context question for a topic, served from the context cache when possible"""
+    return await fastino_context_cache.get(
+        user_id, template, topic,
+        lambda: query_fastino(user_id, template.format(topic=topic), use_cache=False)
+    )
+
+
+async def _fetch_lesson_context(user_id: str, user_input: str) -> Optional[str]:
+    """Query Fastino for the user's knowledge level and background for a lesson topic"""
+    logger.info(f"🔍 Querying Fastino for user context for lesson generation for user: {user_id}")
+    
+    try:
+        answer = await _query_user_context(user_id, LESSON_CONTEXT_QUESTION, user_input)
+        
+        if answer:
+            logger.info(f"✅ Retrieved answer from Fastino for lesson generation")
+            log_payload(logger, "📝 Fastino answer", answer, limit=500)
+            return answer
+        logger.info("ℹ️  No answer retrieved from Fastino, using original prompt")
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to query Fastino for lesson context: {e}. Continuing with original prompt.")
+    return None
+
+
+async def run_lesson_pipeline(
+    enhanced_prompt: str,
+    user_input: str,
+    timer: StageTimer,
+    on_segment: Optional[Callable[[dict], None]] = None
+) -> dict:
     """
-    Generate a lesson by calling Airia.ai API
+    Run the Airia.ai lesson pipeline and merge its audio and narration/image results
     
     Args:
-        request: GenerateLessonRequest with userInput and optional user_id
+        enhanced_prompt: Lesson prompt, optionally enhanced with Fastino user context
+        user_input: Original user prompt, used as the topic fallback
+        timer: StageTimer recording the airia_pipeline and parse stages
+        on_segment: Optional callback receiving each merged segment as soon as its
+            audio and narration/image have both been parsed (before the body completes)
         
     Returns:
-        LessonDataResponse with topic and segments
+        Lesson data dict with topic and segments
         
     Raises:
-        HTTPException: If API call fails or response is invalid
+        PipelineError: If the API call fails or the response is invalid
     """
+    # Prepare payload for Airia.ai API (use enhanced prompt with user context from Fastino)
+    payload = {
+        "userId": AIRIA_USER_ID,
+        "userInput": enhanced_prompt,
+        "asyncOutput": False
+    }
+    
+    headers = {
+        "X-API-KEY": AIRIA_API_KEY,
+        "Content-Type": "application/json"
+    }
+    
+    logger.info(f"📡 Calling Airia.ai API: {AIRIA_API_URL}")
+    log_payload(logger, "📦 Airia.ai Payload (userId is AIRIA_USER_ID from backend env)", payload)
+    
+    try:
+        # Call Airia.ai API
+        # Use a longer timeout since the API might take time to process (asyncOutput: false can be slow)
+        # Also use data=json.dumps() format to match the example request
+        client = get_client(AIRIA)
+        
+        # Convert payload to JSON string (matching the example request format)
+        payload_json = json.dumps(payload)
+        
+        logger.info(f"🚀 Sending request with payload length: {len(payload_json)} bytes")
+        
+        # Segments are merged as they are parsed out of the streamed body, so the full
+        # multi-MB response is never held (or parsed) as a whole. Only result[0] and
+        # result[1] are used: one carries audio_base64, the other narration/image_url.
+        merger = LessonSegmentMerger(on_merged=on_segment)
+        result_stream = AiriaResultStream(merger.add)
+        # Only the start and the last pieces of the body are kept for error diagnostics
+        head_text = ""
+        previous_text = last_text = ""
+        
+        # The read timeout adapts to recent pipeline latencies (up to 5 minutes), 30s connect
+        ceiling, floor = AIRIA_LESSON_TIMEOUT
+        with timer.stage("airia_pipeline"):
+            async with get_breaker(AIRIA).call("lesson", ceiling, floor) as call, client.stream(
+                "POST",
+                AIRIA_API_URL,
+                headers=headers,
+                content=payload_json,  # Use content= with JSON string (matches requests.data)
+                timeout=httpx.Timeout(call.timeout, connect=30.0)
+            ) as response:
+                call.check(response)
+                logger.info(f"📡 API Response Status: {response.status_code}")
+                log_payload(logger, "📡 API Response Headers", response.headers)
+                
+                if not response.is_success:
+                    await response.aread()
+                    error_text = response.text
+                    logger.error("❌ API Error Response: %s", Preview(error_text))
+                    raise PipelineError(response.status_code, f"Airia.ai API error: {response.status_code} {response.reason_phrase}. {error_text[:200]}")
+                
+                # Parse the body incrementally while it downloads
+                try:
+                    async for text in response.aiter_text():
+                        if len(head_text) < 2500:
+                            head_text += text[:2500 - len(head_text)]
+                        previous_text, last_text = last_text, text
+                        result_stream.feed(text)
+                    data = result_stream.close()
+                except OutputParseError as e:
+                    errors.inc("airia_lesson", "parse_error")
+                    logger.error(f"❌ JSON Parse Error for result[{e.result_index}].output: {e}")
+                    raise PipelineError(500, f"Failed to parse result[{e.result_index}].output as JSON: {str(e)}")
+                except StreamingJsonError as e:
+                    errors.inc("airia_lesson", "parse_error")
+                    logger.error(f"❌ Failed to parse response as JSON: {e}")
+                    logger.error(f"   Raw response length: {result_stream.chars_received} chars")
+                    logger.error(f"   Raw response (first 2000 chars): {head_text[:2000]}")
+                    logger.error(f"   Raw response (last 500 chars): {(previous_text + last_text)[-500:]}")
+                    raise PipelineError(500, f"Failed to parse API response as JSON: {str(e)}")
+        parse_started = time.perf_counter()
+        
+        # Log the raw response for debugging (previews only at DEBUG)
+        logger.info(f"📥 Airia.ai Lesson Generation Response length: {result_stream.chars_received} chars")
+        if payload_logging_enabled(logger):
+            logger.debug("📥 Raw response (first chars): %s", head_text)
+            if result_stream.chars_received > len(head_text):
+                logger.debug("📥 Raw response (last chars): %s", (previous_text + last_text)[-2500:])
+        
+        if isinstance(data, dict):
+            log_payload(logger, "📋 Parsed Airia.ai Lesson Generation Response (segments streamed out)", data)
+            logger.info(f"✅ API Response received. Result count: {len(data.get('result', []))}")
+        
+        # Check result[0] and result[1], detect the audio result and combine segments by segment_id
+        try:
+            parsed_results = collect_parsed_outputs(data, result_stream.segment_counts)
+            lesson_data = merger.merge(parsed_results, user_input)
+        except LessonMergeError as e:
+            errors.inc("airia_lesson", "parse_error")
+            raise PipelineError(500, str(e))
+        
+        timer.record("parse", parse_started)
+        
+        logger.info(f"✅ Returning lesson data with {len(lesson_data['segments'])} segments")
+        lesson_segments.observe(len(lesson_data["segments"]))
+        return lesson_data
+        
+    except CircuitOpenError as e:
+        logger.error(f"❌ Skipping Airia.ai lesson pipeline: {e}")
+        raise PipelineError(503, f"Airia.ai API is temporarily unavailable, retry in {e.retry_after:.0f}s") from e
+    except httpx.TimeoutException as e:
+        logger.error(f"❌ API Request Timeout: {e}")
+        raise PipelineError(504, "Request to Airia.ai API timed out. Please try again.") from e
+    except httpx.RequestError as e:
+        logger.error(f"❌ Network Error: {e}")
+        raise PipelineError(503, f"Failed to connect to Airia.ai API: {str(e)}") from e
+
+
+def _cached_lesson_usable(lesson: dict) -> bool:
+    """Check a cached lesson matches the current audio mode and its audio blobs still exist"""
+    if LESSON_AUDIO_MODE == "url":
+        lesson_id = lesson.get("lesson_id")
+        return bool(lesson_id) and audio_store.has_lesson(lesson_id)
+    return all(seg.get("audioBase64") for seg in lesson.get("segments", []))
+
+
+def _log_lesson_request(request: GenerateLessonRequest) -> None:
     logger.info(f"🚀 Received lesson generation request: {request.userInput}")
     if request.user_id:
         logger.info(f"👤 Fastino user_id from frontend: {request.user_id}")
     else:
         logger.info("👤 No Fastino user_id provided in request")
+
+
+def _start_quiz_prefetch(request: GenerateLessonRequest) -> None:
+    """
+    Pre-generate the quiz for the lesson prompt when enabled for this request
+
+    Keyed and generated from the original prompt (userInput), which the frontend
+    also sends to /generateQuiz, not from the topic Airia returns.
+    """
+    enabled = quiz_prefetcher.enabled if request.prefetch_quiz is None else request.prefetch_quiz
+    if not enabled or not AIRIA_API_KEY or not AIRIA_QUIZ_API_URL or not AIRIA_USER_ID:
+        return
+    quiz_prefetcher.start(
+        request.user_id, request.userInput,
+        lambda: _generate_quiz(request.userInput, request.user_id)
+    )
+
+
+def _cancel_quiz_prefetch(request: GenerateLessonRequest) -> None:
+    """Drop the speculative quiz of a lesson that failed (the user will not reach the quiz)"""
+    quiz_prefetcher.cancel(request.user_id, request.userInput)
+
+
+async def _prepare_lesson_prompt(request: GenerateLessonRequest, timer: StageTimer) -> Tuple[str, Optional[str]]:
+    """
+    Start the quiz prefetch and Fastino ingest and fetch the user context for a lesson request
     
-    # ===== STEP 1: First ingest lesson prompt to Fastino if user_id is provided =====
-    if request.user_id:
-        logger.info(f"📤 Ingesting lesson prompt to Fastino for user: {request.user_id}")
-        try:
-            ingest_success = await ingest_lesson_fastino(request.user_id, request.userInput)
-            if ingest_success:
-                logger.info("✅ Lesson prompt ingested to Fastino successfully")
-            else:
-                logger.warning("⚠️  Lesson prompt ingestion to Fastino failed, continuing with lesson generation")
-        except Exception as e:
-            logger.warning(f"⚠️  Error ingesting lesson prompt to Fastino: {e}. Continuing with lesson generation.")
-    
-    # ===== STEP 2: Query Fastino for user context if user_id is provided =====
+    Returns:
+        Tuple of (enhanced_prompt, user_context); user_context is None when there is none
+    """
     enhanced_prompt = request.userInput
+    user_context = None
+    
+    # The quiz only depends on the prompt, so it can run alongside the lesson
+    _start_quiz_prefetch(request)
     
     if request.user_id:
-        logger.info(f"🔍 Querying Fastino for user context for lesson generation for user: {request.user_id}")
-        
-        # Create a question to get user's knowledge level, background, education, and experience for the topic
-        # Note: Do not put userInput in quotes as Fastino cannot read it properly
-        question = f"answer in 4-5 lines : What is the knowledge level of the user. Tell about his background, education and experience for the topic {request.userInput}"
+        # ===== STEP 1: Ingest lesson prompt to Fastino off the critical path =====
+        spawn_background(
+            timer.track("fastino_ingest", _ingest_lesson_prompt(request.user_id, request.userInput)),
+            name=f"fastino_ingest_lesson:{request.user_id}"
+        )
         
-        try:
-            answer = await query_fastino(request.user_id, question, use_cache=False)
-            
-            if answer:
-                logger.info(f"✅ Retrieved answer from Fastino for lesson generation")
-                logger.info(f"📝 Fastino answer (first 500 chars): {answer[:500]}...")
-                
-                # Enhance prompt with Fastino user context (knowledge level, background, education, experience)
-                enhanced_prompt = f"{request.userInput}\n\nUser Context:\n{answer}"
-                logger.info(f"📝 Enhanced prompt with Fastino user context (knowledge level, background, education, experience)")
-            else:
-                logger.info("ℹ️  No answer retrieved from Fastino, using original prompt")
-        except Exception as e:
-            logger.warning(f"⚠️  Failed to query Fastino for lesson context: {e}. Continuing with original prompt.")
+        # ===== STEP 2: Query Fastino for user context (the Airia call depends on it) =====
+        user_context = await timer.track("fastino_query", _fetch_lesson_context(request.user_id, request.userInput))
+        if user_context:
+            # Enhance prompt with Fastino user context (knowledge level, background, education, experience)
+            enhanced_prompt = f"{request.userInput}\n\nUser Context:\n{user_context}"
+            logger.info(f"📝 Enhanced prompt with Fastino user context (knowledge level, background, education, experience)")
     else:
         logger.info("ℹ️  No user_id provided, skipping Fastino operations")
+    return enhanced_prompt, user_context
+
+
+async def _lookup_cached_lesson(cache_key: str, timer: StageTimer) -> Optional[dict]:
+    """Return the cached lesson for a cache key if it can still be served"""
+    if not LESSON_CACHE_ENABLED:
+        return None
+    cached_lesson = await timer.track("cache_lookup", lesson_cache.get(cache_key))
+    if cached_lesson is not None and _cached_lesson_usable(cached_lesson):
+        logger.info(f"⚡ Lesson cache hit for key {cache_key[:12]}")
+        return cached_lesson
+    return None
+
+
+def _externalizing_segments(lesson_id: str, on_segment: Callable[[dict], None], tasks: List[asyncio.Task]) -> Callable[[dict], None]:
+    """Wrap a segment callback so each segment's audio is stored (off the parser callback) before it is passed on, in order"""
+    async def externalize(segment: dict, previous: Optional[asyncio.Task]):
+        externalized, blob = await externalize_segment_audio(lesson_id, segment)
+        if previous is not None:
+            await previous
+        on_segment(externalized)
+        return segment["segment_id"], blob
+    
+    def callback(segment: dict) -> None:
+        tasks.append(asyncio.ensure_future(externalize(segment, tasks[-1] if tasks else None)))
     
+    return callback
+
+
+async def _generate_and_cache_lesson(
+    cache_key: str,
+    enhanced_prompt: str,
+    user_input: str,
+    timer: StageTimer,
+    on_segment: Optional[Callable[[dict], None]] = None,
+    user_id: Optional[str] = None,
+    lesson_id: Optional[str] = None
+) -> dict:
+    """Run the lesson pipeline (once admitted for user_id), move its audio to the blob store (url mode) and cache the lesson"""
+    # A fresh audio id per generation, so earlier audio URLs never change meaning
+    lesson_id = lesson_id or new_lesson_id()
+    streamed: List[asyncio.Task] = []
+    if on_segment is not None and LESSON_AUDIO_MODE == "url":
+        on_segment = _externalizing_segments(lesson_id, on_segment, streamed)
+    try:
+        admission_started = time.perf_counter()
+        async with lesson_admission.slot(user_id):
+            timer.record("admission_wait", admission_started)
+            lesson = await run_lesson_pipeline(enhanced_prompt, user_input, timer, on_segment=on_segment)
+        if LESSON_AUDIO_MODE == "url":
+            # Audio already decoded for streamed segments is reused
+            streamed_blobs = dict(await asyncio.gather(*streamed))
+            lesson = await timer.track("audio_store", externalize_lesson_audio(lesson_id, lesson, streamed_blobs))
+    finally:
+        for task in streamed:
+            task.cancel()
+        await asyncio.gather(*streamed, return_exceptions=True)
+    if LESSON_CACHE_ENABLED:
+        lesson_cache.put(cache_key, lesson)
+    return lesson
+
+
+def _missing_credentials_response() -> Optional[JSONResponse]:
     # Validate environment variables
     if not AIRIA_API_KEY or not AIRIA_API_URL or not AIRIA_USER_ID:
         logger.error("❌ Missing API configuration in environment variables")
@@ -358,382 +720,65 @@ async def generate_lesson(request: GenerateLessonRequest):
             content={"error": "Server configuration error: Missing API credentials"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
+    return None
+
+
+@app.post("/generateLesson", response_model=LessonDataResponse)
+async def generate_lesson(request: GenerateLessonRequest, http_response: Response):
+    """
+    Generate a lesson by calling Airia.ai API
     
-    # Prepare payload for Airia.ai API (use enhanced prompt with user context from Fastino)
-    payload = {
-        "userId": AIRIA_USER_ID,
-        "userInput": enhanced_prompt,
-        "asyncOutput": False
-    }
+    Fastino ingestion runs in the background since nothing downstream depends on it,
+    while the Airia call starts as soon as the Fastino context answer arrives.
+    Repeat topics with the same user context are served from the lesson cache, and
+    concurrent identical requests share a single Airia pipeline execution.
+    The per-stage timing breakdown is returned in the Server-Timing header.
     
-    headers = {
-        "X-API-KEY": AIRIA_API_KEY,
-        "Content-Type": "application/json"
-    }
+    Args:
+        request: GenerateLessonRequest with userInput and optional user_id
+        http_response: Outgoing response, used to attach the Server-Timing header
+        
+    Returns:
+        LessonDataResponse with topic and segments
+        
+    Raises:
+        HTTPException: If API call fails or response is invalid
+    """
+    _log_lesson_request(request)
+    
+    # Checked before anything upstream (Fastino, quiz prefetch) is started
+    error_response = _missing_credentials_response()
+    if error_response is not None:
+        return error_response
+    
+    timer = StageTimer()
+    enhanced_prompt, user_context = await _prepare_lesson_prompt(request, timer)
+    
+    # ===== STEP 3: Serve repeat topics from the lesson cache =====
+    cache_key = make_cache_key(request.userInput, user_context)
+    cached_lesson = await _lookup_cached_lesson(cache_key, timer)
+    if cached_lesson is not None:
+        http_response.headers["X-Cache"] = "HIT"
+        http_response.headers["Server-Timing"] = timer.header()
+        return _lesson_response(cached_lesson, http_response)
     
-    logger.info(f"📡 Calling Airia.ai API: {AIRIA_API_URL}")
-    logger.info(f"📦 Airia.ai Payload (userId is AIRIA_USER_ID from backend env): {json.dumps(payload)}")
     if request.user_id:
         logger.info(f"👤 Fastino user_id used for personalization: {request.user_id}")
     
     try:
-        # Call Airia.ai API
-        # Use a longer timeout since the API might take time to process (asyncOutput: false can be slow)
-        # Also use data=json.dumps() format to match the example request
-        timeout = httpx.Timeout(300.0, connect=30.0)  # 5 minutes total, 30s connect
-        
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            # Convert payload to JSON string (matching the example request format)
-            payload_json = json.dumps(payload)
-            
-            logger.info(f"🚀 Sending request with payload length: {len(payload_json)} bytes")
-            
-            response = await client.post(
-                AIRIA_API_URL,
-                headers=headers,
-                content=payload_json  # Use content= with JSON string (matches requests.data)
-            )
-            
-            logger.info(f"📡 API Response Status: {response.status_code}")
-            logger.info(f"📡 API Response Headers: {dict(response.headers)}")
-            
-            # Log the raw response for debugging
-            raw_response_text = response.text
-            logger.info("=" * 80)
-            logger.info("📥 Airia.ai Lesson Generation Raw Response:")
-            logger.info("=" * 80)
-            logger.info(f"Response length: {len(raw_response_text)} chars")
-            # Log full response (it might be large, but we need to see it)
-            if len(raw_response_text) > 5000:
-                logger.info(f"First 2500 chars:\n{raw_response_text[:2500]}")
-                logger.info("...")
-                logger.info(f"Last 2500 chars:\n{raw_response_text[-2500:]}")
-            else:
-                logger.info(raw_response_text)
-            logger.info("=" * 80)
-            
-            if not response.is_success:
-                error_text = response.text
-                logger.error(f"❌ API Error Response: {error_text}")
-                return JSONResponse(
-                    status_code=response.status_code,
-                    content={"error": f"Airia.ai API error: {response.status_code} {response.reason_phrase}. {error_text[:200]}"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # Parse response
-            try:
-                data = response.json()
-                logger.info("=" * 80)
-                logger.info("📋 Parsed Airia.ai Lesson Generation Response:")
-                logger.info("=" * 80)
-                # Log full parsed response for debugging
-                full_parsed = json.dumps(data, indent=2)
-                if len(full_parsed) > 5000:
-                    logger.info(f"First 2500 chars:\n{full_parsed[:2500]}")
-                    logger.info("...")
-                    logger.info(f"Last 2500 chars:\n{full_parsed[-2500:]}")
-                else:
-                    logger.info(full_parsed)
-                logger.info("=" * 80)
-                logger.info(f"✅ API Response received. Result count: {len(data.get('result', []))}")
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Failed to parse response as JSON: {e}")
-                logger.error(f"   Raw response length: {len(raw_response_text)} chars")
-                logger.error(f"   Raw response (first 2000 chars): {raw_response_text[:2000]}")
-                logger.error(f"   Raw response (last 500 chars): {raw_response_text[-500:] if len(raw_response_text) > 500 else raw_response_text}")
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": f"Failed to parse API response as JSON: {str(e)}"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # Validate response structure
-            if not data.get("result") or not isinstance(data["result"], list) or len(data["result"]) < 2:
-                logger.error("❌ Invalid API response: missing or incomplete result array")
-                logger.error(f"   Response keys: {list(data.keys())}")
-                logger.error(f"   Result type: {type(data.get('result'))}, Length: {len(data.get('result', []))}")
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": "Invalid API response: missing or incomplete result array"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # ===== STEP 1: Parse both result[0] and result[1] outputs =====
-            logger.info("🔍 Starting dynamic detection of audio and content results...")
-            
-            result0 = data["result"][0]
-            result1 = data["result"][1]
-            
-            logger.info(f"📦 Result[0]: stepType={result0.get('stepType')}, output_type={type(result0.get('output'))}")
-            logger.info(f"📦 Result[1]: stepType={result1.get('stepType')}, output_type={type(result1.get('output'))}")
-            
-            # Helper function to parse output (handles both JSON string and dict)
-            def parse_output(output_value, result_index):
-                if not output_value:
-                    raise ValueError(f"Missing output in result[{result_index}]")
-                
-                if isinstance(output_value, str):
-                    try:
-                        parsed = json.loads(output_value)
-                        logger.info(f"✅ Parsed result[{result_index}].output JSON")
-                        logger.info(f"   Keys in parsed result[{result_index}]: {list(parsed.keys())}")
-                        return parsed
-                    except json.JSONDecodeError as e:
-                        logger.error(f"❌ JSON Parse Error for result[{result_index}].output: {e}")
-                        logger.error(f"❌ Raw output string (first 500 chars): {output_value[:500]}")
-                        raise ValueError(f"Failed to parse result[{result_index}].output as JSON: {str(e)}")
-                else:
-                    logger.info(f"✅ result[{result_index}].output is already a dict/object")
-                    logger.info(f"   Keys in result[{result_index}]: {list(output_value.keys()) if isinstance(output_value, dict) else 'N/A'}")
-                    return output_value
-            
-            # Parse both outputs
-            try:
-                parsed_result0 = parse_output(result0.get("output"), 0)
-                parsed_result1 = parse_output(result1.get("output"), 1)
-            except ValueError as e:
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": str(e)},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # Extract segments from both results
-            segments0 = parsed_result0.get("segments", [])
-            segments1 = parsed_result1.get("segments", [])
-            
-            # Validate segments arrays
-            for segs, idx in [(segments0, 0), (segments1, 1)]:
-                if not isinstance(segs, list):
-                    logger.error(f"❌ Invalid API response: result[{idx}].output.segments is not a list")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": f"Invalid API response: result[{idx}].output.segments is not a list"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-                if len(segs) == 0:
-                    logger.error(f"❌ Invalid API response: result[{idx}].output.segments is empty")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": f"Invalid API response: result[{idx}].output.segments is empty"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-            
-            logger.info(f"📊 Found {len(segments0)} segments in result[0].output")
-            logger.info(f"📊 Found {len(segments1)} segments in result[1].output")
-            
-            # ===== STEP 2: Detect which result contains audio_base64 =====
-            logger.info("🔍 Detecting which result contains audio_base64...")
-            
-            def has_audio_base64(segments):
-                """Check if segments contain audio_base64 field"""
-                for seg in segments[:5]:  # Check first 5 segments for efficiency
-                    if seg.get("audio_base64"):
-                        return True
-                return False
-            
-            result0_has_audio = has_audio_base64(segments0)
-            result1_has_audio = has_audio_base64(segments1)
-            
-            logger.info(f"   Result[0] has audio_base64: {result0_has_audio}")
-            logger.info(f"   Result[1] has audio_base64: {result1_has_audio}")
-            
-            # Determine which result is audio and which is content
-            if result0_has_audio and not result1_has_audio:
-                audio_result_index = 0
-                content_result_index = 1
-                audio_segments = segments0
-                content_segments = segments1
-                audio_parsed = parsed_result0
-                content_parsed = parsed_result1
-                logger.info("✅ DETECTED: Result[0] contains audio_base64, Result[1] contains narration/image_url")
-            elif result1_has_audio and not result0_has_audio:
-                audio_result_index = 1
-                content_result_index = 0
-                audio_segments = segments1
-                content_segments = segments0
-                audio_parsed = parsed_result1
-                content_parsed = parsed_result0
-                logger.info("✅ DETECTED: Result[1] contains audio_base64, Result[0] contains narration/image_url")
-            elif result0_has_audio and result1_has_audio:
-                # Both have audio - this shouldn't happen, but use first one
-                logger.warning("⚠️  Both results contain audio_base64! Using result[0] for audio.")
-                audio_result_index = 0
-                content_result_index = 1
-                audio_segments = segments0
-                content_segments = segments1
-                audio_parsed = parsed_result0
-                content_parsed = parsed_result1
-            else:
-                # Neither has audio - error
-                logger.error("❌ Neither result contains audio_base64!")
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": "Invalid API response: neither result contains audio_base64"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # ===== STEP 3: Map segments from audio_result =====
-            logger.info(f"📦 Mapping audio segments from result[{audio_result_index}]...")
-            audio_segments_map = {}
-            
-            for seg in audio_segments:
-                segment_id = seg.get("segment_id")
-                if segment_id is None:
-                    logger.warning(f"⚠️  Skipping audio segment with no segment_id")
-                    continue
-                
-                audio_base64 = seg.get("audio_base64")
-                if not audio_base64:
-                    logger.warning(f"⚠️  Segment {segment_id} in result[{audio_result_index}] has no audio_base64")
-                    continue
-                
-                # Handle both string and list (chunks) formats
-                if isinstance(audio_base64, str):
-                    audio_len = len(audio_base64)
-                    logger.debug(f"   Segment {segment_id}: audio_base64 length={audio_len:,} chars")
-                elif isinstance(audio_base64, list):
-                    logger.info(f"   📦 Segment {segment_id}: audio_base64 is a list with {len(audio_base64)} chunks - combining")
-                    # Combine chunks: decode each, combine binary, re-encode
-                    combined_binary = b""
-                    for chunk in audio_base64:
-                        combined_binary += base64.b64decode(str(chunk))
-                    audio_base64 = base64.b64encode(combined_binary).decode("utf-8")
-                    audio_len = len(audio_base64)
-                else:
-                    logger.warning(f"   ⚠️  Segment {segment_id}: audio_base64 has unexpected type: {type(audio_base64)}")
-                    continue
-                
-                audio_segments_map[segment_id] = {
-                    "audio_base64": audio_base64,
-                    "audio_length": audio_len
-                }
-            
-            logger.info(f"✅ Mapped {len(audio_segments_map)} audio segments from result[{audio_result_index}]")
-            audio_segment_ids = sorted(audio_segments_map.keys())
-            logger.info(f"🔍 Audio segment IDs: {audio_segment_ids}")
-            
-            # ===== STEP 4: Map segments from content_result =====
-            logger.info(f"📦 Mapping content segments from result[{content_result_index}]...")
-            content_segments_map = {}
-            
-            for seg in content_segments:
-                segment_id = seg.get("segment_id")
-                if segment_id is None:
-                    logger.warning(f"⚠️  Skipping content segment with no segment_id")
-                    continue
-                
-                # Extract narration and image_url from content result
-                narration = seg.get("narration", "")
-                image_url = seg.get("image_url")
-                duration = seg.get("duration")
-                
-                content_segments_map[segment_id] = {
-                    "narration": narration,
-                    "image_url": image_url,
-                    "duration": duration
-                }
-            
-            logger.info(f"✅ Mapped {len(content_segments_map)} content segments from result[{content_result_index}]")
-            content_segment_ids = sorted(content_segments_map.keys())
-            logger.info(f"🔍 Content segment IDs: {content_segment_ids}")
-            
-            # ===== STEP 5: Combine segments by matching segment_id =====
-            logger.info("🔗 Combining segments by matching segment_id...")
-            
-            # Get all unique segment IDs from both results
-            all_segment_ids = set(audio_segment_ids + content_segment_ids)
-            logger.info(f"   Total unique segment IDs: {sorted(all_segment_ids)}")
-            
-            combined_segments = []
-            
-            for segment_id in sorted(all_segment_ids):
-                audio_data = audio_segments_map.get(segment_id)
-                content_data = content_segments_map.get(segment_id)
-                
-                if not audio_data:
-                    logger.warning(f"⚠️  Segment {segment_id}: missing audio in result[{audio_result_index}], skipping")
-                    continue
-                
-                if not content_data:
-                    logger.warning(f"⚠️  Segment {segment_id}: missing narration/image in result[{content_result_index}], skipping")
-                    continue
-                
-                # Extract audio_base64
-                audio_base64 = audio_data["audio_base64"]
-                audio_len = audio_data["audio_length"]
-                
-                # Combine data
-                combined_segment = {
-                    "segment_id": segment_id,
-                    "audioBase64": audio_base64,
-                    "imageUrl": content_data.get("image_url"),
-                    "narration": content_data.get("narration", ""),
-                    "duration": content_data.get("duration"),
-                }
-                
-                combined_segments.append(combined_segment)
-                
-                logger.debug(f"   Segment {segment_id}: "
-                           f"narration length={len(combined_segment['narration'])}, "
-                           f"has image={bool(combined_segment['imageUrl'])}, "
-                           f"audio length={audio_len:,} chars")
-            
-            # Sort by segment_id
-            combined_segments.sort(key=lambda x: x["segment_id"])
-            
-            logger.info(f"🔗 Combined {len(combined_segments)} segments")
-            
-            # Validate combined segments
-            valid_segments = []
-            for seg in combined_segments:
-                if seg.get("audioBase64") and seg.get("segment_id") is not None:
-                    valid_segments.append(seg)
-                else:
-                    logger.warning(f"⚠️  Skipping invalid segment: {seg.get('segment_id')}")
-            
-            if len(valid_segments) == 0:
-                logger.error("❌ No valid segments after combining")
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": "No valid segments could be created from API response"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # Get topic from either result, or use user input
-            topic = (
-                audio_parsed.get("topic") 
-                or content_parsed.get("topic") 
-                or request.userInput
-            )
-            
-            logger.info(f"🎓 Final Lesson Data:")
-            logger.info(f"   Topic: {topic}")
-            logger.info(f"   Valid segments: {len(valid_segments)}")
-            logger.info(f"   Segment IDs: {[s['segment_id'] for s in valid_segments]}")
-            
-            # Return lesson data as JSON
-            lesson_data = {
-                "topic": topic,
-                "segments": valid_segments
-            }
-            
-            logger.info(f"✅ Returning lesson data with {len(valid_segments)} segments")
-            return lesson_data
-            
-    except httpx.TimeoutException as e:
-        logger.error(f"❌ API Request Timeout: {e}")
-        return JSONResponse(
-            status_code=504,
-            content={"error": "Request to Airia.ai API timed out. Please try again."},
-            headers={"Access-Control-Allow-Origin": "*"}
+        # ===== STEP 4: Run the pipeline, coalescing with identical in-flight requests =====
+        lesson_data, shared = await lesson_flights.do(
+            cache_key,
+            lambda: _generate_and_cache_lesson(cache_key, enhanced_prompt, request.userInput, timer, user_id=request.user_id)
         )
-    except httpx.RequestError as e:
-        logger.error(f"❌ Network Error: {e}")
+    except AdmissionRejected as e:
+        _cancel_quiz_prefetch(request)
+        return _admission_rejected_response(e)
+    except PipelineError as e:
+        _cancel_quiz_prefetch(request)
         return JSONResponse(
-            status_code=503,
-            content={"error": f"Failed to connect to Airia.ai API: {str(e)}"},
+            status_code=e.status_code,
+            content={"error": e.message},
             headers={"Access-Control-Allow-Origin": "*"}
         )
     except HTTPException as e:
@@ -750,83 +795,353 @@ async def generate_lesson(request: GenerateLessonRequest):
             content={"error": f"Internal server error: {str(e)}"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
+    
+    if shared:
+        timer.record("coalesced_wait", timer.started_at)
+        http_response.headers["X-Coalesced"] = "true"
+    if LESSON_CACHE_ENABLED:
+        http_response.headers["X-Cache"] = "MISS"
+    
+    http_response.headers["Server-Timing"] = timer.header()
+    return _lesson_response(lesson_data, http_response)
 
 
-@app.post("/generateQuiz")
-async def generate_quiz(request: GenerateQuizRequest):
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _lesson_complete_event(lesson: dict, timer: StageTimer, **extra) -> str:
+    # Segments were already sent one by one, so only the lesson metadata is repeated
+    return _sse_event("complete", {
+        "topic": lesson["topic"],
+        "lesson_id": lesson.get("lesson_id"),
+        "segment_ids": [seg["segment_id"] for seg in lesson["segments"]],
+        "server_timing": timer.header(),
+        **extra
+    })
+
+
+@app.post("/generateLesson/stream")
+async def generate_lesson_stream(request: GenerateLessonRequest):
     """
-    Generate a quiz by calling Airia.ai API
+    Generate a lesson and deliver it progressively as Server-Sent Events
+    
+    Emits `stage` events (context_fetched, pipeline_started, parsed), then a
+    `segment` event for every merged segment as soon as its audio and
+    narration/image are paired while the Airia response is still streaming in
+    (sent again if a later duplicate segment_id replaces it), and finally a `complete` event with the topic, lesson_id and ordered
+    segment ids. Failures after the stream has started are sent as an `error`
+    event. Caching and coalescing behave as in /generateLesson.
     
     Args:
-        request: GenerateQuizRequest with userInput (lesson prompt) and optional user_id
+        request: GenerateLessonRequest with userInput and optional user_id
         
     Returns:
-        Quiz data with questions
-        
-    Raises:
-        HTTPException: If API call fails or response is invalid
+        text/event-stream response
     """
-    logger.info(f"🚀 Received quiz generation request for lesson prompt: {request.userInput}")
-    if request.user_id:
-        logger.info(f"👤 Fastino user_id from frontend: {request.user_id}")
-    else:
-        logger.info("👤 No Fastino user_id provided in request")
+    _log_lesson_request(request)
     
-    # ===== STEP 1: Query Fastino for user context if user_id is provided =====
-    user_pref_context = ""
+    error_response = _missing_credentials_response()
+    if error_response is not None:
+        return error_response
     
-    if request.user_id:
-        logger.info(f"🔍 Querying Fastino for user context for quiz generation for user: {request.user_id}")
+    async def events():
+        timer = StageTimer()
+        enhanced_prompt, user_context = await _prepare_lesson_prompt(request, timer)
+        yield _sse_event("stage", {"stage": "context_fetched", "personalized": user_context is not None})
         
-        # Create a question that helps Fastino understand what context we need about the topic
-        # Note: Do not put userInput in quotes as Fastino cannot read it properly
-        question = (
-            f"answer in 4-5 lines : What were the key observations from previous quizzes related to {request.userInput} "
-            f"Please provide detailed insights about what the user struggled with, any patterns in their learning performance related to this topic."
-        )
+        cache_key = make_cache_key(request.userInput, user_context)
+        cached_lesson = await _lookup_cached_lesson(cache_key, timer)
+        if cached_lesson is not None:
+            yield _sse_event("stage", {"stage": "parsed", "segments": len(cached_lesson["segments"]), "cache": "HIT"})
+            for segment in cached_lesson["segments"]:
+                yield _sse_event("segment", segment)
+            yield _lesson_complete_event(cached_lesson, timer, cache="HIT")
+            return
+        
+        # Merged segments are pushed from the pipeline task; None marks its completion
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def on_flight_done(task: asyncio.Task) -> None:
+            # Retrieve the outcome even if the client disconnected mid-stream
+            if not task.cancelled():
+                task.exception()
+            queue.put_nowait(None)
+        
+        # Streamed segment URLs and the final lesson share this generation's audio id
+        lesson_id = new_lesson_id()
+        flight = asyncio.ensure_future(lesson_flights.do(
+            cache_key,
+            lambda: _generate_and_cache_lesson(
+                cache_key, enhanced_prompt, request.userInput, timer,
+                on_segment=queue.put_nowait, user_id=request.user_id, lesson_id=lesson_id
+            )
+        ))
+        flight.add_done_callback(on_flight_done)
+        yield _sse_event("stage", {"stage": "pipeline_started"})
+        
+        streamed = set()
+        while True:
+            segment = await queue.get()
+            if segment is None:
+                break
+            streamed.add(segment["segment_id"])
+            yield _sse_event("segment", segment)
         
         try:
-            answer = await query_fastino(request.user_id, question, use_cache=False)
-            
-            if answer:
-                logger.info(f"✅ Retrieved answer from Fastino for quiz generation")
-                logger.info(f"📝 Fastino answer (first 500 chars): {answer[:500]}...")
-                
-                # Extract content after "Key Observations & Learning Patterns\n\n###"
-                pattern = "Key Observations & Learning Patterns\n\n###"
-                pattern_index = answer.find(pattern)
-                
-                if pattern_index != -1:
-                    # Extract everything after the pattern
-                    user_pref_context = answer[pattern_index + len(pattern):].strip()
-                    logger.info(f"📝 Found pattern, extracted content length: {len(user_pref_context)} chars")
-                    logger.info(f"📝 Extracted content (first 300 chars): {user_pref_context[:300]}...")
-                else:
-                    logger.warning("⚠️  Pattern 'Key Observations & Learning Patterns\\n\\n###' not found in Fastino answer")
-                    logger.warning(f"   Answer preview: {answer[:500]}")
-                    # Fallback: use the full answer if pattern not found
-                    user_pref_context = answer.strip()
-                    logger.info("ℹ️  Using full answer as fallback")
-            else:
-                logger.info("ℹ️  No answer retrieved from Fastino, using empty user context")
+            lesson_data, shared = flight.result()
+        except AdmissionRejected as e:
+            _cancel_quiz_prefetch(request)
+            yield _sse_event("error", {"status_code": e.status_code, "error": e.message, "retry_after": e.retry_after})
+            return
+        except PipelineError as e:
+            _cancel_quiz_prefetch(request)
+            yield _sse_event("error", {"status_code": e.status_code, "error": e.message})
+            return
         except Exception as e:
-            logger.warning(f"⚠️  Failed to query Fastino for quiz context: {e}. Continuing with empty user context.")
-    else:
-        logger.info("ℹ️  No user_id provided, skipping Fastino query for quiz")
+            logger.error(f"❌ Unexpected Error: {type(e).__name__}: {str(e)}", exc_info=True)
+            yield _sse_event("error", {"status_code": 500, "error": f"Internal server error: {str(e)}"})
+            return
+        
+        yield _sse_event("stage", {"stage": "parsed", "segments": len(lesson_data["segments"]), "cache": "MISS"})
+        # Segments not streamed yet (joined another request's execution)
+        for segment in lesson_data["segments"]:
+            if segment["segment_id"] not in streamed:
+                yield _sse_event("segment", segment)
+        if shared:
+            timer.record("coalesced_wait", timer.started_at)
+        yield _lesson_complete_event(lesson_data, timer, cache="MISS", coalesced=shared)
     
-    # Validate environment variables
-    if not AIRIA_API_KEY or not AIRIA_QUIZ_API_URL or not AIRIA_USER_ID:
-        logger.error("❌ Missing Airia.ai API credentials")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _run_lesson_job(request: GenerateLessonRequest) -> dict:
+    """Generate a lesson for a queued job (served from the cache / coalesced like /generateLesson)"""
+    timer = StageTimer()
+    enhanced_prompt, user_context = await _prepare_lesson_prompt(request, timer)
+    cache_key = make_cache_key(request.userInput, user_context)
+    cached_lesson = await _lookup_cached_lesson(cache_key, timer)
+    if cached_lesson is not None:
+        return cached_lesson
+    try:
+        lesson_data, _ = await lesson_flights.do(
+            cache_key,
+            lambda: _generate_and_cache_lesson(cache_key, enhanced_prompt, request.userInput, timer, user_id=request.user_id)
+        )
+    except (PipelineError, AdmissionRejected) as e:
+        _cancel_quiz_prefetch(request)
+        raise JobError(e.status_code, e.message) from e
+    logger.info(f"⏱️  Lesson job stages: {timer.header()}")
+    return lesson_data
+
+
+@app.post("/jobs/lesson", status_code=202)
+async def submit_lesson_job(request: GenerateLessonRequest):
+    """
+    Queue a lesson generation job and return its id immediately
+    
+    The lesson is generated by a bounded pool of background workers; poll
+    GET /jobs/{job_id} for the result. Nothing is held open while Airia runs,
+    so the endpoint works behind proxies with short timeouts.
+    
+    Args:
+        request: GenerateLessonRequest with userInput and optional user_id
+        
+    Returns:
+        202 with job_id and the URL to poll, or 503 when the job queue is full
+    """
+    _log_lesson_request(request)
+    
+    error_response = _missing_credentials_response()
+    if error_response is not None:
+        return error_response
+    
+    try:
+        job = job_runner.submit("lesson", lambda: _run_lesson_job(request))
+    except JobQueueFull as e:
+        logger.warning(f"⚠️  {e}")
         return JSONResponse(
-            status_code=500,
-            content={"error": "Server configuration error: Missing API credentials"},
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Access-Control-Allow-Origin": "*", "Retry-After": "10"}
+        )
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get the status of a job, including its result once it has succeeded
+    
+    Args:
+        job_id: Id returned when the job was submitted
+        
+    Returns:
+        Job status (queued, running, succeeded or failed) with result or error,
+        or 404 if the job is unknown or expired
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Job {job_id} not found"},
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+    if not job.done:
+        # Hint for polling clients
+        return JSONResponse(content=job.to_dict(), headers={"Retry-After": "2"})
+    # Finished lesson jobs carry the whole lesson, so skip the generic encoder
+    return fast_json_response(job.to_dict())
+
+
+@app.api_route("/lessons/{lesson_id}/segments/{segment_id}/audio", methods=["GET", "HEAD"])
+async def get_segment_audio(lesson_id: str, segment_id: int, request: Request):
+    """
+    Serve the raw audio bytes of a lesson segment
+    
+    Supports conditional requests (If-None-Match) and single byte ranges (Range/If-Range)
+    so audio elements can seek without downloading the whole segment.
+    
+    Args:
+        lesson_id: Lesson id from the lesson response
+        segment_id: Segment id within the lesson
+        request: Incoming request (for the Range and conditional headers)
+        
+    Returns:
+        Audio bytes (200/206), 304 when the ETag matches, 404 or 416 on errors
+    """
+    blob = await audio_store.get(lesson_id, segment_id)
+    if blob is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Audio not found for lesson {lesson_id} segment {segment_id}"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
     
+    size = len(blob.data)
+    headers = {
+        "ETag": blob.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={int(AUDIO_STORE_TTL)}, immutable",
+        "Access-Control-Allow-Origin": "*",
+    }
+    
+    if request.headers.get("if-none-match") == blob.etag:
+        return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != blob.etag:
+        # The client's copy is stale, send the whole blob instead of a partial one
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    if byte_range is None:
+        return Response(content=blob.data, media_type=blob.content_type, headers=headers)
+    
+    start, end = byte_range
+    return Response(
+        content=blob.data[start:end + 1],
+        status_code=206,
+        media_type=blob.content_type,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+    )
+
+
+def _service_stats() -> dict:
+    """Cache, queue, upstream and process metrics"""
+    return {
+        "lesson_cache": lesson_cache.stats(),
+        "lesson_single_flight": lesson_flights.stats(),
+        "jobs": job_runner.stats(),
+        "fastino_ingest": ingest_buffer.stats(),
+        "fastino_context": fastino_context_cache.stats(),
+        "quiz_prefetch": quiz_prefetcher.stats(),
+        "upstreams": {upstream: breaker.stats() for upstream, breaker in breakers.items()},
+        "hedging": hedge_budget.stats(),
+        "admission": {name: limiter.stats() for name, limiter in limiters.items()},
+        "compression": compression_stats(),
+        "http_pools": http_clients.pool_stats(),
+        "event_loop": loop_monitor.stats(),
+        "worker_pool": worker_pool.stats(),
+        "process": process_stats(),
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Service metrics as JSON (see _service_stats)"""
+    return _service_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Service metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(_service_stats()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def _fetch_quiz_context(user_id: str, user_input: str) -> str:
+    """Query Fastino for observations from the user's previous quizzes on a topic"""
+    logger.info(f"🔍 Querying Fastino for user context for quiz generation for user: {user_id}")
+    user_pref_context = ""
+    
+    try:
+        answer = await _query_user_context(user_id, QUIZ_CONTEXT_QUESTION, user_input)
+        
+        if answer:
+            logger.info(f"✅ Retrieved answer from Fastino for quiz generation")
+            log_payload(logger, "📝 Fastino answer", answer, limit=500)
+            
+            # Extract content after "Key Observations & Learning Patterns\n\n###"
+            pattern = "Key Observations & Learning Patterns\n\n###"
+            pattern_index = answer.find(pattern)
+            
+            if pattern_index != -1:
+                # Extract everything after the pattern
+                user_pref_context = answer[pattern_index + len(pattern):].strip()
+                logger.info(f"📝 Found pattern, extracted content length: {len(user_pref_context)} chars")
+                logger.info(f"📝 Extracted content (first 300 chars): {user_pref_context[:300]}...")
+            else:
+                logger.warning("⚠️  Pattern 'Key Observations & Learning Patterns\\n\\n###' not found in Fastino answer")
+                logger.warning(f"   Answer preview: {answer[:500]}")
+                # Fallback: use the full answer if pattern not found
+                user_pref_context = answer.strip()
+                logger.info("ℹ️  Using full answer as fallback")
+        else:
+            logger.info("ℹ️  No answer retrieved from Fastino, using empty user context")
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to query Fastino for quiz context: {e}. Continuing with empty user context.")
+    return user_pref_context
+
+
+async def run_quiz_pipeline(user_input: str, user_pref_context: str, user_id: Optional[str] = None) -> dict:
+    """
+    Run the Airia.ai quiz pipeline and convert its questions to the frontend format
+    
+    Args:
+        user_input: Lesson prompt the quiz is generated for
+        user_pref_context: Observations from previous quizzes (may be empty)
+        user_id: Fastino user ID the quiz is for, used for fair admission (None = anonymous)
+        
+    Returns:
+        Quiz data dict with questions
+        
+    Raises:
+        PipelineError: If the API call fails or the response is invalid
+    """
     # Prepare payload for Airia.ai Quiz API as JSON: {user_pref_context: "...", user_input: "..."}
     quiz_payload_data = {
         "user_pref_context": user_pref_context,
-        "user_input": request.userInput
+        "user_input": user_input
     }
     
     # Convert to JSON string for userInput field
@@ -845,182 +1160,154 @@ async def generate_quiz(request: GenerateQuizRequest):
     }
     
     logger.info(f"📡 Calling Airia.ai Quiz API: {AIRIA_QUIZ_API_URL}")
-    logger.info(f"📦 Airia.ai Quiz Payload: {json.dumps(payload)}")
+    log_payload(logger, "📦 Airia.ai Quiz Payload", payload)
     
     try:
-        # Call Airia.ai API
-        timeout = httpx.Timeout(300.0, connect=30.0)  # 5 minutes total, 30s connect
+        # Call Airia.ai API (adaptive read timeout up to 5 minutes, 30s connect)
+        client = get_client(AIRIA)
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            # Convert payload to JSON string
-            payload_json = json.dumps(payload)
-            
-            logger.info(f"🚀 Sending quiz request with payload length: {len(payload_json)} bytes")
-            
+        # Convert payload to JSON string
+        payload_json = json.dumps(payload)
+        
+        logger.info(f"🚀 Sending quiz request with payload length: {len(payload_json)} bytes")
+        
+        ceiling, floor = AIRIA_QUIZ_TIMEOUT
+        async with quiz_admission.slot(user_id), get_breaker(AIRIA).call("quiz", ceiling, floor) as call:
             response = await client.post(
                 AIRIA_QUIZ_API_URL,
                 headers=headers,
-                content=payload_json
+                content=payload_json,
+                timeout=httpx.Timeout(call.timeout, connect=30.0)
             )
-            
-            logger.info(f"📡 Quiz API Response Status: {response.status_code}")
-            
-            if not response.is_success:
-                error_text = response.text
-                logger.error(f"❌ Quiz API Error Response: {error_text}")
-                return JSONResponse(
-                    status_code=response.status_code,
-                    content={"error": f"Airia.ai Quiz API error: {response.status_code} {response.reason_phrase}. {error_text[:200]}"},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-            
-            # Log the full raw response
-            raw_response_text = response.text
-            logger.info("=" * 80)
-            logger.info("📋 FULL QUIZ API RAW RESPONSE:")
-            logger.info("=" * 80)
-            logger.info(raw_response_text)
-            logger.info("=" * 80)
-            
-            # Parse response
-            try:
-                data = response.json()
-                logger.info(f"✅ Quiz API Response parsed successfully. Result count: {len(data.get('result', []))}")
-                
-                # Log the full parsed response structure
-                logger.info("=" * 80)
-                logger.info("📋 FULL QUIZ API PARSED RESPONSE:")
-                logger.info("=" * 80)
-                logger.info(json.dumps(data, indent=2))
-                logger.info("=" * 80)
-                
-                # Check if result exists (quiz API returns result as a string)
-                result_value = data.get("result")
-                
-                if not result_value:
-                    logger.warning("⚠️  No result found in response")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": "No result found in API response"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-                
-                logger.info(f"📦 Result type: {type(result_value)}")
-                
-                # Parse result - it's a JSON string wrapped in markdown code blocks
-                quiz_json_str = None
-                
-                if isinstance(result_value, str):
-                    logger.info("🔍 Result is a string, extracting JSON from markdown code blocks...")
-                    # Extract JSON from markdown code blocks (```json ... ```)
-                    json_match = re.search(r'```json\s*\n(.*?)\n```', result_value, re.DOTALL)
-                    if json_match:
-                        quiz_json_str = json_match.group(1).strip()
-                        logger.info("✅ Extracted JSON from markdown code blocks")
-                    else:
-                        # Try without markdown wrapper - might be plain JSON string
-                        quiz_json_str = result_value.strip()
-                        logger.info("⚠️  No markdown code blocks found, using result as-is")
-                else:
-                    # Result might already be a dict
-                    quiz_json_str = json.dumps(result_value)
-                
-                # Parse the JSON string
-                try:
-                    quiz_data = json.loads(quiz_json_str)
-                    logger.info("✅ Successfully parsed quiz JSON")
-                    logger.info(f"📋 Quiz data keys: {list(quiz_data.keys()) if isinstance(quiz_data, dict) else 'N/A'}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"❌ Failed to parse quiz JSON: {e}")
-                    logger.error(f"   First 500 chars: {quiz_json_str[:500] if quiz_json_str else 'None'}")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": f"Failed to parse quiz JSON: {str(e)}"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-                
-                # Extract quiz array
-                quiz_array = quiz_data.get("quiz")
-                if not quiz_array or not isinstance(quiz_array, list):
-                    logger.error(f"❌ No 'quiz' array found in parsed data. Keys: {list(quiz_data.keys()) if isinstance(quiz_data, dict) else 'N/A'}")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": "No 'quiz' array found in response"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-                
-                logger.info(f"✅ Found {len(quiz_array)} questions in quiz")
-                
-                # Convert quiz questions to frontend format
-                formatted_questions = []
-                for idx, question_data in enumerate(quiz_array):
-                    question_text = question_data.get("question", "")
-                    options = question_data.get("options", [])
-                    correct_answer_text = question_data.get("correct_answer", "")
-                    
-                    # Find the index of correct answer in options
-                    correct_answer_index = -1
-                    try:
-                        correct_answer_index = options.index(correct_answer_text)
-                    except ValueError:
-                        logger.warning(f"⚠️  Question {idx + 1}: Correct answer '{correct_answer_text}' not found in options")
-                        # Try case-insensitive match
-                        for i, opt in enumerate(options):
-                            if opt.lower().strip() == correct_answer_text.lower().strip():
-                                correct_answer_index = i
-                                break
-                    
-                    if correct_answer_index == -1:
-                        logger.error(f"❌ Question {idx + 1}: Could not find correct answer index")
-                        continue
-                    
-                    formatted_questions.append({
-                        "id": idx + 1,
-                        "question": question_text,
-                        "options": options,
-                        "correctAnswer": correct_answer_index
-                    })
-                
-                if len(formatted_questions) == 0:
-                    logger.error("❌ No valid questions could be formatted")
-                    return JSONResponse(
-                        status_code=500,
-                        content={"error": "No valid questions found in quiz"},
-                        headers={"Access-Control-Allow-Origin": "*"}
-                    )
-                
-                logger.info(f"✅ Formatted {len(formatted_questions)} quiz questions")
-                
-                # Return formatted quiz
-                return JSONResponse(
-                    status_code=200,
-                    content={
-                        "questions": formatted_questions
-                    },
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Failed to parse response as JSON: {e}")
-                logger.error(f"   First 500 chars of response: {raw_response_text[:500]}")
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": f"Failed to parse API response as JSON: {str(e)}", "raw_response_preview": raw_response_text[:500]},
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-                
+            call.check(response)
+    except CircuitOpenError as e:
+        logger.error(f"❌ Skipping Airia.ai quiz pipeline: {e}")
+        raise PipelineError(503, f"Airia.ai Quiz API is temporarily unavailable, retry in {e.retry_after:.0f}s")
     except httpx.TimeoutException as e:
         logger.error(f"❌ Quiz API Request Timeout: {e}")
+        raise PipelineError(504, "Request to Airia.ai Quiz API timed out. Please try again.")
+    except httpx.RequestError as e:
+        logger.error(f"❌ Quiz Network Error: {e}")
+        raise PipelineError(503, f"Failed to connect to Airia.ai Quiz API: {str(e)}")
+    
+    logger.info(f"📡 Quiz API Response Status: {response.status_code}")
+    
+    if not response.is_success:
+        error_text = response.text
+        logger.error("❌ Quiz API Error Response: %s", Preview(error_text))
+        raise PipelineError(
+            response.status_code,
+            f"Airia.ai Quiz API error: {response.status_code} {response.reason_phrase}. {error_text[:200]}"
+        )
+    
+    # Log the raw response (preview only at DEBUG)
+    raw_response_text = response.text
+    log_payload(logger, "📋 Quiz API raw response", raw_response_text)
+    
+    # Parse response
+    try:
+        data = response.json()
+    except json.JSONDecodeError as e:
+        errors.inc("airia_quiz", "parse_error")
+        logger.error(f"❌ Failed to parse response as JSON: {e}")
+        logger.error(f"   First 500 chars of response: {raw_response_text[:500]}")
+        raise PipelineError(
+            500,
+            f"Failed to parse API response as JSON: {str(e)}",
+            details={"raw_response_preview": raw_response_text[:500]}
+        )
+    logger.info(f"✅ Quiz API Response parsed successfully. Result count: {len(data.get('result', []))}")
+    
+    # Log the parsed response structure (preview only at DEBUG)
+    log_payload(logger, "📋 Quiz API parsed response", data)
+    
+    # Check if result exists (quiz API returns result as a string)
+    result_value = data.get("result")
+    
+    if not result_value:
+        logger.warning("⚠️  No result found in response")
+        raise PipelineError(500, "No result found in API response")
+    
+    logger.info(f"📦 Result type: {type(result_value)}")
+    
+    # Parse result - it's a JSON string wrapped in markdown code blocks
+    try:
+        quiz_array = parse_quiz_result(result_value)
+    except QuizParseError as e:
+        errors.inc("airia_quiz", "parse_error")
+        raise PipelineError(500, str(e))
+    
+    formatted_questions = format_quiz_questions(quiz_array)
+    
+    if len(formatted_questions) == 0:
+        logger.error("❌ No valid questions could be formatted")
+        raise PipelineError(500, "No valid questions found in quiz")
+    
+    logger.info(f"✅ Formatted {len(formatted_questions)} quiz questions")
+    quiz_questions.observe(len(formatted_questions))
+    return {"questions": formatted_questions}
+
+
+async def _generate_quiz(user_input: str, user_id: Optional[str]) -> dict:
+    """Fetch the quiz context (if there is a user) and run the quiz pipeline"""
+    if user_id:
+        user_pref_context = await _fetch_quiz_context(user_id, user_input)
+    else:
+        logger.info("ℹ️  No user_id provided, skipping Fastino query for quiz")
+        user_pref_context = ""
+    return await run_quiz_pipeline(user_input, user_pref_context, user_id)
+
+
+@app.post("/generateQuiz")
+async def generate_quiz(request: GenerateQuizRequest):
+    """
+    Generate a quiz by calling Airia.ai API
+    
+    A quiz pre-generated alongside the lesson (see QUIZ_PREFETCH_ENABLED) is returned
+    right away, or awaited if it is still being generated.
+    
+    Args:
+        request: GenerateQuizRequest with userInput (lesson prompt) and optional user_id
+        
+    Returns:
+        Quiz data with questions
+        
+    Raises:
+        HTTPException: If API call fails or response is invalid
+    """
+    logger.info(f"🚀 Received quiz generation request for lesson prompt: {request.userInput}")
+    if request.user_id:
+        logger.info(f"👤 Fastino user_id from frontend: {request.user_id}")
+    else:
+        logger.info("👤 No Fastino user_id provided in request")
+    
+    # Validate environment variables
+    if not AIRIA_API_KEY or not AIRIA_QUIZ_API_URL or not AIRIA_USER_ID:
+        logger.error("❌ Missing Airia.ai API credentials")
         return JSONResponse(
-            status_code=504,
-            content={"error": "Request to Airia.ai Quiz API timed out. Please try again."},
+            status_code=500,
+            content={"error": "Server configuration error: Missing API credentials"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
-    except httpx.RequestError as e:
-        logger.error(f"❌ Quiz Network Error: {e}")
+    
+    # ===== Serve the quiz pre-generated alongside the lesson, if any =====
+    quiz_data = await quiz_prefetcher.take(request.user_id, request.userInput)
+    if quiz_data is not None:
+        logger.info(f"⚡ Returning pre-generated quiz with {len(quiz_data['questions'])} questions")
+        return fast_json_response(
+            status_code=200,
+            content=quiz_data,
+            headers={"Access-Control-Allow-Origin": "*", "X-Quiz-Prefetch": "HIT"}
+        )
+    
+    try:
+        quiz_data = await _generate_quiz(request.userInput, request.user_id)
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    except PipelineError as e:
         return JSONResponse(
-            status_code=503,
-            content={"error": f"Failed to connect to Airia.ai Quiz API: {str(e)}"},
+            status_code=e.status_code,
+            content={"error": e.message, **e.details},
             headers={"Access-Control-Allow-Origin": "*"}
         )
     except Exception as e:
@@ -1030,6 +1317,13 @@ async def generate_quiz(request: GenerateQuizRequest):
             content={"error": f"Internal server error: {str(e)}"},
             headers={"Access-Control-Allow-Origin": "*"}
         )
+    
+    # Return formatted quiz
+    return fast_json_response(
+        status_code=200,
+        content=quiz_data,
+        headers={"Access-Control-Allow-Origin": "*"}
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,242 @@
+"""
+Prometheus Metrics
+Counters and histograms for routes, upstream calls, request stages, lesson/quiz
+sizes and error classes, rendered in the Prometheus text format on /metrics.
+
+Recording an event is a dict lookup, a bisect and a couple of additions (about a
+microsecond), so it stays on the hot path. Everything the service already counts
+(cache hit ratios, in-flight work, queue depths) is not recorded again; it is read
+from the /cache/stats dict at scrape time and exported as gauges.
+"""
+
+import os
+import re
+import time
+import logging
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_PREFIX = "learnai"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)  # seconds
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MB
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 10, 15, 20, 30, 50, 100, 200)
+
+# Nested /cache/stats dicts keyed by a name (upstream, limiter, ...) become labels instead of name parts
+_STATS_LABELS = {
+    "upstreams": "upstream",
+    "admission": "limiter",
+    "http_pools": "upstream",
+    "operations": "operation",
+    "stages": "stage",
+    "by_encoding": "encoding",
+}
+
+_registry: List["_Metric"] = []
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination (label values are passed positionally)"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Current value per label combination"""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label combination, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# ===== Metrics =====
+
+http_requests = Counter("http_requests_total", "HTTP requests by route template and status code", ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "Time until the response body was fully sent", ("method", "route"))
+http_response_size = Histogram("http_response_size_bytes", "Response body bytes sent (after compression)", ("route",), SIZE_BUCKETS)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being processed")
+
+upstream_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Upstream calls from start until the response was consumed, by upstream and operation",
+    ("upstream", "operation"),
+)
+upstream_in_flight = Gauge("upstream_requests_in_flight", "Upstream calls in progress", ("upstream", "operation"))
+errors = Counter(
+    "errors_total",
+    "Errors by source and class (timeout, request_error, http_error, circuit_open, parse_error)",
+    ("source", "error_class"),
+)
+
+stage_duration = Histogram("stage_duration_seconds", "Duration of the Server-Timing stages of lesson requests", ("stage",))
+lesson_segments = Histogram("lesson_segments", "Segments per generated lesson", (), COUNT_BUCKETS)
+quiz_questions = Histogram("quiz_questions", "Questions per generated quiz", (), COUNT_BUCKETS)
+
+
+# ===== HTTP middleware =====
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests and timing them per route template
+
+    Requests that match no route are labelled "unmatched" so unknown paths cannot
+    create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+
+        async def send_with_metrics(message) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, path, state["status"])
+            http_request_duration.observe(time.perf_counter() - started_at, method, path)
+            http_response_size.observe(state["bytes"], path)
+
+
+# ===== Exposition =====
+
+def _gauge_name(path: Tuple[str, ...]) -> str:
+    return _INVALID_NAME_CHARS.sub("_", f"{METRICS_PREFIX}_{'_'.join(path)}")
+
+
+def _stats_gauges(stats: dict, path: Tuple[str, ...], labels: Tuple[Tuple[str, str], ...], out: Dict[str, list]) -> None:
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            label = _STATS_LABELS.get(key)
+            if label is None:
+                _stats_gauges(value, path + (key,), labels, out)
+            else:
+                for name, child in value.items():
+                    if isinstance(child, dict):
+                        _stats_gauges(child, path + (key,), labels + ((label, name),), out)
+                    else:
+                        out.setdefault(_gauge_name(path + (key,)), []).append((labels + ((label, name),), child))
+        elif isinstance(value, (int, float)):
+            out.setdefault(_gauge_name(path + (key,)), []).append((labels, value))
+
+
+def render(stats: dict) -> str:
+    """
+    Render every metric in the Prometheus text format (version 0.0.4)
+
+    Args:
+        stats: The /cache/stats dict; its numeric values are exported as
+            learnai_<section>_<key> gauges (bools as 0/1, strings skipped)
+    """
+    lines: List[str] = []
+    for metric in _registry:
+        samples = metric.render()
+        if samples:
+            lines.extend(metric.header())
+            lines.extend(samples)
+
+    gauges: Dict[str, list] = {}
+    _stats_gauges(stats, (), (), gauges)
+    for name, samples in gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            names, values = zip(*labels) if labels else ((), ())
+            lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+    return "\n".join(lines) + "\n"
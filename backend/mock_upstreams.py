@@ -0,0 +1,352 @@
+"""
+Mock Upstreams
+Local stand-ins for the Airia lesson/quiz pipelines and the Fastino API that serve
+recorded fixtures (mock_fixtures/, or a real response dumped by debug_response.py),
+so every performance feature can be exercised offline without using real quota.
+Latency distribution, error injection, bandwidth and response sizes are
+configurable per endpoint, at startup through the environment or at runtime
+through POST /_mock/config.
+
+Usage:
+    python mock_upstreams.py
+    AIRIA_API_URL=http://127.0.0.1:8100/airia/lesson \\
+    AIRIA_QUIZ_API_URL=http://127.0.0.1:8100/airia/quiz \\
+    FASTINO_API_URL=http://127.0.0.1:8100/fastino FASTINO_API_KEY=mock python main.py
+"""
+
+import os
+import copy
+import json
+import math
+import base64
+import random
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MOCK_HOST = os.getenv("MOCK_HOST", "127.0.0.1")
+MOCK_PORT = int(os.getenv("MOCK_PORT", "8100"))
+MOCK_SEED = os.getenv("MOCK_SEED")  # set for reproducible latency/error sequences
+MOCK_HANG_SECONDS = float(os.getenv("MOCK_HANG_SECONDS", "600"))  # how long an injected hang lasts
+MOCK_FIXTURES_DIR = os.getenv("MOCK_FIXTURES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_fixtures"))
+# e.g. MOCK_AIRIA_LESSON_FIXTURE=temp_response.json to replay a response dumped by debug_response.py
+MOCK_AIRIA_LESSON_FIXTURE = os.getenv("MOCK_AIRIA_LESSON_FIXTURE", os.path.join(MOCK_FIXTURES_DIR, "airia_lesson.json"))
+
+# Response sizes (0 = as recorded)
+MOCK_LESSON_SEGMENTS = int(os.getenv("MOCK_LESSON_SEGMENTS", "0"))
+MOCK_LESSON_AUDIO_BYTES = int(os.getenv("MOCK_LESSON_AUDIO_BYTES", "0"))  # decoded audio bytes per segment
+MOCK_QUIZ_QUESTIONS = int(os.getenv("MOCK_QUIZ_QUESTIONS", "0"))
+MOCK_QUERY_ANSWER_BYTES = int(os.getenv("MOCK_QUERY_ANSWER_BYTES", "0"))
+
+# Default latency per endpoint (override with MOCK_<ENDPOINT>_LATENCY)
+DEFAULT_LATENCIES = {
+    "airia_lesson": "lognormal:20:0.3",
+    "airia_quiz": "lognormal:6:0.3",
+    "fastino_register": "lognormal:0.2:0.3",
+    "fastino_ingest": "lognormal:0.2:0.3",
+    "fastino_query": "lognormal:0.6:0.4|0.02*uniform:3:6",
+}
+
+_rng = random.Random(MOCK_SEED)
+
+
+class LatencyDistribution:
+    """
+    Mixture of latency components in seconds, e.g. "lognormal:0.6:0.4|0.02*uniform:3:6"
+
+    Components are separated by "|" and may carry a "weight*" prefix; components
+    without one share the remaining weight equally. Kinds: fixed:S, uniform:LO:HI,
+    normal:MEAN:STD, lognormal:MEDIAN:SIGMA, exponential:MEAN.
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        components: List[Tuple[Optional[float], str, List[float]]] = []
+        for part in spec.split("|"):
+            weight, _, component = part.strip().rpartition("*")
+            kind, *args = component.split(":")
+            if kind not in self.KINDS or len(args) != self.KINDS[kind]:
+                raise ValueError(f"Invalid latency component {part!r} in {spec!r}")
+            components.append((float(weight) if weight else None, kind, [float(a) for a in args]))
+
+        explicit = sum(w for w, _, _ in components if w is not None)
+        implicit = [c for c in components if c[0] is None]
+        share = max(0.0, 1.0 - explicit) / len(implicit) if implicit else 0.0
+        self.components = [(share if w is None else w, kind, args) for w, kind, args in components]
+        self._total = sum(w for w, _, _ in self.components)
+
+    def sample(self, rng: random.Random) -> float:
+        pick = rng.random() * self._total
+        for weight, kind, args in self.components:
+            pick -= weight
+            if pick <= 0:
+                break
+        if kind == "fixed":
+            return args[0]
+        if kind == "uniform":
+            return rng.uniform(args[0], args[1])
+        if kind == "normal":
+            return max(0.0, rng.gauss(args[0], args[1]))
+        if kind == "lognormal":
+            return rng.lognormvariate(math.log(args[0]), args[1]) if args[0] > 0 else 0.0
+        return rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+
+
+class EndpointBehavior:
+    """Latency, injected failures and bandwidth of one mocked endpoint"""
+
+    FIELDS = ("latency", "error_rate", "error_status", "hang_rate", "bandwidth")
+
+    def __init__(self, name: str):
+        prefix = f"MOCK_{name.upper()}"
+        self.name = name
+        self.latency = LatencyDistribution(os.getenv(f"{prefix}_LATENCY", DEFAULT_LATENCIES[name]))
+        self.error_rate = float(os.getenv(f"{prefix}_ERROR_RATE", "0"))  # fraction answered with error_status
+        self.error_status = int(os.getenv(f"{prefix}_ERROR_STATUS", "503"))
+        self.hang_rate = float(os.getenv(f"{prefix}_HANG_RATE", "0"))  # fraction that hang for MOCK_HANG_SECONDS
+        self.bandwidth = int(os.getenv(f"{prefix}_BANDWIDTH", "0"))  # response bytes per second (0 = unlimited)
+        self.metrics: Dict[str, int] = {"requests": 0, "in_flight": 0, "errors": 0, "hangs": 0, "bytes_sent": 0}
+
+    def parse(self, changes: dict) -> dict:
+        """Validate and convert setting changes without applying them"""
+        unknown = set(changes) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown setting(s) for {self.name}: {', '.join(sorted(unknown))}")
+        parsed = {}
+        for field, value in changes.items():
+            if field == "latency":
+                value = LatencyDistribution(value)
+            elif field in ("error_status", "bandwidth"):
+                value = int(value)
+            else:
+                value = float(value)
+            parsed[field] = value
+        return parsed
+
+    def update(self, parsed: dict) -> None:
+        """Apply changes returned by parse()"""
+        for field, value in parsed.items():
+            setattr(self, field, value)
+
+    def config(self) -> dict:
+        return {
+            "latency": self.latency.spec,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "hang_rate": self.hang_rate,
+            "bandwidth": self.bandwidth,
+        }
+
+
+behaviors: Dict[str, EndpointBehavior] = {name: EndpointBehavior(name) for name in DEFAULT_LATENCIES}
+sizes: Dict[str, int] = {
+    "lesson_segments": MOCK_LESSON_SEGMENTS,
+    "lesson_audio_bytes": MOCK_LESSON_AUDIO_BYTES,
+    "quiz_questions": MOCK_QUIZ_QUESTIONS,
+    "query_answer_bytes": MOCK_QUERY_ANSWER_BYTES,
+}
+
+
+# ===== Fixtures =====
+
+def _load_fixture(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _fixture_path(name: str) -> str:
+    return os.path.join(MOCK_FIXTURES_DIR, name)
+
+
+def _decode_audio(audio) -> bytes:
+    chunks = audio if isinstance(audio, list) else [audio]
+    return b"".join(base64.b64decode(chunk) for chunk in chunks if chunk)
+
+
+def _resize(items: List[dict], count: int) -> List[dict]:
+    """Repeat or truncate recorded segments to count, renumbering segment_id"""
+    if not count or not items:
+        return items
+    resized = []
+    for i in range(count):
+        item = copy.deepcopy(items[i % len(items)])
+        item["segment_id"] = i + 1
+        resized.append(item)
+    return resized
+
+
+@lru_cache(maxsize=8)
+def lesson_body(segments: int, audio_bytes: int) -> bytes:
+    """Recorded lesson response resized to segments x audio_bytes, serialized once per size"""
+    data = _load_fixture(MOCK_AIRIA_LESSON_FIXTURE)
+    for result in data.get("result", []):
+        output = result.get("output")
+        parsed = json.loads(output) if isinstance(output, str) else output
+        if not isinstance(parsed, dict) or not parsed.get("segments"):
+            continue
+        parsed["segments"] = _resize(parsed["segments"], segments)
+        if audio_bytes:
+            for seg in parsed["segments"]:
+                if seg.get("audio_base64"):
+                    recorded = _decode_audio(seg["audio_base64"])
+                    audio = (recorded * (audio_bytes // len(recorded) + 1))[:audio_bytes]
+                    seg["audio_base64"] = base64.b64encode(audio).decode("ascii")
+        result["output"] = json.dumps(parsed) if isinstance(output, str) else parsed
+    return json.dumps(data).encode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def quiz_body(questions: int) -> bytes:
+    data = _load_fixture(_fixture_path("airia_quiz.json"))
+    if questions:
+        text = data["result"]
+        start, end = text.index("{"), text.rindex("}") + 1
+        quiz = json.loads(text[start:end])
+        quiz["quiz"] = [quiz["quiz"][i % len(quiz["quiz"])] for i in range(questions)]
+        data["result"] = text[:start] + json.dumps(quiz, indent=2) + text[end:]
+    return json.dumps(data).encode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def query_body(answer_bytes: int) -> bytes:
+    data = _load_fixture(_fixture_path("fastino_query.json"))
+    if answer_bytes:
+        answer = data["answer"]
+        data["answer"] = (answer * (answer_bytes // len(answer) + 1))[:answer_bytes]
+    return json.dumps(data).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def static_body(fixture: str) -> bytes:
+    return json.dumps(_load_fixture(_fixture_path(fixture))).encode("utf-8")
+
+
+# ===== App =====
+
+app = FastAPI(title="Learn.AI Mock Upstreams", description="Airia and Fastino stand-ins for offline benchmarks")
+
+
+async def _trickle(body: bytes, bandwidth: int, behavior: EndpointBehavior):
+    chunk_size = max(1024, bandwidth // 20)  # ~20 writes per second
+    for start in range(0, len(body), chunk_size):
+        chunk = body[start:start + chunk_size]
+        behavior.metrics["bytes_sent"] += len(chunk)
+        yield chunk
+        await asyncio.sleep(len(chunk) / bandwidth)
+
+
+async def _serve(request: Request, name: str, body: bytes) -> Response:
+    """Answer like the real endpoint: wait a sampled latency, maybe fail, then send body"""
+    behavior = behaviors[name]
+    behavior.metrics["requests"] += 1
+    if not request.headers.get("x-api-key"):
+        return JSONResponse(status_code=401, content={"error": "Missing API key"})
+
+    behavior.metrics["in_flight"] += 1
+    try:
+        roll = _rng.random()
+        if roll < behavior.hang_rate:
+            behavior.metrics["hangs"] += 1
+            await asyncio.sleep(MOCK_HANG_SECONDS)
+        await asyncio.sleep(behavior.latency.sample(_rng))
+        if roll >= 1.0 - behavior.error_rate:
+            behavior.metrics["errors"] += 1
+            return JSONResponse(status_code=behavior.error_status, content={"error": f"Injected {name} failure"})
+    finally:
+        behavior.metrics["in_flight"] -= 1
+
+    if behavior.bandwidth > 0:
+        return StreamingResponse(
+            _trickle(body, behavior.bandwidth, behavior),
+            media_type="application/json",
+            headers={"Content-Length": str(len(body))}
+        )
+    behavior.metrics["bytes_sent"] += len(body)
+    return Response(content=body, media_type="application/json")
+
+
+@app.post("/airia/lesson")
+async def airia_lesson(request: Request):
+    return await _serve(request, "airia_lesson", lesson_body(sizes["lesson_segments"], sizes["lesson_audio_bytes"]))
+
+
+@app.post("/airia/quiz")
+async def airia_quiz(request: Request):
+    return await _serve(request, "airia_quiz", quiz_body(sizes["quiz_questions"]))
+
+
+@app.post("/fastino/register")
+async def fastino_register(request: Request):
+    return await _serve(request, "fastino_register", static_body("fastino_register.json"))
+
+
+@app.post("/fastino/ingest")
+async def fastino_ingest(request: Request):
+    return await _serve(request, "fastino_ingest", static_body("fastino_ingest.json"))
+
+
+@app.post("/fastino/query")
+async def fastino_query(request: Request):
+    return await _serve(request, "fastino_query", query_body(sizes["query_answer_bytes"]))
+
+
+@app.get("/_mock/config")
+async def get_config():
+    """Current per-endpoint behavior and response sizes"""
+    return {"endpoints": {name: b.config() for name, b in behaviors.items()}, "sizes": sizes}
+
+
+@app.post("/_mock/config")
+async def update_config(changes: dict):
+    """
+    Change behavior at runtime, e.g. {"endpoints": {"fastino_query": {"error_rate": 1}}, "sizes": {"lesson_segments": 50}}
+    """
+    # Validate everything first, so a bad value leaves the whole config unchanged
+    try:
+        endpoint_updates = {}
+        for name, endpoint_changes in changes.get("endpoints", {}).items():
+            if name not in behaviors:
+                raise ValueError(f"Unknown endpoint {name!r}")
+            endpoint_updates[name] = behaviors[name].parse(endpoint_changes)
+        size_updates = {}
+        for key, value in changes.get("sizes", {}).items():
+            if key not in sizes:
+                raise ValueError(f"Unknown size {key!r}")
+            size_updates[key] = int(value)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid config change: {e}"})
+    for name, parsed in endpoint_updates.items():
+        behaviors[name].update(parsed)
+    sizes.update(size_updates)
+    logger.info(f"🎛️  Mock config updated: {json.dumps(changes)}")
+    return await get_config()
+
+
+@app.get("/_mock/stats")
+async def get_stats():
+    """Per-endpoint request, error and byte counters"""
+    return {name: b.metrics for name, b in behaviors.items()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    logger.info(f"🧪 Mock upstreams on http://{MOCK_HOST}:{MOCK_PORT}")
+    logger.info(f"   AIRIA_API_URL=http://{MOCK_HOST}:{MOCK_PORT}/airia/lesson")
+    logger.info(f"   AIRIA_QUIZ_API_URL=http://{MOCK_HOST}:{MOCK_PORT}/airia/quiz")
+    logger.info(f"   FASTINO_API_URL=http://{MOCK_HOST}:{MOCK_PORT}/fastino")
+    for name, behavior in behaviors.items():
+        logger.info(f"   {name}: {behavior.config()}")
+    uvicorn.run(app, host=MOCK_HOST, port=MOCK_PORT)
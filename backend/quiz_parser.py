@@ -0,0 +1,96 @@
+"""
+Quiz Result Parsing
+Extracts the quiz JSON from the Airia quiz pipeline result (a JSON string wrapped
+in a markdown code block) and converts its questions to the frontend format
+"""
+
+import re
+import json
+import logging
+from typing import Any, List
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# ```json ... ``` block around the quiz JSON
+_JSON_BLOCK_RE = re.compile(r'```json\s*\n(.*?)\n```', re.DOTALL)
+
+
+class QuizParseError(ValueError):
+    """Raised when the quiz result cannot be turned into questions"""
+
+
+def extract_quiz_json(result_value: Any) -> str:
+    """Get the quiz JSON text out of the result (markdown-wrapped string, plain string or object)"""
+    if not isinstance(result_value, str):
+        # Result might already be a dict
+        return json.dumps(result_value)
+
+    logger.info("🔍 Result is a string, extracting JSON from markdown code blocks...")
+    json_match = _JSON_BLOCK_RE.search(result_value)
+    if json_match:
+        logger.info("✅ Extracted JSON from markdown code blocks")
+        return json_match.group(1).strip()
+    # Try without markdown wrapper - might be plain JSON string
+    logger.info("⚠️  No markdown code blocks found, using result as-is")
+    return result_value.strip()
+
+
+def parse_quiz_result(result_value: Any) -> list:
+    """
+    Parse the quiz result into its list of raw questions
+
+    Raises:
+        QuizParseError: If the JSON is invalid or has no "quiz" array
+    """
+    quiz_json_str = extract_quiz_json(result_value)
+    try:
+        quiz_data = json.loads(quiz_json_str)
+        logger.info("✅ Successfully parsed quiz JSON")
+        logger.info(f"📋 Quiz data keys: {list(quiz_data.keys()) if isinstance(quiz_data, dict) else 'N/A'}")
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Failed to parse quiz JSON: {e}")
+        logger.error(f"   First 500 chars: {quiz_json_str[:500] if quiz_json_str else 'None'}")
+        raise QuizParseError(f"Failed to parse quiz JSON: {str(e)}")
+
+    quiz_array = quiz_data.get("quiz") if isinstance(quiz_data, dict) else None
+    if not quiz_array or not isinstance(quiz_array, list):
+        logger.error(f"❌ No 'quiz' array found in parsed data. Keys: {list(quiz_data.keys()) if isinstance(quiz_data, dict) else 'N/A'}")
+        raise QuizParseError("No 'quiz' array found in response")
+
+    logger.info(f"✅ Found {len(quiz_array)} questions in quiz")
+    return quiz_array
+
+
+def format_quiz_questions(quiz_array: list) -> List[dict]:
+    """Convert quiz questions to the frontend format (correct answer as an option index)"""
+    formatted_questions = []
+    for idx, question_data in enumerate(quiz_array):
+        question_text = question_data.get("question", "")
+        options = question_data.get("options", [])
+        correct_answer_text = question_data.get("correct_answer", "")
+
+        # Find the index of correct answer in options
+        correct_answer_index = -1
+        try:
+            correct_answer_index = options.index(correct_answer_text)
+        except ValueError:
+            logger.warning(f"⚠️  Question {idx + 1}: Correct answer '{correct_answer_text}' not found in options")
+            # Try case-insensitive match
+            wanted = correct_answer_text.lower().strip()
+            for i, opt in enumerate(options):
+                if opt.lower().strip() == wanted:
+                    correct_answer_index = i
+                    break
+
+        if correct_answer_index == -1:
+            logger.error(f"❌ Question {idx + 1}: Could not find correct answer index")
+            continue
+
+        formatted_questions.append({
+            "id": idx + 1,
+            "question": question_text,
+            "options": options,
+            "correctAnswer": correct_answer_index
+        })
+    return formatted_questions
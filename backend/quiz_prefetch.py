@@ -0,0 +1,164 @@
+"""
+Speculative Quiz Pre-generation
+When enabled, a lesson request also starts the quiz pipeline for the same prompt, so
+the /generateQuiz call that follows the lesson is served from a short-lived store
+instead of waiting for a second serial Airia run
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from lesson_cache import normalize_prompt
+from stages import spawn_background
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Quiz prefetch configuration (opt-in)
+QUIZ_PREFETCH_ENABLED = os.getenv("QUIZ_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+QUIZ_PREFETCH_TTL = float(os.getenv("QUIZ_PREFETCH_TTL", "900"))  # seconds an unclaimed quiz is kept
+QUIZ_PREFETCH_MAX_JOBS = int(os.getenv("QUIZ_PREFETCH_MAX_JOBS", "4"))  # speculative runs in flight at once
+QUIZ_PREFETCH_MAX_ENTRIES = int(os.getenv("QUIZ_PREFETCH_MAX_ENTRIES", "500"))
+
+
+class QuizPrefetcher:
+    """
+    Short-lived store of speculative quiz runs keyed by (user_id, normalized prompt)
+
+    At most max_jobs runs are in flight; further prefetches are skipped rather than
+    queued, since the quiz can always be generated on demand. Each quiz is handed
+    out once. Runs that are cancelled, evicted or left unclaimed past the TTL are
+    cancelled so they stop holding upstream capacity.
+    """
+
+    def __init__(self, ttl: float, max_jobs: int, max_entries: int, enabled: bool = False):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, asyncio.Task]]" = OrderedDict()
+        self.metrics: Dict[str, int] = {
+            "started": 0,
+            "skipped_capacity": 0,
+            "hits": 0,
+            "hits_waited": 0,
+            "misses": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "expired": 0,
+        }
+
+    @staticmethod
+    def make_key(user_id: Optional[str], user_input: str) -> str:
+        return f"{user_id or ''}\n{normalize_prompt(user_input)}"
+
+    def _running(self) -> int:
+        return sum(1 for _, task in self._entries.values() if not task.done())
+
+    def _drop(self, key: str) -> None:
+        _, task = self._entries.pop(key)
+        if not task.done():
+            task.cancel()
+
+    def _prune(self) -> None:
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            self._drop(key)
+            self.metrics["expired"] += 1
+
+    def start(self, user_id: Optional[str], user_input: str, factory: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Start a speculative quiz run unless one is already stored for the prompt
+
+        Args:
+            user_id: Fastino user ID the quiz is personalized for, if any
+            user_input: Lesson prompt the quiz is generated for
+            factory: Zero-argument callable returning the quiz-generating coroutine
+
+        Returns:
+            True if a run was started
+        """
+        self._prune()
+        key = self.make_key(user_id, user_input)
+        if key in self._entries:
+            return False
+        if self._running() >= self.max_jobs:
+            self.metrics["skipped_capacity"] += 1
+            logger.info(f"ℹ️  Skipping quiz prefetch, {self.max_jobs} speculative runs already in flight")
+            return False
+
+        task = spawn_background(factory(), name=f"quiz_prefetch:{user_id or 'anonymous'}")
+        self._entries[key] = (time.time() + self.ttl, task)
+        self.metrics["started"] += 1
+        logger.info(f"🔮 Started speculative quiz generation for user {user_id or 'anonymous'}")
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+        return True
+
+    def cancel(self, user_id: Optional[str], user_input: str) -> None:
+        """Drop the speculative run for a prompt, cancelling it if it is still running"""
+        key = self.make_key(user_id, user_input)
+        if key in self._entries:
+            self._drop(key)
+            self.metrics["cancelled"] += 1
+            logger.info(f"🛑 Cancelled speculative quiz generation for user {user_id or 'anonymous'}")
+
+    async def take(self, user_id: Optional[str], user_input: str) -> Optional[Any]:
+        """
+        Claim the speculative quiz for a prompt, waiting for it if it is still running
+
+        Returns:
+            The quiz, or None if there is none or the speculative run failed
+        """
+        self._prune()
+        key = self.make_key(user_id, user_input)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.metrics["misses"] += 1
+            return None
+
+        expires_at, task = entry
+        waited = not task.done()
+        try:
+            quiz = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # The caller went away; leave the run for the next request
+                self._entries[key] = entry
+                raise
+            self.metrics["failed"] += 1
+            return None
+        except Exception:
+            # Already logged by the background task; generate on demand instead
+            self.metrics["failed"] += 1
+            return None
+
+        self.metrics["hits_waited" if waited else "hits"] += 1
+        return quiz
+
+    async def close(self) -> None:
+        """Cancel every speculative run still in flight (called on shutdown)"""
+        tasks = [task for _, task in self._entries.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        self._entries.clear()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """Prefetch counters plus current store occupancy"""
+        return {**self.metrics, "stored": len(self._entries), "running": self._running()}
+
+
+quiz_prefetcher = QuizPrefetcher(
+    ttl=QUIZ_PREFETCH_TTL,
+    max_jobs=QUIZ_PREFETCH_MAX_JOBS,
+    max_entries=QUIZ_PREFETCH_MAX_ENTRIES,
+    enabled=QUIZ_PREFETCH_ENABLED,
+)
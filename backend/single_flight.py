@@ -0,0 +1,67 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight execution
+instead of each issuing their own upstream call
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from stages import spawn_background
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent executions by key
+
+    The shared execution runs in its own task and every caller awaits it through
+    asyncio.shield, so a caller that disconnects (and is cancelled) never cancels
+    the execution the other callers are waiting on. The task is a tracked
+    background task, so shutdown drains it before the HTTP clients are closed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.metrics: Dict[str, int] = {"executions": 0, "coalesced": 0}
+
+    def _on_done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run factory() once for all concurrent callers with the same key
+
+        Args:
+            key: Deduplication key
+            factory: Zero-argument callable returning the coroutine to execute
+
+        Returns:
+            Tuple of (result, shared) where shared is True if this caller joined
+            an execution started by another caller
+
+        Raises:
+            Whatever the shared execution raised
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.metrics["coalesced"] += 1
+            logger.info(f"🔗 Joining in-flight {self.name} execution for key {key[:12]}")
+        else:
+            self.metrics["executions"] += 1
+            task = spawn_background(factory(), name=f"{self.name}:{key[:12]}")
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        """Execution/coalescing counters and the number of executions in flight"""
+        return {**self.metrics, "inflight": len(self._inflight)}
@@ -0,0 +1,97 @@
+"""
+Request Stage Helpers
+Per-stage timing for request handlers and fire-and-forget background tasks
+that run off the request's critical path
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Optional, Set
+from metrics import stage_duration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Strong references to in-flight background tasks (asyncio only keeps weak ones)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+class StageTimer:
+    """
+    Records how long each stage of a request took and renders the breakdown
+    as a Server-Timing header value
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, name: str, started_at: float) -> None:
+        """Record a stage that began at started_at (a time.perf_counter() value)"""
+        elapsed = time.perf_counter() - started_at
+        self.stages[name] = elapsed * 1000
+        stage_duration.observe(elapsed, name)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as a named stage"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started_at)
+
+    async def track(self, name: str, awaitable: Awaitable):
+        """Await a coroutine and record its duration as a named stage"""
+        with self.stage(name):
+            return await awaitable
+
+    def header(self) -> str:
+        """Server-Timing header value for every stage recorded so far, plus the total"""
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def _on_background_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.warning(f"⚠️  Background task {task.get_name()} failed: {type(exc).__name__}: {exc}")
+
+
+def spawn_background(coro: Awaitable, name: Optional[str] = None) -> asyncio.Task:
+    """
+    Run a coroutine off the critical path of the current request
+
+    Args:
+        coro: Coroutine to run
+        name: Optional task name used in log messages
+
+    Returns:
+        The scheduled asyncio.Task
+    """
+    task = asyncio.ensure_future(coro)
+    if name:
+        task.set_name(name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+
+async def drain_background(timeout: float = 10.0) -> None:
+    """Wait for outstanding background tasks (called from the app lifespan on shutdown)"""
+    if not _background_tasks:
+        return
+    logger.info(f"⏳ Waiting for {len(_background_tasks)} background task(s) to finish")
+    done, pending = await asyncio.wait(list(_background_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        # Let the cancelled tasks unwind before the clients they use are closed
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(f"⚠️  Cancelled {len(pending)} background task(s) still running at shutdown")
@@ -0,0 +1,181 @@
+"""
+Tests for the fair admission limiter: scheduling order, rejections, timeouts and cancellation
+"""
+
+import os
+import asyncio
+
+import pytest
+
+# main is imported for the HTTP mapping; keep its ingest buffer away from the development outbox file
+os.environ.setdefault("FASTINO_OUTBOX_PATH", ":memory:")
+
+from admission import AdmissionLimiter, AdmissionRejected, USER_POLICY
+
+
+async def settle():
+    """Let every runnable task reach its next wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_light_user_is_not_starved_by_a_heavy_user():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=100, max_wait=5.0, fair=True)
+        order = []
+
+        async def request(user_id):
+            async with limiter.slot(user_id):
+                order.append(user_id)
+                await asyncio.sleep(0)
+
+        await limiter.acquire("blocker")
+        heavy = [asyncio.ensure_future(request("heavy")) for _ in range(USER_POLICY.max_queued)]
+        await settle()
+        light = [asyncio.ensure_future(request("light")) for _ in range(2)]
+        await settle()
+        assert limiter.waiting == USER_POLICY.max_queued + 2
+        limiter.release("blocker")
+        await asyncio.gather(*heavy, *light)
+        return limiter, order
+
+    limiter, order = asyncio.run(run())
+    # The light user's requests are interleaved with the heavy backlog, not served after it
+    assert order[:4] == ["heavy", "light", "heavy", "light"]
+    assert order.count("heavy") == USER_POLICY.max_queued
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+
+def test_weighted_flow_gets_a_larger_share():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=100, max_wait=5.0, fair=True)
+        order = []
+
+        async def request(user_id):
+            async with limiter.slot(user_id):
+                order.append(user_id or "anonymous")
+                await asyncio.sleep(0)
+
+        await limiter.acquire("blocker")
+        # Anonymous requests share one flow, weighted 2 by default
+        tasks = [asyncio.ensure_future(request(None)) for _ in range(4)]
+        tasks += [asyncio.ensure_future(request("user")) for _ in range(2)]
+        await settle()
+        limiter.release("blocker")
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(run())
+    assert order == ["anonymous", "anonymous", "user", "anonymous", "anonymous", "user"]
+
+
+def test_per_user_queue_limit_rejects_with_429():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=100, max_wait=5.0, fair=True)
+        await limiter.acquire("blocker")
+        waiters = [asyncio.ensure_future(limiter.acquire("alice")) for _ in range(USER_POLICY.max_queued)]
+        await settle()
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await limiter.acquire("alice")
+        # Other users can still queue
+        other = asyncio.ensure_future(limiter.acquire("bob"))
+        await settle()
+        assert limiter.waiting == USER_POLICY.max_queued + 1
+        for task in waiters + [other]:
+            task.cancel()
+        await asyncio.gather(*waiters, other, return_exceptions=True)
+        return limiter, excinfo.value
+
+    limiter, error = asyncio.run(run())
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert limiter.metrics["rejected_user_limit"] == 1
+    assert limiter.waiting == 0
+
+
+def test_full_shared_queue_rejects_with_503_and_retry_after():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=2, max_wait=5.0, fair=True)
+        # One earlier slot held for 4s sets the Retry-After estimate
+        await limiter.acquire("alice")
+        limiter.release("alice", held=4.0)
+
+        await limiter.acquire("blocker")
+        waiters = [asyncio.ensure_future(limiter.acquire(user_id)) for user_id in ("alice", "bob")]
+        await settle()
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await limiter.acquire("carol")
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return limiter, excinfo.value
+
+    limiter, error = asyncio.run(run())
+    assert error.status_code == 503
+    # 4s per slot, two waiting ahead plus this request, one slot
+    assert error.retry_after == 12
+    assert "12s" in error.message
+    assert limiter.metrics["rejected_queue_full"] == 1
+
+
+def test_wait_times_out_with_503():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=10, max_wait=0.05, fair=True)
+        await limiter.acquire("blocker")
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await limiter.acquire("alice")
+        return limiter, excinfo.value
+
+    limiter, error = asyncio.run(run())
+    assert error.status_code == 503
+    assert limiter.metrics["rejected_timeout"] == 1
+    assert limiter.waiting == 0 and limiter.in_flight == 1
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=10, max_wait=5.0, fair=True)
+        await limiter.acquire("blocker")
+        first = asyncio.ensure_future(limiter.acquire("alice"))
+        second = asyncio.ensure_future(limiter.acquire("bob"))
+        await settle()
+        first.cancel()
+        await settle()
+        assert limiter.waiting == 1
+        limiter.release("blocker")
+        await second
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.in_flight == 1
+    assert limiter.stats()["active_flows"] == 1
+
+
+def test_waiter_cancelled_after_being_handed_a_slot_passes_it_on():
+    async def run():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_waiting=10, max_wait=5.0, fair=True)
+        await limiter.acquire("blocker")
+        first = asyncio.ensure_future(limiter.acquire("alice"))
+        second = asyncio.ensure_future(limiter.acquire("bob"))
+        await settle()
+        # The slot goes to alice, who disconnects before resuming
+        limiter.release("blocker")
+        first.cancel()
+        await settle()
+        assert first.cancelled()
+        await second
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.in_flight == 1
+    assert limiter.waiting == 0
+    assert limiter.stats()["active_flows"] == 1
+
+
+def test_rejection_is_sent_with_retry_after_header():
+    from main import _admission_rejected_response
+
+    for status_code in (429, 503):
+        response = _admission_rejected_response(AdmissionRejected("test", status_code, 7, "Server is busy"))
+        assert response.status_code == status_code
+        assert response.headers["Retry-After"] == "7"
@@ -272,6 +272,28 @@ def test_audio_decoding():
     logger.info(f"✅ Audio decoding test complete!")
 
 
+
+def test_assemble_matches_combine():
+    """assemble_audio_base64/assemble_audio_bytes give the same audio as combine_audio_base64"""
+    from audio_assembly import assemble_audio_base64, assemble_audio_bytes
+    
+    raw = bytes(range(256)) * 40
+    cases = {
+        "single string": base64.b64encode(raw).decode(),
+        "aligned chunks": [base64.b64encode(raw[i:i + 999]).decode() for i in range(0, len(raw), 999)],
+        "unaligned chunks": [base64.b64encode(raw[i:i + 1000]).decode() for i in range(0, len(raw), 1000)],
+        "padded chunk in the middle": [base64.b64encode(raw[:1]).decode(), base64.b64encode(raw[1:3]).decode(), base64.b64encode(raw[3:]).decode()],
+        "line-wrapped chunks": [base64.encodebytes(raw[:3000]).decode(), base64.encodebytes(raw[3000:]).decode()],
+        "empty chunks": ["", base64.b64encode(raw[:300]).decode(), "", base64.b64encode(raw[300:]).decode(), ""],
+        "no chunks": [],
+        "empty string": "",
+    }
+    for name, chunks in cases.items():
+        expected = combine_audio_base64(chunks)
+        assert base64.b64decode(assemble_audio_base64(chunks)) == base64.b64decode(expected), name
+        assert assemble_audio_bytes(chunks) == base64.b64decode(expected), name
+
+
 if __name__ == "__main__":
     logger.info("Starting audio decoding test...")
     test_audio_decoding()
@@ -0,0 +1,159 @@
+"""
+Tests for the upstream circuit breaker: state transitions, rejections and adaptive timeouts
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN,
+    UPSTREAM_TIMEOUT_MIN_SAMPLES, UPSTREAM_TIMEOUT_MULTIPLIER,
+)
+
+
+async def succeed(breaker, latency=None, operation="query", ceiling=100.0, floor=1.0):
+    async with breaker.call(operation, ceiling, floor) as call:
+        call.check(httpx.Response(200))
+        if latency is not None:
+            call.latency = latency
+    return call
+
+
+async def fail(breaker, kind="status"):
+    """One failed call: a 5xx response or a connection error"""
+    try:
+        async with breaker.call("query", 100.0) as call:
+            if kind == "status":
+                call.check(httpx.Response(503))
+            else:
+                raise httpx.ConnectError("refused")
+    except httpx.ConnectError:
+        pass
+
+
+def end_open_period(breaker):
+    breaker.opened_at -= breaker.open_seconds
+
+
+def test_consecutive_failures_open_the_circuit():
+    async def run():
+        breaker = CircuitBreaker("upstream", failure_threshold=3, open_seconds=30)
+        await fail(breaker)
+        await fail(breaker, "connect")
+        await succeed(breaker)  # resets the streak
+        assert breaker.consecutive_failures == 0
+        for kind in ("status", "connect", "status"):
+            assert breaker.state == CLOSED
+            await fail(breaker, kind)
+        assert breaker.state == OPEN
+        assert not breaker.available()
+
+        with pytest.raises(CircuitOpenError) as excinfo:
+            await succeed(breaker)
+        assert 0 < excinfo.value.retry_after <= 30
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.metrics == {"successes": 1, "failures": 5, "rejected": 1, "opened": 1}
+
+
+def test_half_open_probe_closes_the_circuit():
+    async def run():
+        breaker = CircuitBreaker("upstream", failure_threshold=1, open_seconds=30)
+        await fail(breaker)
+        end_open_period(breaker)
+        assert breaker.available()
+
+        probe_started = asyncio.Event()
+        release_probe = asyncio.Event()
+
+        async def probe():
+            async with breaker.call("query", 100.0) as call:
+                probe_started.set()
+                await release_probe.wait()
+                call.check(httpx.Response(200))
+            return call
+
+        probe_task = asyncio.ensure_future(probe())
+        await probe_started.wait()
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            await succeed(breaker)
+        release_probe.set()
+        call = await probe_task
+        assert call.probe
+        assert breaker.state == CLOSED
+        assert not (await succeed(breaker)).probe
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.metrics["rejected"] == 1
+    assert breaker.metrics["opened"] == 1
+
+
+def test_failed_probe_reopens_the_circuit():
+    async def run():
+        breaker = CircuitBreaker("upstream", failure_threshold=2, open_seconds=30)
+        await fail(breaker)
+        await fail(breaker)
+        end_open_period(breaker)
+        await fail(breaker, "connect")
+        assert breaker.state == OPEN
+        assert breaker.retry_after() > 29
+        with pytest.raises(CircuitOpenError):
+            await succeed(breaker)
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.metrics["opened"] == 2
+    assert breaker.metrics["rejected"] == 1
+
+
+def test_errors_after_a_response_do_not_count_as_failures():
+    async def run():
+        breaker = CircuitBreaker("upstream", failure_threshold=1, open_seconds=30)
+        with pytest.raises(ValueError):
+            async with breaker.call("query", 100.0) as call:
+                call.check(httpx.Response(200))
+                raise ValueError("bad body")
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.state == CLOSED
+    assert breaker.metrics["failures"] == 0
+
+
+def test_timeout_adapts_to_p99_latency_within_floor_and_ceiling():
+    async def run():
+        breaker = CircuitBreaker("upstream", failure_threshold=5, open_seconds=30)
+        # The ceiling until enough samples exist
+        for _ in range(UPSTREAM_TIMEOUT_MIN_SAMPLES - 1):
+            await succeed(breaker, latency=2.0)
+        assert breaker.timeout("query", ceiling=100.0, floor=1.0) == 100.0
+
+        await succeed(breaker, latency=2.0)
+        assert breaker.timeout("query", ceiling=100.0, floor=1.0) == pytest.approx(2.0 * UPSTREAM_TIMEOUT_MULTIPLIER)
+        # Clamped to the floor and the ceiling
+        assert breaker.timeout("query", ceiling=100.0, floor=10.0) == 10.0
+        assert breaker.timeout("query", ceiling=4.0, floor=1.0) == 4.0
+        # Latencies are tracked per operation
+        assert breaker.timeout("ingest", ceiling=100.0, floor=1.0) == 100.0
+
+        # The slowest 1% sets the timeout
+        for _ in range(200):
+            await succeed(breaker, latency=1.0)
+        await succeed(breaker, latency=20.0)
+        assert breaker.timeout("query", ceiling=100.0, floor=1.0) == pytest.approx(3.0)
+        for _ in range(2):
+            await succeed(breaker, latency=20.0)
+        assert breaker.timeout("query", ceiling=100.0, floor=1.0) == pytest.approx(20.0 * UPSTREAM_TIMEOUT_MULTIPLIER)
+
+        call = await succeed(breaker)
+        assert call.timeout == pytest.approx(60.0)
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.stats()["operations"]["query"]["timeout_s"] == 60.0
@@ -0,0 +1,125 @@
+"""
+Tests for the Fastino context cache and its invalidation by ingested documents
+"""
+
+import os
+import asyncio
+
+# Keep the module-level ingest buffer away from the development outbox file
+os.environ.setdefault("FASTINO_OUTBOX_PATH", ":memory:")
+
+from context_cache import ContextCache
+from fastino_client import build_lesson_document, build_quiz_document
+from ingest_outbox import IngestOutbox
+from ingest_queue import IngestBuffer
+
+TEMPLATE = "What is the knowledge level of the user for the topic {topic}"
+
+
+class FakeFastino:
+    """Counts context queries; each one takes `delay` seconds"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = 0
+
+    def fetcher(self, topic):
+        async def fetch():
+            self.queries += 1
+            await asyncio.sleep(self.delay)
+            return f"answer {self.queries} for {topic}"
+        return fetch
+
+
+def make_cache():
+    return ContextCache(ttl=600, stale_ttl=3600, max_entries=100)
+
+
+def test_repeat_visit_skips_fastino():
+    """A lesson ingests its own prompt while it fetches the context for it, as /generateLesson does"""
+    async def run():
+        cache = make_cache()
+        fastino = FakeFastino(delay=0.1)
+
+        async def send(user_id, documents):
+            return True
+
+        buffer = IngestBuffer(
+            send=send, outbox=IngestOutbox(":memory:"), batch_size=20, max_age=0.01, max_pending=100,
+            enqueue_timeout=1.0, retry_base=1.0, retry_max=1.0, max_attempts=0,
+            on_ingested=cache.invalidate_user,
+        )
+        buffer.start()
+
+        async def visit(topic):
+            ingest = asyncio.ensure_future(buffer.enqueue("alice", build_lesson_document(topic)))
+            answer = await cache.get("alice", TEMPLATE, topic, fastino.fetcher(topic))
+            await ingest
+            # Let the batch go out (and invalidate) before the next visit
+            await asyncio.sleep(0.1)
+            return answer
+
+        first = await visit("How are clouds formed?")
+        second = await visit("how are clouds formed")
+        await buffer.close()
+        return cache, fastino, buffer, first, second
+
+    cache, fastino, buffer, first, second = asyncio.run(run())
+    assert buffer.metrics["documents_sent"] == 2
+    assert fastino.queries == 1
+    assert second == first
+    assert cache.metrics["hits"] == 1
+    assert cache.metrics["stale_hits"] == 0
+
+
+def test_new_quiz_results_mark_answers_stale():
+    async def run():
+        cache = make_cache()
+        fastino = FakeFastino()
+        await cache.get("alice", TEMPLATE, "clouds", fastino.fetcher("clouds"))
+        cache.invalidate_user("alice", [build_quiz_document("clouds", "q", "a", "b", "wrong")])
+        stale = await cache.get("alice", TEMPLATE, "clouds", fastino.fetcher("clouds"))
+        # The refresh runs in the background
+        await asyncio.sleep(0.01)
+        fresh = await cache.get("alice", TEMPLATE, "clouds", fastino.fetcher("clouds"))
+        return cache, fastino, stale, fresh
+
+    cache, fastino, stale, fresh = asyncio.run(run())
+    assert stale == "answer 1 for clouds"
+    assert fresh == "answer 2 for clouds"
+    assert fastino.queries == 2
+    assert cache.metrics["stale_hits"] == 1 and cache.metrics["hits"] == 1
+
+
+def test_lesson_prompt_marks_other_topics_stale():
+    async def run():
+        cache = make_cache()
+        fastino = FakeFastino()
+        for topic in ("clouds", "rain"):
+            await cache.get("alice", TEMPLATE, topic, fastino.fetcher(topic))
+        await cache.get("bob", TEMPLATE, "clouds", fastino.fetcher("clouds"))
+        cache.invalidate_user("alice", [build_lesson_document("Clouds")])
+        for user_id, topic in (("alice", "clouds"), ("alice", "rain"), ("bob", "clouds")):
+            await cache.get(user_id, TEMPLATE, topic, fastino.fetcher(topic))
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.metrics["hits"] == 2
+    assert cache.metrics["stale_hits"] == 1
+
+
+def test_answer_fetched_during_invalidation_is_stored_stale():
+    async def run():
+        cache = make_cache()
+        fastino = FakeFastino(delay=0.05)
+        fetch = asyncio.ensure_future(cache.get("alice", TEMPLATE, "clouds", fastino.fetcher("clouds")))
+        await asyncio.sleep(0.01)
+        cache.invalidate_user("alice", [build_lesson_document("rain")])
+        await fetch
+        await cache.get("alice", TEMPLATE, "clouds", fastino.fetcher("clouds"))
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.metrics["stale_hits"] == 1
+    # Nothing is left behind for finished fetches
+    assert cache._fetching == {}
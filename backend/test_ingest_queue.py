@@ -0,0 +1,138 @@
+"""
+Tests for the Fastino ingestion buffer and its SQLite outbox
+Covers replay after a restart, retry with backoff and rows that exhaust their attempts
+"""
+
+import os
+import asyncio
+
+import pytest
+
+# Keep the module-level buffer away from the development outbox file
+os.environ.setdefault("FASTINO_OUTBOX_PATH", ":memory:")
+
+from ingest_outbox import IngestOutbox
+from ingest_queue import IngestBuffer, IngestQueueFull
+
+
+class RecordingSender:
+    """Fake /ingest call that fails a given number of times before succeeding"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, user_id, documents):
+        self.calls.append((user_id, [doc["n"] for doc in documents]))
+        if self.failures:
+            self.failures -= 1
+            return False
+        return True
+
+
+def make_buffer(send, outbox, **overrides):
+    settings = dict(
+        batch_size=10, max_age=0.01, max_pending=100, enqueue_timeout=0.1,
+        retry_base=0.02, retry_max=0.05, max_attempts=0,
+    )
+    settings.update(overrides)
+    return IngestBuffer(send=send, outbox=outbox, **settings)
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_pending_documents_are_replayed_after_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+
+    async def first_run():
+        # Fastino is down for the whole first run
+        buffer = make_buffer(RecordingSender(failures=1000), IngestOutbox(path))
+        buffer.start()
+        for n in range(3):
+            await buffer.enqueue("alice", {"n": n})
+        await buffer.enqueue("bob", {"n": 10})
+        await wait_until(lambda: buffer.metrics["documents_failed"] >= 4)
+        await buffer.close()
+
+    async def second_run():
+        outbox = IngestOutbox(path)
+        assert outbox.pending == 4
+        send = RecordingSender()
+        buffer = make_buffer(send, outbox)
+        buffer.start()
+        await wait_until(lambda: outbox.pending == 0)
+        await buffer.close()
+        return send.calls
+
+    asyncio.run(first_run())
+    calls = asyncio.run(second_run())
+    assert sorted(calls) == [("alice", [0, 1, 2]), ("bob", [10])]
+    assert IngestOutbox(path).pending == 0
+
+
+def test_failed_batches_are_retried_with_backoff():
+    async def run():
+        outbox = IngestOutbox(":memory:")
+        send = RecordingSender(failures=2)
+        buffer = make_buffer(send, outbox)
+        buffer.start()
+        await buffer.enqueue("alice", {"n": 1})
+        await buffer.enqueue("alice", {"n": 2})
+        await wait_until(lambda: outbox.pending == 0)
+        await buffer.close()
+        return buffer, send.calls
+
+    buffer, calls = asyncio.run(run())
+    # The same batch, in order, until it goes through
+    assert calls[-1] == ("alice", [1, 2])
+    assert len(calls) == 3 and all(call == calls[-1] for call in calls)
+    assert buffer.metrics["retries"] == 4
+    assert buffer.metrics["documents_sent"] == 2
+    assert buffer.metrics["dead"] == 0
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    buffer = make_buffer(RecordingSender(), IngestOutbox(":memory:"), retry_base=1.0, retry_max=10.0)
+    for attempts, full_delay in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (5, 10.0), (20, 10.0)]:
+        for _ in range(20):
+            assert full_delay * 0.5 <= buffer._backoff(attempts) <= full_delay
+
+
+def test_rows_that_exhaust_their_attempts_are_marked_dead():
+    async def run():
+        outbox = IngestOutbox(":memory:")
+        send = RecordingSender(failures=1000)
+        buffer = make_buffer(send, outbox, max_attempts=2)
+        buffer.start()
+        await buffer.enqueue("alice", {"n": 1})
+        await wait_until(lambda: buffer.metrics["dead"] == 1)
+        # Dead rows are kept but never retried
+        await asyncio.sleep(0.1)
+        await buffer.close()
+        return outbox, buffer, send.calls
+
+    outbox, buffer, calls = asyncio.run(run())
+    assert calls == [("alice", [1]), ("alice", [1])]
+    assert outbox.pending == 0
+    assert outbox.dead_count() == 1
+    assert buffer.metrics["retries"] == 1
+
+
+def test_enqueue_gives_up_when_the_outbox_stays_full():
+    async def run():
+        outbox = IngestOutbox(":memory:")
+        buffer = make_buffer(RecordingSender(failures=1000), outbox, max_pending=2, retry_base=10, retry_max=10)
+        await asyncio.gather(*(buffer.enqueue("alice", {"n": n}) for n in range(2)))
+        with pytest.raises(IngestQueueFull):
+            await buffer.enqueue("alice", {"n": 3})
+        await buffer.close()
+        return outbox, buffer
+
+    outbox, buffer = asyncio.run(run())
+    assert outbox.pending == 2
+    assert buffer.metrics["rejected"] == 1
@@ -0,0 +1,284 @@
+"""
+Tests for the incremental Airia response parser and the lesson segment merger
+The parser is checked against json.loads, the merger against the merge rules of
+the original whole-response implementation (reference_merge below)
+"""
+
+import json
+import base64
+import random
+
+import pytest
+
+from lesson_stream_parser import StreamingJsonParser, StreamingJsonError, OutputParseError, AiriaResultStream
+from lesson_merge import LessonSegmentMerger, LessonMergeError, collect_parsed_outputs
+
+
+def feed_in_pieces(parser, text, rng, max_piece=7):
+    """Feed text split at random points"""
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, max_piece)
+        parser.feed(text[pos:pos + size])
+        pos += size
+    return parser.close()
+
+
+def random_value(rng, depth=0):
+    roll = rng.random()
+    if depth > 3 or roll < 0.3:
+        return rng.choice([
+            0, -12, 3.5, 1e10, -2.5e-3, True, False, None, "",
+            'héllo "q" \\ / \n\t \x01 😀', "abc" * rng.randint(0, 50),
+        ])
+    if roll < 0.65:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f'k{i}"é': random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+# ===== StreamingJsonParser =====
+
+def test_parser_matches_json_loads_for_any_split():
+    rng = random.Random(1)
+    for _ in range(2000):
+        value = random_value(rng)
+        text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 1]))
+        assert feed_in_pieces(StreamingJsonParser(), text, rng) == json.loads(text), text
+
+
+def test_parser_rejects_invalid_json():
+    rng = random.Random(2)
+    for text in ['{"a":1,}', "[1 2]", '{"a" 1}', '"abc', "[1,", "", "   ", "tru", '{"a":1} x',
+                 '"\\x"', "[01]", '{1: 2}', '"\\u12g4"', "[-]", "nul", '{"a":1', "]"]:
+        with pytest.raises(json.JSONDecodeError):
+            json.loads(text)
+        with pytest.raises(StreamingJsonError):
+            feed_in_pieces(StreamingJsonParser(), text, rng)
+
+
+def test_parser_decodes_unicode_escapes_split_anywhere():
+    texts = [
+        '"\\u00e9\\u4e2d\\u0041"',
+        '"\\ud83d\\ude00 smile"',  # surrogate pair
+        '["\\ud83d", "\\ude00"]',  # lone surrogates stay as they are
+        '"\\ud83d\\u0041"',  # high surrogate followed by a non-surrogate escape
+        '"\\ud83dx\\ude00"',
+        '{"\\u006bey": "\\/\\b\\f\\n\\r\\t\\"\\\\"}',
+    ]
+    for text in texts:
+        expected = json.loads(text)
+        for split in range(1, len(text)):
+            parser = StreamingJsonParser()
+            parser.feed(text[:split])
+            parser.feed(text[split:])
+            assert parser.close() == expected, (text, split)
+
+
+def test_parser_string_sink_and_dropped_values():
+    fed = []
+
+    class Sink:
+        def feed(self, text):
+            fed.append(text)
+
+        def close(self):
+            return "".join(fed).upper()
+
+    parser = StreamingJsonParser(
+        on_value=lambda path, value: path == ("drop",),
+        string_sink=lambda path: Sink() if path == ("big",) else None,
+    )
+    feed_in_pieces(parser, '{"big": "abcdef", "drop": [1, 2], "keep": "x"}', random.Random(3), max_piece=3)
+    assert parser.result == {"big": "ABCDEF", "keep": "x"}
+    assert len(fed) > 1
+
+
+# ===== Airia documents =====
+
+def b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def airia_document(audio_segments, content_segments, audio_first=False, output_as_string=(True, True), topic="Clouds"):
+    outputs = [{"segments": audio_segments}, {"topic": topic, "segments": content_segments}]
+    if not audio_first:
+        outputs.reverse()
+    result = []
+    for output, as_string in zip(outputs, output_as_string):
+        result.append({"stepType": "x", "output": json.dumps(output) if as_string else output})
+    return {"result": result}
+
+
+def audio_segment(segment_id, chunked=False, data=None):
+    data = data if data is not None else bytes([segment_id % 256]) * (100 + segment_id)
+    if chunked:
+        return {"segment_id": segment_id, "audio_base64": [b64(data[:40]), b64(data[40:70]), b64(data[70:])]}
+    return {"segment_id": segment_id, "audio_base64": b64(data)}
+
+
+def content_segment(segment_id, narration=None):
+    return {"segment_id": segment_id, "narration": narration or f"n{segment_id}", "image_url": f"http://img/{segment_id}", "duration": 5}
+
+
+def reference_merge(document: dict, user_input: str) -> dict:
+    """Merge rules of the original implementation, which parsed the whole response first"""
+    parsed = [output if isinstance(output, dict) else json.loads(output) for output in (r["output"] for r in document["result"][:2])]
+    segments = [p.get("segments", []) for p in parsed]
+    has_audio = [any(seg.get("audio_base64") for seg in segs[:5]) for segs in segments]
+    if not any(has_audio):
+        raise LessonMergeError("Invalid API response: neither result contains audio_base64")
+    audio_index = 0 if has_audio[0] else 1
+    content_index = 1 - audio_index
+
+    audio_map = {}
+    for seg in segments[audio_index]:
+        audio = seg.get("audio_base64")
+        if seg.get("segment_id") is None or not audio:
+            continue
+        if isinstance(audio, list):
+            audio = b64(b"".join(base64.b64decode(str(chunk)) for chunk in audio))
+        audio_map[seg["segment_id"]] = audio
+    content_map = {
+        seg["segment_id"]: seg for seg in segments[content_index] if seg.get("segment_id") is not None
+    }
+
+    merged = []
+    for segment_id in sorted(set(audio_map) | set(content_map)):
+        if segment_id in audio_map and segment_id in content_map:
+            content = content_map[segment_id]
+            merged.append({
+                "segment_id": segment_id,
+                "audioBase64": audio_map[segment_id],
+                "imageUrl": content.get("image_url"),
+                "narration": content.get("narration", ""),
+                "duration": content.get("duration"),
+            })
+    if not merged:
+        raise LessonMergeError("No valid segments could be created from API response")
+    topic = parsed[audio_index].get("topic") or parsed[content_index].get("topic") or user_input
+    return {"topic": topic, "segments": merged}
+
+
+def stream_merge(document: dict, user_input: str, rng: random.Random, max_piece=200):
+    """Run a document through AiriaResultStream and LessonSegmentMerger as the lesson pipeline does"""
+    streamed = []
+    merger = LessonSegmentMerger(on_merged=streamed.append)
+    result_stream = AiriaResultStream(merger.add)
+    data = feed_in_pieces(result_stream, json.dumps(document), rng, max_piece=max_piece)
+    parsed_results = collect_parsed_outputs(data, result_stream.segment_counts)
+    return merger.merge(parsed_results, user_input), streamed
+
+
+def assert_matches_reference(document, rng, user_input="clouds"):
+    lesson, streamed = stream_merge(document, user_input, rng)
+    assert lesson == reference_merge(document, user_input)
+    assert_streamed_matches(streamed, lesson)
+    return lesson, streamed
+
+
+def assert_streamed_matches(streamed, lesson):
+    """The last streamed version of every segment is the one in the final lesson"""
+    latest = {seg["segment_id"]: seg for seg in streamed}
+    final = {seg["segment_id"]: seg for seg in lesson["segments"]}
+    assert set(latest) <= set(final)
+    for segment_id, seg in latest.items():
+        assert seg == final[segment_id]
+
+
+# ===== LessonSegmentMerger =====
+
+def test_merge_audio_in_either_result_and_either_output_form():
+    rng = random.Random(4)
+    for audio_first in (False, True):
+        for output_as_string in ((True, True), (False, True), (True, False), (False, False)):
+            document = airia_document(
+                [audio_segment(i) for i in range(1, 6)],
+                [content_segment(i) for i in range(1, 6)],
+                audio_first=audio_first,
+                output_as_string=output_as_string,
+            )
+            lesson, streamed = assert_matches_reference(document, rng)
+            assert [seg["segment_id"] for seg in lesson["segments"]] == [1, 2, 3, 4, 5]
+            # Every segment was handed out while the response was still being parsed
+            assert [seg["segment_id"] for seg in streamed] == [1, 2, 3, 4, 5]
+
+
+def test_merge_combines_chunked_audio():
+    rng = random.Random(5)
+    data = bytes(range(256)) * 3
+    document = airia_document(
+        [audio_segment(1, chunked=True, data=data), audio_segment(2, chunked=True), audio_segment(3)],
+        [content_segment(i) for i in (1, 2, 3)],
+    )
+    lesson, _ = assert_matches_reference(document, rng)
+    assert base64.b64decode(lesson["segments"][0]["audioBase64"]) == data
+
+
+def test_merge_detects_audio_after_the_probe_window_like_the_original():
+    rng = random.Random(6)
+    # result[0] carries content for its first 5 segments and audio only later: it is not the audio result
+    mixed = [content_segment(i) for i in range(1, 6)] + [audio_segment(6)]
+    document = {"result": [
+        {"output": json.dumps({"segments": mixed})},
+        {"output": json.dumps({"segments": [audio_segment(i) for i in range(1, 7)]})},
+    ]}
+    assert_matches_reference(document, rng)
+
+
+def test_merge_duplicate_and_missing_segment_ids():
+    rng = random.Random(7)
+    audio = [audio_segment(1), audio_segment(2), {"segment_id": 2, "audio_base64": ""}, audio_segment(3),
+             {"audio_base64": b64(b"no id")}, audio_segment(5)]
+    content = [content_segment(1), content_segment(2), content_segment(2, narration="second"), content_segment(3),
+               content_segment(4), {"narration": "no id"}]
+    for audio_first in (False, True):
+        document = airia_document(audio, content, audio_first=audio_first)
+        lesson, streamed = assert_matches_reference(document, rng)
+        assert [seg["segment_id"] for seg in lesson["segments"]] == [1, 2, 3]
+        # Segment 2 is sent again once its duplicate replaces the narration
+        assert [seg["narration"] for seg in streamed if seg["segment_id"] == 2][-1] == "second"
+
+
+def test_merge_random_documents_match_reference():
+    rng = random.Random(8)
+    for _ in range(200):
+        ids = list(range(1, rng.randint(1, 9)))
+        audio = [audio_segment(i, chunked=rng.random() < 0.3) for i in ids if rng.random() < 0.9]
+        content = [content_segment(i) for i in ids if rng.random() < 0.9]
+        rng.shuffle(audio)
+        rng.shuffle(content)
+        if not audio or not content:
+            continue
+        document = airia_document(audio, content, audio_first=rng.random() < 0.5,
+                                  output_as_string=(rng.random() < 0.7, rng.random() < 0.7))
+        try:
+            expected = reference_merge(document, "clouds")
+        except LessonMergeError:
+            with pytest.raises(LessonMergeError):
+                stream_merge(document, "clouds", rng)
+            continue
+        lesson, streamed = stream_merge(document, "clouds", rng)
+        assert lesson == expected
+        assert_streamed_matches(streamed, lesson)
+
+
+def test_merge_rejects_responses_without_audio_or_segments():
+    rng = random.Random(9)
+    no_audio = airia_document([content_segment(1)], [content_segment(1)])
+    with pytest.raises(LessonMergeError, match="neither result contains audio_base64"):
+        stream_merge(no_audio, "clouds", rng)
+
+    empty = airia_document([], [content_segment(1)])
+    with pytest.raises(LessonMergeError, match="segments is empty"):
+        stream_merge(empty, "clouds", rng)
+
+    missing_output = {"result": [{"output": ""}, {"output": json.dumps({"segments": [audio_segment(1)]})}]}
+    with pytest.raises(LessonMergeError, match="Missing output in result\\[0\\]"):
+        stream_merge(missing_output, "clouds", rng)
+
+    with pytest.raises(LessonMergeError, match="missing or incomplete result array"):
+        stream_merge({"result": [{"output": "{}"}]}, "clouds", rng)
+
+    with pytest.raises(OutputParseError) as excinfo:
+        stream_merge({"result": [{"output": '{"segments": [1,'}, {"output": "{}"}]}, "clouds", rng)
+    assert excinfo.value.result_index == 0
@@ -0,0 +1,114 @@
+"""
+CPU Worker Pool
+Runs CPU-bound post-processing (audio base64 decoding and ETag hashing) off the
+event loop, so finishing one multi-MB lesson does not stall every other request.
+
+Work runs in a thread pool by default. base64 decoding holds the GIL, so threaded
+work is done in slices (see audio_store.decode_base64) to let the loop take the GIL
+back between them. With WORKER_POOL_PROCESSES > 0 it runs in a process pool instead:
+no GIL contention at all, at the cost of pickling the input and result. Small inputs
+run inline, where the hand-off would cost more than the work.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WORKER_POOL_ENABLED = os.getenv("WORKER_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+WORKER_POOL_THREADS = int(os.getenv("WORKER_POOL_THREADS", str(min(4, os.cpu_count() or 1))))
+WORKER_POOL_PROCESSES = int(os.getenv("WORKER_POOL_PROCESSES", "0"))  # > 0 uses a process pool instead of threads
+WORKER_POOL_MIN_BYTES = int(os.getenv("WORKER_POOL_MIN_BYTES", str(256 * 1024)))  # smaller inputs run inline
+
+
+class WorkerPool:
+    """
+    Thread or process pool for CPU-bound stages, with per-stage timing
+
+    Executors are created on start() (app startup); before that, and when disabled,
+    every call runs inline so scripts and tests need no setup.
+    """
+
+    def __init__(self, enabled: bool, threads: int, processes: int, min_bytes: int):
+        self.enabled = enabled
+        self.threads = threads
+        self.processes = processes
+        self.min_bytes = min_bytes
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def kind(self) -> str:
+        if self._executor is None:
+            return "inline"
+        return "process" if isinstance(self._executor, ProcessPoolExecutor) else "thread"
+
+    def start(self) -> None:
+        if not self.enabled or self._executor is not None:
+            return
+        if self.processes > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="cpu-worker")
+        logger.info(f"🧵 CPU worker pool started ({self.kind}, {self.processes or self.threads} workers)")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _record(self, stage: str, offloaded: bool, elapsed: float) -> None:
+        metrics = self._stages.setdefault(stage, {"offloaded": 0, "inline": 0, "total_ms": 0.0, "max_ms": 0.0})
+        metrics["offloaded" if offloaded else "inline"] += 1
+        metrics["total_ms"] += elapsed * 1000
+        metrics["max_ms"] = max(metrics["max_ms"], elapsed * 1000)
+
+    async def run(self, stage: str, func: Callable[..., Any], *args, size: int = 0) -> Any:
+        """
+        Run func(*args) in the pool, or inline when the pool is not running or size < min_bytes
+
+        Args:
+            stage: Stage name for stats()
+            func: Module-level function (it must be picklable for the process pool)
+            size: Input size in bytes, used to keep small work inline
+        """
+        started_at = time.perf_counter()
+        if self._executor is None or size < self.min_bytes:
+            result = func(*args)
+            self._record(stage, False, time.perf_counter() - started_at)
+            return result
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self._record(stage, True, time.perf_counter() - started_at)
+
+    def stats(self) -> dict:
+        """Pool configuration, occupancy and per-stage counts/latency (queue wait included when offloaded)"""
+        return {
+            "kind": self.kind,
+            "workers": self.processes or self.threads,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "stages": {
+                stage: {**metrics, "total_ms": round(metrics["total_ms"], 1), "max_ms": round(metrics["max_ms"], 1)}
+                for stage, metrics in self._stages.items()
+            },
+        }
+
+
+worker_pool = WorkerPool(WORKER_POOL_ENABLED, WORKER_POOL_THREADS, WORKER_POOL_PROCESSES, WORKER_POOL_MIN_BYTES)
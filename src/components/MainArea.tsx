@@ -102,7 +102,7 @@ const MainArea = ({
     setIsGeneratingQuiz(true);
     try {
       console.log("🎯 Generating quiz for lesson:", currentLesson.topic);
-      const quizData = await generateQuiz(currentLesson.topic);
+      const quizData = await generateQuiz(currentLesson.prompt);
       console.log("✅ Quiz generated successfully:", quizData);
       
       if (quizData.questions && quizData.questions.length > 0) {
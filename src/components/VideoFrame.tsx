@@ -39,10 +39,12 @@ const VideoFrame = ({ lesson, onNarrationChange }: VideoFrameProps) => {
     const imageLoadPromises: Promise<void>[] = [];
 
     try {
-      // Pre-convert all audio base64 to URLs
+      // Use backend audio URLs directly, pre-convert inline base64 audio to URLs
       lesson.segments.forEach((segment) => {
         // Convert audio
-        if (segment.audioBase64) {
+        if (segment.audioUrl) {
+          urls.push(segment.audioUrl);
+        } else if (segment.audioBase64) {
           try {
             const audioUrl = convertBase64ToAudioUrl(segment.audioBase64);
             urls.push(audioUrl);
@@ -4,8 +4,8 @@ import { getFastinoUserId } from "./auth";
 export interface LessonSegment {
   segment_id: number;
   imageUrl: string | null;
-  audioUrl?: string; // Will be converted from audioBase64
-  audioBase64?: string; // Base64 audio data from backend
+  audioUrl?: string; // URL of the segment audio served by the backend
+  audioBase64?: string; // Inline base64 audio (only when the backend runs with LESSON_AUDIO_MODE=inline)
   narration: string; // Narration text from backend (replaces prompt)
   duration?: number; // Optional duration in seconds from backend
 }
@@ -13,6 +13,7 @@ export interface LessonSegment {
 export interface LessonData {
   topic: string;
   segments: LessonSegment[];
+  lesson_id?: string;
 }
 
 /**
@@ -84,8 +85,8 @@ export async function generateLesson(userPrompt: string): Promise<LessonData> {
       segments: data.segments?.map((s) => ({
         segment_id: s.segment_id,
         hasImage: !!s.imageUrl,
-        hasAudio: !!s.audioBase64,
-        audioBase64Length: s.audioBase64?.length || 0,
+        hasAudio: !!(s.audioUrl || s.audioBase64),
+        audioUrl: s.audioUrl,
         narrationPreview: s.narration?.substring(0, 50) || "empty",
       })),
     });
@@ -96,9 +97,10 @@ export async function generateLesson(userPrompt: string): Promise<LessonData> {
       throw new Error("Invalid response from backend: missing topic or segments");
     }
 
-    // Ensure all segments have audioBase64
+    // Resolve backend-relative audio URLs; older backends send inline audioBase64 instead
     const validatedSegments = data.segments.map((segment) => ({
       ...segment,
+      audioUrl: segment.audioUrl ? `${backendUrl}${segment.audioUrl}` : undefined,
       audioBase64: segment.audioBase64 || "",
     }));
 
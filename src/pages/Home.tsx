@@ -8,6 +8,7 @@ export interface Lesson {
   id: number;
   title: string;
   topic: string;
+  prompt: string; // Original user prompt (the quiz is generated from it, like the backend's quiz prefetch)
   segments: LessonSegment[];
   createdAt: Date;
 }
@@ -26,6 +27,7 @@ const Home = () => {
         id: Date.now(),
         title: lessonData.topic,
         topic: lessonData.topic,
+        prompt: topic,
         segments: lessonData.segments,
         createdAt: new Date(),
       };